@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,8 +43,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "raffle.instrumentation.instrumentation_middleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "raffle.instrumentation.TimedSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -81,6 +84,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # WAL lets the job status page read while the run_jobs worker holds a long write transaction
+        "OPTIONS": {"init_command": "PRAGMA journal_mode=WAL;", "timeout": 20},
     }
 }
 
@@ -131,3 +136,48 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Allow large form submissions for bulk historical edits
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 100000
+
+# Engine used for full raffle rankings: "python" or "numpy" (needs numpy installed)
+RAFFLE_ENGINE = "python"
+
+# Order in which sign-ups are matched to historical students: "email", "user_id" (attendee id), "name"
+RAFFLE_IDENTITY_PRECEDENCE = ("email", "user_id", "name")
+
+# Django cache through which processes share parsed historical databases, and for how long (seconds).
+# Each process keeps its own copies anyway, so this only helps with a cache every worker reaches
+# (Redis, Memcached) configured in CACHES; the default per-process LocMemCache would just hold a
+# second, pickled copy. Empty: no shared cache
+RAFFLE_HISTORY_CACHE = ""
+RAFFLE_HISTORY_CACHE_TIMEOUT = 600
+
+# Rows written per INSERT batch when importing a historical database
+RAFFLE_IMPORT_BATCH_SIZE = 5000
+
+# Background jobs (see raffle.jobs): run them inside the submitting request instead of
+# by the run_jobs worker, and the Django cache that carries their live progress
+RAFFLE_JOBS_EAGER = False
+RAFFLE_JOBS_CACHE = "default"
+
+# Pool for CPU-bound work of async views (see raffle.offload): "thread" or "process", and its size
+RAFFLE_OFFLOAD_EXECUTOR = "thread"
+RAFFLE_OFFLOAD_WORKERS = 4
+
+# Per-request stage timings and query counts (see raffle.instrumentation): a Server-Timing
+# header on every response and aggregated stats for staff at /stats/
+RAFFLE_INSTRUMENTATION = False
+
+# Prometheus metrics (see raffle.metrics) at /metrics, for staff or a scraper sending
+# "Authorization: Bearer <RAFFLE_METRICS_TOKEN>"; off under "manage.py test". With RAFFLE_METRICS_DIR
+# set (from the environment), each process (web workers, the run_jobs worker) also writes its metrics
+# to a file there, which the endpoint adds up; use a directory outside the checkout that only this
+# deployment's processes share. Unset, /metrics shows the serving process's own metrics only
+RAFFLE_METRICS = sys.argv[1:2] != ["test"]
+RAFFLE_METRICS_DIR = os.environ.get("RAFFLE_METRICS_DIR", "")
+RAFFLE_METRICS_TOKEN = ""
+
+# cProfile of slow config and results requests and of jobs (see raffle.profiling), for the listed
+# usernames or for staff sending "X-Raffle-Profile: 1" or "?profile=1". Runs that take at least
+# RAFFLE_PROFILE_THRESHOLD seconds are kept, as their top RAFFLE_PROFILE_TOP functions, in the admin
+RAFFLE_PROFILE_USERS = ()
+RAFFLE_PROFILE_THRESHOLD = 1.0
+RAFFLE_PROFILE_TOP = 40
@@ -1,3 +1,24 @@
 from django.contrib import admin
+from django.utils.html import format_html
 
-# Register your models here.
+from .models import PerformanceProfile
+
+
+@admin.register(PerformanceProfile)
+class PerformanceProfileAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "target", "duration", "user")
+    list_filter = ("user",)
+    search_fields = ("target",)
+    date_hierarchy = "created_at"
+    fields = ("created_at", "target", "duration", "user", "profile")
+    readonly_fields = fields
+
+    @admin.display(description="Summary")
+    def profile(self, obj: PerformanceProfile) -> str:
+        return format_html('<pre style="white-space: pre; overflow-x: auto">{}</pre>', obj.summary)
+
+    def has_add_permission(self, request) -> bool:
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
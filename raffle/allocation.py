@@ -0,0 +1,152 @@
+import itertools
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .services import StudentRecord, StudentRow, _priority_key, _signup_response, _to_int, consolidate_students
+
+
+@dataclass
+class EventAllocation:
+    """One event's outcome of a multi-event allocation."""
+
+    name: str
+    capacity: int
+    # (student, selected) in rank order: the students allocated to the event, then its waitlist
+    ranking: List[Tuple[StudentRecord, bool]]
+
+    @property
+    def selected(self) -> List[StudentRecord]:
+        return [student for student, selected in self.ranking if selected]
+
+    def ranked_rows(self) -> Iterator[Dict[str, Any]]:
+        """The ranking as the rows ``iter_ranking_csv`` writes."""
+        # New rows rather than the records: a student is ranked differently in other events
+        for rank, (s, selected) in enumerate(self.ranking, start=1):
+            yield {
+                "rank": rank,
+                "selected": selected,
+                "user_id": s.user_id,
+                "name": s.name,
+                "email": s.email,
+                "class": s.student_class,
+                "num_events_attended": s.num_events_attended,
+                "num_absences": s.num_absences,
+                "num_late_arrivals": s.num_late_arrivals,
+                "last_attended_date": s.last_attended_date,
+            }
+
+
+def allocate(
+    students: Sequence[StudentRow],
+    preferences: Sequence[Sequence[int]],
+    capacities: Sequence[int],
+    max_wins: int = 1,
+    seed: Optional[int] = None,
+) -> List[List[Tuple[int, bool]]]:
+    """Assign students to events so that nobody wins more than ``max_wins`` of them.
+
+    ``preferences[i]`` lists the events (indices into ``capacities``) student
+    ``i`` is eligible for, most wanted first. Serial dictatorship in rounds:
+    each round, students in ``_priority_key`` order (random tie-break from
+    ``seed``) take their most wanted event that still has room, one win per
+    student per round. A win counts as an attended event, which drops every
+    winner by the same step, so the order is the same in every round.
+
+    Returns, per event, (student index, selected) pairs in rank order: the
+    allocated students in the order they were assigned, then a waitlist of
+    the event's other eligible students, by priority counting their wins.
+    O(n log n + total preferences), so 100k students x 100 events is cheap.
+    """
+    n = len(students)
+    shuffled = list(range(n))
+    random.Random(seed).shuffle(shuffled)
+    tie_break = [0] * n
+    for position, i in enumerate(shuffled):
+        tie_break[i] = position
+    keys = [_priority_key(s) for s in students]
+    order = sorted((i for i in range(n) if preferences[i]), key=lambda i: (keys[i], tie_break[i]))
+
+    remaining = [max(c, 0) for c in capacities]
+    allocated: List[List[int]] = [[] for _ in capacities]
+    won: List[List[int]] = [[] for _ in range(n)]
+    # Position in each student's preferences before which every event is full or won;
+    # events never regain room, so it only moves forward
+    cursor = [0] * n
+    active = order
+    for _round in range(max(max_wins, 0)):
+        next_active = []
+        for i in active:
+            prefs, p = preferences[i], cursor[i]
+            while p < len(prefs) and not remaining[prefs[p]]:
+                p += 1
+            if p == len(prefs):
+                cursor[i] = p
+                continue
+            event = prefs[p]
+            cursor[i] = p + 1
+            remaining[event] -= 1
+            allocated[event].append(i)
+            won[i].append(event)
+            if cursor[i] < len(prefs):
+                next_active.append(i)
+        active = next_active
+        if not active:
+            break
+
+    waitlists: List[List[int]] = [[] for _ in capacities]
+    for i in order:
+        for event in preferences[i]:
+            if event not in won[i]:
+                waitlists[event].append(i)
+
+    def waitlist_key(i: int):
+        attended, absences, late, last_date = keys[i]
+        return (attended + len(won[i]), absences, late, last_date, tie_break[i])
+
+    return [
+        [(i, True) for i in allocated[event]] + [(i, False) for i in sorted(waitlists[event], key=waitlist_key)]
+        for event in range(len(capacities))
+    ]
+
+
+def _preference(row: StudentRow) -> float:
+    """A sign-up's "preference" cell (lower is more wanted); unranked sign-ups come last."""
+    value = row.get("preference")
+    return _to_int(value) if value not in (None, "") else math.inf
+
+
+def allocate_events(
+    historical: List[StudentRecord],
+    events: Sequence[Tuple[str, int, List[StudentRow]]],
+    max_wins: int = 1,
+    seed: Optional[int] = None,
+) -> List[EventAllocation]:
+    """Allocate students to ``events`` (name, capacity, sign-up rows) against one historical database.
+
+    All events' sign-ups are consolidated together, like a single event's,
+    so a student keeps one identity (and one priority) across events. A
+    student's preferences are the events they signed up for as "planned",
+    ordered by the sign-up's optional "preference" column, then event order.
+    """
+    signed_up: List[Optional[int]] = []
+    roster = consolidate_students(
+        itertools.chain.from_iterable(signups for _name, _capacity, signups in events), historical, signed_up=signed_up
+    )
+    choices: Dict[int, Dict[int, float]] = {}
+    positions = iter(signed_up)
+    for e, (_name, _capacity, signups) in enumerate(events):
+        for row, position in zip(signups, positions):
+            if position is not None and _signup_response(row) == "yes":
+                wanted = choices.setdefault(position, {})
+                wanted[e] = min(wanted.get(e, math.inf), _preference(row))
+
+    candidates = sorted(choices)
+    students = [roster[p] for p in candidates]
+    preferences = [sorted(choices[p], key=lambda e, p=p: (choices[p][e], e)) for p in candidates]
+    ranked = allocate(students, preferences, [capacity for _name, capacity, _signups in events], max_wins, seed)
+    return [
+        EventAllocation(name, capacity, [(students[i], selected) for i, selected in ranking])
+        for (name, capacity, _signups), ranking in zip(events, ranked)
+    ]
@@ -1,6 +1,32 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def _repair_search_index(sender, using, **kwargs):
+    # Table rebuilds in later migrations drop the FTS triggers; recreate them
+    from django.db import connections
+
+    from .search import fts_installed, install_fts
+
+    conn = connections[using]
+    if fts_installed(conn):
+        install_fts(conn)
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    from .instrumentation import count_query
+
+    connection.execute_wrappers.append(count_query)
 
 
 class RaffleConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "raffle"
+
+    def ready(self):
+        post_migrate.connect(_repair_search_index, sender=self)
+        if settings.RAFFLE_INSTRUMENTATION:
+            # Every thread opens its own connection; async views query from worker threads
+            connection_created.connect(_instrument_connection)
@@ -0,0 +1,234 @@
+from collections import defaultdict
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from . import metrics
+from .history import candidate_identity_index, student_row, touch_historical
+from .models import AttendanceEntry, RaffleRun, Student
+from .services import StudentRow, _split_events
+
+
+# Log kind -> (materialized counter, imported baseline)
+COUNTERS = {
+    AttendanceEntry.KIND_ATTENDED: ("num_events_attended", "base_events_attended"),
+    AttendanceEntry.KIND_ABSENT: ("num_absences", "base_absences"),
+    AttendanceEntry.KIND_LATE: ("num_late_arrivals", "base_late_arrivals"),
+}
+MATERIALIZED_FIELDS = [counter for counter, _base in COUNTERS.values()] + ["attended_events", "latest_attended"]
+
+# (student id, kind, delta, event name)
+Mark = Tuple[int, str, int, str]
+
+
+def replay(
+    student_ids: Iterable[int], pending: Sequence[Mark] = ()
+) -> Tuple[Dict[int, Dict[str, int]], Dict[int, List[str]]]:
+    """Net marks per kind and attended event names of each student's log, plus ``pending`` marks."""
+    ids = list(set(student_ids))
+    totals: Dict[int, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    attended: Dict[int, List[str]] = defaultdict(list)
+    logged = (
+        AttendanceEntry.objects.filter(student_id__in=ids)
+        .order_by("id")
+        .values_list("student_id", "kind", "delta", "event_name")
+    )
+    for student_id, kind, delta, event_name in chain(logged, pending):
+        totals[student_id][kind] += delta
+        if kind != AttendanceEntry.KIND_ATTENDED:
+            continue
+        names = attended[student_id]
+        for _ in range(delta):
+            names.append(event_name)
+        for _ in range(-delta):
+            # Withdraw the latest matching attendance
+            if event_name in names:
+                del names[len(names) - 1 - names[::-1].index(event_name)]
+    return totals, attended
+
+
+def materialize(student_ids: Iterable[int], pending: Sequence[Mark] = (), save: bool = True) -> List[Student]:
+    """Recompute the counters of ``student_ids`` from their baseline and attendance log.
+
+    ``pending`` marks are applied after the logged ones without being stored;
+    with ``save=False`` nothing is written (used for previews). Returns the
+    students in position order.
+    """
+    ids = list(set(student_ids))
+    students = {s.id: s for s in Student.objects.filter(id__in=ids)}
+    totals, attended = replay(ids, pending)
+
+    for student_id, student in students.items():
+        for kind, (counter, base) in COUNTERS.items():
+            setattr(student, counter, max(getattr(student, base) + totals[student_id][kind], 0))
+        names = attended[student_id]
+        student.attended_events = ", ".join([*_split_events(student.base_attended_events), *names])
+        student.latest_attended = names[-1] if names else student.base_latest_attended
+    ordered = sorted(students.values(), key=lambda s: s.position)
+    if save:
+        Student.objects.bulk_update(ordered, MATERIALIZED_FIELDS, batch_size=500)
+    return ordered
+
+
+def _event_marks(
+    user,
+    selected: Iterable[StudentRow],
+    event_name: str,
+    adjustments: Optional[Dict[str, Dict[str, bool]]],
+    ambiguous: Optional[List[Dict[str, Any]]] = None,
+) -> List[Mark]:
+    """Marks for one event's results: attended for the selected students, plus absent/late adjustments.
+
+    A selected student matching several historical students is not credited
+    to any of them; they are appended to ``ambiguous`` if given, in the shape
+    of ``RaffleWorkspace.identity_report``.
+    """
+    adjustments = adjustments or {}
+    selected = list(selected)
+    index = candidate_identity_index(user, selected)
+    attended_ids = set()
+    unresolved = []
+    for s in selected:
+        match = index.resolve_row(s)
+        if match.ambiguous:
+            unresolved.append((s, match))
+        elif match.position is not None:
+            attended_ids.add(index.refs[match.position])
+    if unresolved and ambiguous is not None:
+        ids = {index.refs[p] for _s, match in unresolved for p in match.candidates}
+        students = Student.objects.filter(id__in=ids).values_list("id", "email", "name")
+        labels = {student_id: email or name for student_id, email, name in students}
+        for s, match in unresolved:
+            ambiguous.append(
+                {
+                    "email": s.get("email") or "",
+                    "name": s.get("name") or "",
+                    "matched_by": match.key,
+                    "candidates": [labels[index.refs[p]] for p in match.candidates],
+                }
+            )
+    marks: List[Mark] = [(i, AttendanceEntry.KIND_ATTENDED, 1, event_name) for i in sorted(attended_ids)]
+    adjusted = {email: adj for email, adj in adjustments.items() if adj.get("absent") or adj.get("late")}
+    if adjusted:
+        for student_id, email in Student.objects.filter(owner=user, email__in=adjusted).values_list("id", "email"):
+            for kind in (AttendanceEntry.KIND_ABSENT, AttendanceEntry.KIND_LATE):
+                if adjusted[email].get(kind):
+                    marks.append((student_id, kind, 1, event_name))
+    return marks
+
+
+def _log(marks: Iterable[Mark], run: Optional[RaffleRun]) -> None:
+    AttendanceEntry.objects.bulk_create(
+        [
+            AttendanceEntry(student_id=student_id, run=run, kind=kind, delta=delta, event_name=event_name)
+            for student_id, kind, delta, event_name in marks
+        ],
+        batch_size=1000,
+    )
+
+
+def preview_event_results(
+    user,
+    selected: Iterable[StudentRow],
+    event_name: str,
+    adjustments: Optional[Dict[str, Dict[str, bool]]] = None,
+    ambiguous: Optional[List[Dict[str, Any]]] = None,
+) -> List[StudentRow]:
+    """The historical rows ``apply_event_results`` would change, as they would be after it.
+
+    Selected students it would not credit, for matching several historical
+    students, are appended to ``ambiguous`` if given.
+    """
+    marks = _event_marks(user, selected, event_name, adjustments, ambiguous)
+    return [student_row(s) for s in materialize((m[0] for m in marks), pending=marks, save=False)]
+
+
+@metrics.HISTORY_SECONDS.time(operation="event_results")
+@transaction.atomic
+def apply_event_results(
+    user,
+    selected: Iterable[StudentRow],
+    event_name: str,
+    adjustments: Optional[Dict[str, Dict[str, bool]]] = None,
+    run: Optional[RaffleRun] = None,
+) -> int:
+    """Log one event's results and update the affected students' counters; returns how many changed.
+
+    The selected students get attended +1, the event appended to their
+    attended events and set as latest attended; absent/late adjustments
+    (keyed by email) add 1 each. Selected students matching several
+    historical students are skipped (see ``preview_event_results``).
+    """
+    marks = _event_marks(user, selected, event_name, adjustments)
+    _log(marks, run)
+    students = materialize(m[0] for m in marks)
+    touch_historical(user)
+    return len(students)
+
+
+def run_flags(run: RaffleRun) -> Dict[str, Dict[str, bool]]:
+    """Current absent/late marks of a run, keyed by student email."""
+    flags: Dict[str, Dict[str, bool]] = {}
+    net = (
+        AttendanceEntry.objects.filter(run=run, kind__in=[AttendanceEntry.KIND_ABSENT, AttendanceEntry.KIND_LATE])
+        .values("student__email", "kind")
+        .annotate(total=Sum("delta"))
+    )
+    for row in net:
+        flags.setdefault(row["student__email"], {})[row["kind"]] = row["total"] > 0
+    return flags
+
+
+@transaction.atomic
+def set_run_flags(run: RaffleRun, flags: Dict[str, Dict[str, bool]]) -> int:
+    """Make the run's absent/late marks match ``flags`` (keyed by email); returns how many students changed.
+
+    Only differences are logged, so saving the same marks twice changes nothing.
+    """
+    logged = (
+        AttendanceEntry.objects.filter(run=run, kind__in=[AttendanceEntry.KIND_ABSENT, AttendanceEntry.KIND_LATE])
+        .values("student_id", "kind")
+        .annotate(total=Sum("delta"))
+    )
+    current = {(row["student_id"], row["kind"]): row["total"] for row in logged}
+    marks: List[Mark] = []
+    students = Student.objects.filter(owner=run.user, email__in=list(flags)).values_list("id", "email")
+    for student_id, email in students:
+        for kind in (AttendanceEntry.KIND_ABSENT, AttendanceEntry.KIND_LATE):
+            wanted = 1 if flags[email].get(kind) else 0
+            delta = wanted - max(current.get((student_id, kind), 0), 0)
+            if delta:
+                marks.append((student_id, kind, delta, run.name))
+    if marks:
+        _log(marks, run)
+        materialize(m[0] for m in marks)
+        touch_historical(run.user)
+    return len({m[0] for m in marks})
+
+
+@transaction.atomic
+def undo_run(run: RaffleRun) -> int:
+    """Withdraw every mark a run logged; returns how many students changed."""
+    net = (
+        AttendanceEntry.objects.filter(run=run)
+        .values("student_id", "kind", "event_name")
+        .annotate(total=Sum("delta"))
+        .filter(~Q(total=0))
+    )
+    marks: List[Mark] = [(row["student_id"], row["kind"], -row["total"], row["event_name"]) for row in net]
+    if marks:
+        _log(marks, run)
+        materialize(m[0] for m in marks)
+        touch_historical(run.user)
+    return len({m[0] for m in marks})
+
+
+def rebuild_counters(students=None, chunk_size: int = 2000) -> int:
+    """Recompute every student's counters from baseline and log; returns how many were rebuilt."""
+    ids = list((students if students is not None else Student.objects.all()).values_list("id", flat=True))
+    for start in range(0, len(ids), chunk_size):
+        with transaction.atomic():
+            materialize(ids[start : start + chunk_size])
+    return len(ids)
@@ -0,0 +1,167 @@
+import gc
+import multiprocessing
+import os
+import random
+from pathlib import Path
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .allocation import EventAllocation, allocate_events
+from .identity import IdentityIndex
+from .services import StudentRecord, StudentRow, consolidate_students, iter_csv_upload, parse_csv_upload
+from .vectorized import raffle_engine
+
+Engine = Callable[..., Tuple[List[StudentRow], List[StudentRow]]]
+
+
+@dataclass
+class BatchEvent:
+    """One event of a batch draw: its sign-ups and how many students it takes."""
+
+    name: str
+    capacity: int
+    signups: List[StudentRow]
+    seed: Optional[int] = None
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one event of a batch draw."""
+
+    name: str
+    capacity: int
+    seed: int
+    # Eligible students in rank order; the first ``capacity`` are selected
+    eligible: List[StudentRecord]
+    # Sign-ups that matched several historical students (see consolidate_students)
+    ambiguous: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def selected(self) -> List[StudentRecord]:
+        # Clamped like the engines clamp it, so a negative capacity selects nobody
+        return self.eligible[: max(self.capacity, 0)]
+
+
+def read_manifest(path) -> List[BatchEvent]:
+    """The events listed in a manifest CSV.
+
+    One row per event with the columns ``event``, ``capacity`` (at least 0)
+    and ``signups`` (path of its sign-up CSV, relative to the manifest).
+    Raises ValueError on a malformed row.
+    """
+    manifest = Path(path)
+    events = []
+    with open(manifest, "rb") as f:
+        for line, row in enumerate(iter_csv_upload(f), start=2):
+            try:
+                name, capacity, signups = row["event"], int(row["capacity"]), row["signups"]
+                if capacity < 0:
+                    raise ValueError(capacity)
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{manifest}:{line}: needs an event, a whole-number capacity and a signups path")
+            with open(manifest.parent / signups, "rb") as s:
+                events.append(BatchEvent(name, capacity, parse_csv_upload(s)))
+    return events
+
+
+# Historical records and their identity index, read-only and shared by every
+# event of the running batch (inherited by forked workers, see _pool)
+_shared: Optional[Tuple[List[StudentRecord], IdentityIndex]] = None
+
+
+def _init_worker(shared: Tuple[List[StudentRecord], IdentityIndex]) -> None:
+    global _shared
+    _shared = shared
+
+
+def _draw_event(event: BatchEvent, engine: Engine) -> BatchResult:
+    historical, index = _shared
+    ambiguous: List[Dict[str, Any]] = []
+    signed_up: List[Optional[int]] = []
+    master = consolidate_students(event.signups, historical, index=index, ambiguous=ambiguous, signed_up=signed_up)
+    # Only sign-ups can be eligible; ranking them alone (in master-list order,
+    # which the seeded shuffle depends on) gives the full list's ranking
+    eligible, _selected = engine([master[p] for p in sorted(set(signed_up) - {None})], event.capacity, seed=event.seed)
+    return BatchResult(event.name, event.capacity, event.seed, eligible, ambiguous)
+
+
+def _pool(workers: int, shared: Tuple[List[StudentRecord], IdentityIndex]) -> Executor:
+    if "fork" in multiprocessing.get_all_start_methods():
+        # Forked workers inherit the shared data copy-on-write, so it is never
+        # pickled; frozen objects are left alone by the collector, whose
+        # bookkeeping would otherwise copy their pages into every worker
+        _init_worker(shared)
+        gc.freeze()
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    # Elsewhere each worker unpickles it once, not once per event
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(shared,),
+    )
+
+
+def run_batch(
+    historical: List[StudentRecord],
+    index: IdentityIndex,
+    events: Sequence[BatchEvent],
+    workers: Optional[int] = None,
+    engine: Optional[Engine] = None,
+) -> Iterator[BatchResult]:
+    """Consolidate and rank every event against one historical database, in parallel.
+
+    Events are drawn independently (a student may be selected for several).
+    Results are yielded in the order of ``events``. ``workers`` defaults to the
+    CPU count; with 1 the events are drawn one after another in this process.
+    """
+    engine = engine or raffle_engine()
+    workers = min(workers or os.cpu_count() or 1, max(len(events), 1))
+    global _shared
+    if workers == 1:
+        _init_worker((historical, index))
+        try:
+            for event in events:
+                yield _draw_event(event, engine)
+        finally:
+            _shared = None
+        return
+    executor = _pool(workers, (historical, index))
+    try:
+        yield from executor.map(_draw_event, events, [engine] * len(events))
+    finally:
+        executor.shutdown(cancel_futures=True)
+        _shared = None
+        gc.unfreeze()
+
+
+def batch_draw(
+    user, events: Sequence[BatchEvent], workers: Optional[int] = None, seed: Optional[int] = None
+) -> List[BatchResult]:
+    """Draw ``events`` against the user's historical database (see ``run_batch``).
+
+    Events without a seed get one from ``seed`` (reproducible) or from the
+    system's randomness source.
+    """
+    # Imported here: spawned workers import this module before Django's apps are ready
+    from .history import historical_identity_index, iter_historical_rows
+
+    rng = random.Random(seed) if seed is not None else random.SystemRandom()
+    events = [e if e.seed is not None else replace(e, seed=rng.getrandbits(63)) for e in events]
+    historical = [StudentRecord.from_historical(h) for h in iter_historical_rows(user)]
+    return list(run_batch(historical, historical_identity_index(user), events, workers=workers))
+
+
+def batch_allocate(
+    user, events: Sequence[BatchEvent], max_wins: int = 1, seed: Optional[int] = None
+) -> List[EventAllocation]:
+    """Allocate ``events`` against the user's historical database so nobody wins more than ``max_wins``.
+
+    Unlike ``batch_draw`` the events depend on each other, so they are
+    allocated in this process (see ``raffle.allocation``).
+    """
+    from .history import iter_historical_rows
+
+    historical = [StudentRecord.from_historical(h) for h in iter_historical_rows(user)]
+    return allocate_events(historical, [(e.name, e.capacity, e.signups) for e in events], max_wins, seed)
@@ -0,0 +1,476 @@
+import csv
+import gc
+import http.cookiejar
+import io
+import json
+import math
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from importlib import import_module
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+
+from .models import RaffleRun
+from .services import (
+    StudentRecord,
+    StudentRow,
+    consolidate_students,
+    generate_ranking_csv,
+    generate_updated_history_csv,
+    parse_csv_upload,
+    run_priority_raffle,
+)
+from .vectorized import run_priority_raffle_vectorized
+
+ENGINES: Dict[str, Callable[..., Any]] = {
+    "python": run_priority_raffle,
+    "numpy": run_priority_raffle_vectorized,
+}
+
+
+def synthetic_students(n: int, seed: int = 0, response: str = "yes") -> List[StudentRow]:
+    """Build ``n`` master-list rows shaped like ``consolidate_students`` output."""
+    rng = random.Random(seed)
+    rows: List[StudentRow] = []
+    for i in range(n):
+        attended = rng.randint(0, 20)
+        rows.append({
+            "user_id": str(1000000 + i),
+            "email": f"student{i}@uni.example.edu",
+            "first_name": f"First{i}",
+            "last_name": f"Last{i}",
+            "name": f"First{i} Last{i}",
+            "class": f"M{rng.randint(24, 29)}",
+            "response": response,
+            "num_absences": rng.randint(0, 3),
+            "num_late_arrivals": rng.randint(0, 3),
+            "num_events_attended": attended,
+            "events_attended": [f"Event{j}" for j in range(1, attended + 1)],
+            "latest_attended": f"Event{attended}" if attended else "",
+            "_events_columns": {},
+        })
+    return rows
+
+
+def synthetic_historical_rows(n: int, seed: int = 0, event_columns: int = 20) -> List[StudentRow]:
+    """Build ``n`` rows as ``parse_csv_upload`` returns them for a historical database CSV."""
+    rng = random.Random(seed)
+    rows: List[StudentRow] = []
+    for i in range(n):
+        flags = [rng.random() < 0.4 for _ in range(event_columns)]
+        attended = [f"Event{j}" for j, flag in enumerate(flags, start=1) if flag]
+        row: StudentRow = {
+            "email": f"student{i}@uni.example.edu",
+            "first name": f"First{i}",
+            "last name": f"Last{i}",
+            "class": f"M{rng.randint(24, 29)}",
+        }
+        for j, flag in enumerate(flags, start=1):
+            row[f"event{j}"] = "Yes" if flag else "No"
+        row.update({
+            "absent": str(rng.randint(0, 3)),
+            "late": str(rng.randint(0, 3)),
+            "attended": str(len(attended)),
+            "attended events": ", ".join(attended),
+            "latest attended": attended[-1] if attended else "",
+        })
+        rows.append(row)
+    return rows
+
+
+def time_call(fn: Callable[[], Any], repeat: int = 1) -> float:
+    """Best wall-clock time in seconds over ``repeat`` calls, with GC paused."""
+    best = math.inf
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+
+def raffle_scaling(
+    sizes: Sequence[int], capacity: int = 100, repeat: int = 1, seed: int = 0, engine: str = "python"
+) -> List[Dict[str, Any]]:
+    """Time a raffle engine per size and normalize by n·log2(n).
+
+    ``ratio`` is each size's seconds/(n·log2 n) relative to the smallest size;
+    it stays roughly flat when the raffle scales as O(n log n) and grows
+    linearly with n when something quadratic sneaks in.
+    """
+    results: List[Dict[str, Any]] = []
+    base = None
+    for n in sorted(sizes):
+        students = synthetic_students(n, seed=seed)
+        # Re-running on the same rows is fine: the raffle only overwrites rank/selected
+        seconds = time_call(lambda: ENGINES[engine](students, capacity, seed=seed), repeat)
+        per_nlogn = seconds / (n * math.log2(max(n, 2)))
+        base = base or per_nlogn
+        results.append({"n": n, "seconds": seconds, "per_nlogn": per_nlogn, "ratio": per_nlogn / base})
+    return results
+
+
+def engines_agree(n: int, capacity: int = 100, seed: int = 0, engine: str = "numpy") -> bool:
+    """Whether ``engine`` ranks ``n`` synthetic students exactly like the pure-Python engine."""
+    students = synthetic_students(n, seed=seed)
+    # Mix in ineligible rows and parseable dates so every key column matters
+    for i, s in enumerate(students):
+        if i % 7 == 0:
+            s["response"] = "no"
+        if i % 3 == 0:
+            s["last_attended_date"] = f"2025-0{1 + i % 9}-1{i % 10}"
+    expected, expected_selected = run_priority_raffle([dict(s) for s in students], capacity, seed=seed)
+    actual, actual_selected = ENGINES[engine]([dict(s) for s in students], capacity, seed=seed)
+    return expected == actual and expected_selected == actual_selected
+
+
+def retained_bytes(build: Callable[[], Any]) -> int:
+    """Bytes still allocated once ``build()`` returns, i.e. the size of its result."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before
+
+
+def roster_memory(n: int, seed: int = 0) -> Dict[str, Any]:
+    """Memory held by an ``n``-row consolidated roster as dict rows vs ``StudentRecord``s.
+
+    Both representations are built from the same JSON payload (how master
+    lists were previously kept in the session), so neither shares strings
+    with the generator's input.
+    """
+    payload = json.dumps([r.to_dict() for r in consolidate_students([], synthetic_historical_rows(n, seed))])
+    dict_bytes = retained_bytes(lambda: json.loads(payload))
+    record_bytes = retained_bytes(lambda: [StudentRecord.from_dict(d) for d in json.loads(payload)])
+    return {"n": n, "dict_bytes": dict_bytes, "record_bytes": record_bytes, "reduction": dict_bytes / record_bytes}
+
+
+HISTORICAL_HEADERS = (
+    ["email", "First Name", "Last Name", "Class"]
+    + [f"Event{j}" for j in range(1, 21)]
+    + ["Absent", "Late", "Attended", "Attended Events", "Latest Attended"]
+)
+SIGNUP_HEADERS = ["Attendee ID", "Firstname", "Lastname", "Participation status", "Email"]
+
+
+def write_historical_csv(f: IO[str], n: int, seed: int = 0) -> None:
+    """Write an ``n``-row historical database CSV in the format of ``csv/historical database.csv``."""
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(HISTORICAL_HEADERS)
+    for row in synthetic_historical_rows(n, seed):
+        writer.writerow(row[key.lower()] for key in HISTORICAL_HEADERS)
+
+
+def write_signups_csv(f: IO[str], n: int, seed: int = 0, historical: int = 0, returning: float = 0.5) -> None:
+    """Write an ``n``-row sign-up export in the format of ``csv/event sign-ups.csv``.
+
+    About ``returning`` of the sign-ups reuse the email of one of the first
+    ``historical`` students of ``write_historical_csv``, so consolidation has
+    matches to find; one in ten is cancelled and so never eligible.
+    """
+    rng = random.Random(seed)
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(SIGNUP_HEADERS)
+    for i in range(n):
+        if historical and rng.random() < returning:
+            email = f"student{rng.randrange(historical)}@uni.example.edu"
+        else:
+            email = f"new{i}@uni.example.edu"
+        status = "cancelled_by_admin" if rng.random() < 0.1 else "planned"
+        writer.writerow([2000000 + i, f"Signup{i}", f"Last{i}", status, email])
+
+
+def generate_csvs(directory, signups: int, historical: int, seed: int = 0) -> Tuple[Path, Path]:
+    """Write a matching pair of synthetic CSVs into ``directory``; returns (sign-ups, historical) paths."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    signups_path = directory / f"signups_{signups}.csv"
+    historical_path = directory / f"historical_{historical}.csv"
+    # The sign-up export carries a byte order mark, like the sample
+    with open(signups_path, "w", newline="", encoding="utf-8-sig") as f:
+        write_signups_csv(f, signups, seed, historical=historical)
+    with open(historical_path, "w", newline="", encoding="utf-8") as f:
+        write_historical_csv(f, historical, seed)
+    return signups_path, historical_path
+
+
+def peak_bytes(fn: Callable[[], Any]) -> int:
+    """Peak memory allocated while ``fn()`` runs, above what was allocated before."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+def pipeline_benchmark(
+    signups_path, historical_path, capacity: int = 100, repeat: int = 1, seed: int = 0, memory: bool = True
+) -> Dict[str, Dict[str, Any]]:
+    """Time each stage of a draw on the given CSVs, as the web app runs them.
+
+    Stages run in pipeline order, each on the previous stage's output:
+    parsing both uploads, consolidation, the raffle and both CSV exports.
+    Per stage: best ``seconds`` over ``repeat`` runs and, with ``memory``,
+    ``peak_bytes`` from one more run under tracemalloc (which slows it down,
+    so it is never timed).
+    """
+
+    def parse(path) -> List[StudentRow]:
+        with open(path, "rb") as f:
+            return parse_csv_upload(f)
+
+    signups = parse(signups_path)
+    historical = parse(historical_path)
+    master = consolidate_students(signups, historical)
+    eligible, selected = run_priority_raffle(master, capacity, seed=seed)
+    stages: List[Tuple[str, Callable[[], Any]]] = [
+        ("parse_signups", lambda: parse(signups_path)),
+        ("parse_historical", lambda: parse(historical_path)),
+        ("consolidate_students", lambda: consolidate_students(signups, historical)),
+        # Re-running on the same rows is fine: the raffle only overwrites rank/selected
+        ("run_priority_raffle", lambda: run_priority_raffle(master, capacity, seed=seed)),
+        ("generate_ranking_csv", lambda: generate_ranking_csv(eligible)),
+        ("generate_updated_history_csv", lambda: generate_updated_history_csv(master, selected, "Benchmark")),
+    ]
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, fn in stages:
+        results[name] = {"seconds": time_call(fn, repeat)}
+        if memory:
+            results[name]["peak_bytes"] = peak_bytes(fn)
+    return results
+
+
+def benchmark_report(sizes: Sequence[int], results: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """The JSON document a pipeline benchmark run is saved as, with enough context to compare runs."""
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "sizes": list(sizes),
+        "results": list(results),
+    }
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    max_slowdown: float,
+    metrics: Sequence[str] = ("seconds", "peak_bytes"),
+) -> List[str]:
+    """Stages of ``current`` whose ``metrics`` exceed ``max_slowdown`` times their ``baseline`` value.
+
+    Only sizes and stages present in both reports are compared.
+    """
+    previous = {r["rows"]: r["stages"] for r in baseline.get("results", [])}
+    regressions: List[str] = []
+    for r in current["results"]:
+        for stage, now in r["stages"].items():
+            before = previous.get(r["rows"], {}).get(stage)
+            if not before:
+                continue
+            for metric in metrics:
+                if before.get(metric) and metric in now and now[metric] > before[metric] * max_slowdown:
+                    regressions.append(
+                        f"{stage} at {r['rows']} rows: {metric} {before[metric]:.4g} -> {now[metric]:.4g}"
+                    )
+    return regressions
+
+
+def _csv_upload(write: Callable[[IO[str]], None], name: str) -> io.BytesIO:
+    text = io.StringIO()
+    write(text)
+    upload = io.BytesIO(text.getvalue().encode("utf-8-sig"))
+    upload.name = name
+    return upload
+
+
+def view_latency(
+    signups: int = 2000, historical: int = 5000, capacity: int = 100, iterations: int = 10, seed: int = 0
+) -> Dict[str, Dict[str, Any]]:
+    """Drive the organiser flow through Django's test client and measure each request.
+
+    Each iteration uploads a synthetic historical database, configures an
+    event from a synthetic sign-up export, opens the selection and results
+    pages, saves the results and opens the saved event. It runs against a
+    test database and media directory created for it and removed afterwards,
+    so the configured database is never read or written. Jobs run eagerly,
+    so the upload and config requests include their import and draw. Per
+    step: ``p50``/``p95`` latency in seconds, ``queries`` (most issued by one
+    request) and ``session_bytes`` (largest encoded session after it).
+    """
+    store_class = import_module(settings.SESSION_ENGINE).SessionStore
+    samples: Dict[str, Dict[str, List[float]]] = {}
+
+    def request(client: Client, step: str, method: str, path: str, expect: int, **data: Any):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data or None)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if response.status_code != expect:
+            raise ValueError(f"{step}: {method.upper()} {path} returned {response.status_code}, expected {expect}")
+        store = store_class(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        step_samples = samples.setdefault(step, {"latency": [], "queries": [], "session_bytes": []})
+        step_samples["latency"].append(elapsed)
+        step_samples["queries"].append(len(queries))
+        step_samples["session_bytes"].append(len(store.encode(store.load())))
+        return response
+
+    old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+    try:
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], RAFFLE_JOBS_EAGER=True, MEDIA_ROOT=media
+        ):
+            user = get_user_model().objects.create_user("benchmark")
+            client = Client()
+            client.force_login(user)
+            for i in range(iterations):
+                history = _csv_upload(lambda f: write_historical_csv(f, historical, seed + i), "historical.csv")
+                response = request(client, "upload", "post", "/", 302, historical_csv=history)
+                request(client, "upload_job", "get", response["Location"], 302)
+                export = _csv_upload(lambda f: write_signups_csv(f, signups, seed + i, historical), "signups.csv")
+                response = request(
+                    client,
+                    "config",
+                    "post",
+                    "/config/",
+                    302,
+                    event_name=f"Benchmark {i}",
+                    event_capacity=capacity,
+                    event_date="2026-01-01",
+                    signup_csv=export,
+                )
+                request(client, "config_job", "get", response["Location"], 302)
+                request(client, "selection", "get", "/selection/", 200)
+                request(client, "results", "get", "/results/", 200)
+                request(client, "save", "post", "/results/", 302, action="save")
+                run = RaffleRun.objects.filter(user=user).latest("id")
+                request(client, "event_detail", "get", f"/events/{run.id}/", 200)
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for step, values in samples.items():
+        latencies = sorted(values["latency"])
+        results[step] = {
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "queries": max(values["queries"]),
+            "session_bytes": max(values["session_bytes"]),
+        }
+    return results
+
+
+def _login_opener(base_url: str, username: Optional[str], password: Optional[str]) -> urllib.request.OpenerDirector:
+    """A URL opener with its own cookie jar, logged in through the login form if credentials are given."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    if username:
+        login_url = urllib.parse.urljoin(base_url, "/login/")
+        opener.open(login_url).read()
+        token = next((c.value for c in jar if c.name == "csrftoken"), "")
+        data = urllib.parse.urlencode({"username": username, "password": password or "", "csrfmiddlewaretoken": token})
+        opener.open(urllib.request.Request(login_url, data=data.encode(), headers={"Referer": login_url})).read()
+        if not any(c.name == "sessionid" for c in jar):
+            raise ValueError(f"Could not log in as {username!r}")
+    return opener
+
+
+def _percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def http_load(
+    base_url: str,
+    paths: Sequence[str],
+    requests: int = 500,
+    concurrency: int = 20,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    timeout: float = 60.0,
+) -> Dict[str, Any]:
+    """Fetch ``paths`` round-robin from ``concurrency`` clients until ``requests`` responses came back.
+
+    Each client is a thread with its own session (logged in as ``username``
+    when given), so the server sees that many concurrent organisers. Returns
+    throughput and latency percentiles in seconds; responses other than 200
+    count as errors.
+    """
+    openers = [_login_opener(base_url, username, password) for _ in range(concurrency)]
+    urls = [urllib.parse.urljoin(base_url, path) for path in paths]
+    latencies: List[float] = []
+    errors: List[str] = []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def client(opener: urllib.request.OpenerDirector) -> None:
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                with opener.open(urls[i % len(urls)], timeout=timeout) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors.append(f"{urls[i % len(urls)]}: {status}")
+
+    threads = [threading.Thread(target=client, args=(opener,)) for opener in openers]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "seconds": seconds,
+        "rps": len(latencies) / seconds if seconds else 0.0,
+        "p50": _percentile(latencies, 0.50),
+        "p95": _percentile(latencies, 0.95),
+        "p99": _percentile(latencies, 0.99),
+    }
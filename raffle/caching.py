@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from .models import HistoricalData
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A small per-process least-recently-used cache of derived data structures.
+
+    Shared by the request threads and the offload pool, so every access to
+    the ordering happens under a lock.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        # Built outside the lock: two threads missing together both build, and the later one is kept
+        value = build()
+        self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def historical_version(user) -> Any:
+    """Version tag of the user's historical database (``HistoricalData.updated_at``), for cache keys."""
+    return HistoricalData.objects.filter(user=user).values_list("updated_at", flat=True).first()
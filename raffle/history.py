@@ -0,0 +1,576 @@
+import csv
+import io
+import re
+import sys
+from contextlib import nullcontext
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import DateField, Max, OuterRef, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import metrics
+from .caching import LRUCache, historical_version
+from .identity import IDENTITY_KEYS, IdentityIndex, identity_precedence, normalize_email, normalize_name, row_identity
+from .models import AttendanceEntry, HistoricalData, RaffleRun, RunSelection, Student
+from .search import deferred_fts_inserts, student_search_filter
+from .services import StudentRow, _EchoBuffer, _split_events, _to_int, iter_csv_upload
+
+
+# Historical CSV column (as normalized by parse_csv_upload) -> Student field.
+# The first alias is the canonical column written back on export.
+FIELD_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "email": ("email",),
+    "first_name": ("first name", "firstname"),
+    "last_name": ("last name", "lastname"),
+    "student_class": ("class", "student_class"),
+    "user_id": ("user_id",),
+    "num_absences": ("absent",),
+    "num_late_arrivals": ("late",),
+    "num_events_attended": ("attended",),
+    "attended_events": ("attended events",),
+    "latest_attended": ("latest attended",),
+}
+COUNTER_FIELDS = {"num_absences", "num_late_arrivals", "num_events_attended"}
+# Student field holding the imported value of each attendance field (see raffle.attendance)
+BASELINE_FIELDS = {
+    "base_events_attended": "num_events_attended",
+    "base_absences": "num_absences",
+    "base_late_arrivals": "num_late_arrivals",
+    "base_attended_events": "attended_events",
+    "base_latest_attended": "latest_attended",
+}
+
+_EVENT_COLUMN = re.compile(r"^event(\d+)$")
+
+# Historical table sort option -> (Student field or annotation, cursor value parser)
+HISTORICAL_SORTS: Dict[str, Tuple[str, Callable[[str], Any]]] = {
+    "": ("position", int),
+    "attended": ("num_events_attended", int),
+    "absent": ("num_absences", int),
+    "late": ("num_late_arrivals", int),
+    "name": ("name", str),
+    "latest": ("latest_sort", date.fromisoformat),
+}
+
+
+def split_historical_row(row: StudentRow) -> Tuple[Dict[str, Any], Dict[int, str], Dict[str, Any]]:
+    """Split a parsed historical CSV row into (student fields, EventN cells, extra columns).
+
+    Accepts both raw parsed rows (``event1`` .. keys inline) and the rows the
+    edit forms rebuild (EventN cells packed under ``_events_columns``).
+    """
+    field_aliases, event_keys, extra_keys = _row_layout(tuple(row))
+    fields: Dict[str, Any] = {}
+    for field, aliases in field_aliases:
+        value: Any = ""
+        for alias in aliases:
+            if row[alias]:
+                value = row[alias]
+                break
+        fields[field] = _to_int(value) if field in COUNTER_FIELDS else str(value or "").strip()
+    fields["email"] = fields["email"].lower()
+    fields["name"] = f"{fields['first_name']} {fields['last_name']}".strip()
+    fields["name_key"] = normalize_name(fields["first_name"], fields["last_name"])
+
+    packed = row.get("_events_columns")
+    if packed is not None:
+        events: Dict[int, str] = {}
+        for key, value in packed.items():
+            match = _EVENT_COLUMN.match(str(key))
+            if match:
+                events[int(match.group(1))] = str(value or "")
+    else:
+        events = {index: str(row[key] or "") for key, index in event_keys}
+
+    extra = {k: row[k] for k in extra_keys if row[k] not in (None, "")}
+    return fields, events, extra
+
+
+@lru_cache(maxsize=64)
+def _row_layout(keys: Tuple[Any, ...]) -> Tuple[tuple, tuple, tuple]:
+    """How ``split_historical_row`` reads rows with these keys, worked out once per CSV header.
+
+    Returns ((field, aliases present), (EventN key, N) pairs, extra column keys).
+    """
+    consumed = {"_events_columns"}
+    field_aliases = []
+    for field, aliases in FIELD_COLUMNS.items():
+        field_aliases.append((field, tuple(alias for alias in aliases if alias in keys)))
+        consumed.update(aliases)
+    event_keys = []
+    for key in keys:
+        match = _EVENT_COLUMN.match(str(key))
+        if match:
+            event_keys.append((key, int(match.group(1))))
+            consumed.add(key)
+    extra_keys = tuple(k for k in keys if k not in consumed and not str(k).startswith("event"))
+    return tuple(field_aliases), tuple(event_keys), extra_keys
+
+
+def build_historical_row(fields: Dict[str, Any], events: Dict[int, str], extra: Dict[str, Any]) -> StudentRow:
+    """Inverse of ``split_historical_row``: the row parse_csv_upload would return."""
+    row: StudentRow = {
+        "email": fields.get("email") or "",
+        "first name": fields.get("first_name") or "",
+        "last name": fields.get("last_name") or "",
+        "class": fields.get("student_class") or "",
+    }
+    for index in sorted(events):
+        row[f"event{index}"] = events[index]
+    row.update(
+        {
+            "absent": str(fields.get("num_absences") or 0),
+            "late": str(fields.get("num_late_arrivals") or 0),
+            "attended": str(fields.get("num_events_attended") or 0),
+            "attended events": fields.get("attended_events") or "",
+            "latest attended": fields.get("latest_attended") or "",
+        }
+    )
+    if fields.get("user_id"):
+        row["user_id"] = fields["user_id"]
+    row.update(extra or {})
+    return row
+
+
+def iter_historical_csv_from_rows(rows: Iterable[StudentRow]) -> Iterator[str]:
+    """Yield rows in the historical database CSV format, line by line.
+
+    Columns: email, First Name, Last Name, Class, Event1..EventN, Absent, Late,
+    Attended, Attended Events, Latest Attended, followed by any extra columns.
+    """
+    rows = list(rows)
+    max_event_cols = 0
+    extra_columns: List[str] = []
+    split_rows = []
+    for r in rows:
+        fields, events, extra = split_historical_row(r)
+        if events:
+            max_event_cols = max(max_event_cols, max(events))
+        for k in extra:
+            if k not in extra_columns:
+                extra_columns.append(k)
+        split_rows.append((fields, events, extra))
+
+    headers = ["email", "First Name", "Last Name", "Class"]
+    headers.extend(f"Event{i}" for i in range(1, max_event_cols + 1))
+    headers.extend(["Absent", "Late", "Attended", "Attended Events", "Latest Attended"])
+    headers.extend(extra_columns)
+
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow(headers)
+    for fields, events, extra in split_rows:
+        row = [fields["email"], fields["first_name"], fields["last_name"], fields["student_class"]]
+        row.extend(events.get(i, "") for i in range(1, max_event_cols + 1))
+        row.extend([
+            fields["num_absences"],
+            fields["num_late_arrivals"],
+            fields["num_events_attended"],
+            fields["attended_events"],
+            fields["latest_attended"],
+        ])
+        row.extend(extra.get(k, "") for k in extra_columns)
+        yield writer.writerow(row)
+
+
+def historical_csv_from_rows(rows: Iterable[StudentRow]) -> str:
+    return "".join(iter_historical_csv_from_rows(rows))
+
+
+def has_historical(user) -> bool:
+    return Student.objects.filter(owner=user).exists()
+
+
+def _query_historical_rows(user) -> Iterator[StudentRow]:
+    field_names = [*FIELD_COLUMNS.keys(), "extra", "event_cells"]
+    qs = Student.objects.filter(owner=user).order_by("position").values(*field_names)
+    for values in qs.iterator(chunk_size=5000):
+        events = {int(index): sys.intern(value) for index, value in values["event_cells"].items()}
+        yield build_historical_row(values, events, values["extra"])
+
+
+_ROWS_CACHE = LRUCache(maxsize=4)
+
+
+def _rows_cache_key(user) -> str:
+    return f"raffle:historical-rows:{user.pk}"
+
+
+def _shared_cache():
+    """The ``settings.RAFFLE_HISTORY_CACHE`` Django cache, or None when none is configured."""
+    return caches[settings.RAFFLE_HISTORY_CACHE] if settings.RAFFLE_HISTORY_CACHE else None
+
+
+def _cached_historical_rows(user) -> Tuple[Any, Optional[Tuple[StudentRow, ...]]]:
+    """(version marker, cached rows or None) for the user's historical database.
+
+    Rows are cached per process and, if configured, in the shared
+    ``settings.RAFFLE_HISTORY_CACHE`` Django cache, tagged with
+    ``HistoricalData.updated_at``; an entry for an older version is a miss.
+    """
+    marker = historical_version(user)
+    entry = _ROWS_CACHE.get(user.pk)
+    shared = _shared_cache()
+    if entry is None and shared is not None:
+        entry = shared.get(_rows_cache_key(user))
+        if entry is not None:
+            _ROWS_CACHE.set(user.pk, entry)
+    hit = entry is not None and entry[0] == marker
+    metrics.record_cache("historical_rows", hit)
+    return marker, entry[1] if hit else None
+
+
+def invalidate_historical_cache(user) -> None:
+    _ROWS_CACHE.pop(user.pk)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_rows_cache_key(user))
+
+
+def iter_historical_rows(user) -> Iterator[StudentRow]:
+    """Yield the user's historical database in parse_csv_upload row shape, one row at a time.
+
+    Serves the cached rows when ``load_historical_rows`` has cached them;
+    otherwise streams from the database without filling the cache.
+    """
+    _marker, rows = _cached_historical_rows(user)
+    return iter(rows) if rows is not None else _query_historical_rows(user)
+
+
+def load_historical_rows(user) -> List[StudentRow]:
+    """The user's historical database as a list, from the cache when it is current.
+
+    The rows are shared with the cache and must not be modified in place.
+    """
+    marker, rows = _cached_historical_rows(user)
+    if rows is None:
+        rows = tuple(_query_historical_rows(user))
+        entry = (marker, rows)
+        _ROWS_CACHE.set(user.pk, entry)
+        shared = _shared_cache()
+        if shared is not None:
+            shared.set(_rows_cache_key(user), entry, settings.RAFFLE_HISTORY_CACHE_TIMEOUT)
+    return list(rows)
+
+
+@metrics.HISTORY_SECONDS.time(operation="replace")
+@transaction.atomic
+def save_historical_rows(user, rows: Iterable[StudentRow]) -> int:
+    """Replace the user's historical database with ``rows``; returns the row count."""
+    count = replace_historical_students(user, (split_historical_row(row) for row in rows))
+    touch_historical(user)
+    return count
+
+
+def replace_historical_students(
+    user,
+    students: Iterable[Tuple[Dict[str, Any], Dict[int, str], Dict[str, Any]]],
+    batch_size: Optional[int] = None,
+) -> int:
+    """Replace the user's students with ``split_historical_row`` triples; returns the count.
+
+    Students with logged attendance that are still there (one unambiguous
+    identity match) are updated in place and keep their log, with baselines
+    such that baseline plus log gives the new values; so runs logged before
+    an edit or re-import can still be undone. Everyone else is deleted with
+    one set-based statement and the rest of the rows are inserted in bulk.
+    """
+    # attendance imports this module
+    from .attendance import COUNTERS, materialize, replay
+
+    logged_ids = set(
+        AttendanceEntry.objects.filter(student__owner=user).values_list("student_id", flat=True).distinct()
+    )
+    logged = Student.objects.filter(id__in=logged_ids).order_by("position").values_list(*_IDENTITY_COLUMNS)
+    index = _index_students(logged, identity_precedence())
+    with connection.cursor() as cursor:
+        # ``QuerySet.delete`` would load every Student to cascade in Python
+        cursor.execute(
+            "DELETE FROM {} WHERE owner_id = %s AND id NOT IN (SELECT student_id FROM {})".format(
+                connection.ops.quote_name(Student._meta.db_table),
+                connection.ops.quote_name(AttendanceEntry._meta.db_table),
+            ),
+            [user.pk],
+        )
+
+    # Student id -> (position, fields, events, extra) of the row it is kept as
+    kept: Dict[int, Tuple[int, Dict[str, Any], Dict[int, str], Dict[str, Any]]] = {}
+
+    def new_students():
+        for position, (fields, events, extra) in enumerate(students):
+            match = index.resolve(row_identity(fields)) if len(index) else None
+            if match is not None and match.position is not None and not match.ambiguous:
+                student_id = index.refs[match.position]
+                if student_id not in kept:
+                    kept[student_id] = (position, fields, events, extra)
+                    continue
+            yield position, (fields, events, extra)
+
+    count = insert_historical_students(user, new_students(), batch_size=batch_size, bulk=True, positioned=True)
+
+    gone = logged_ids - kept.keys()
+    if gone:
+        AttendanceEntry.objects.filter(student_id__in=gone).delete()
+        Student.objects.filter(id__in=gone).delete()
+    if kept:
+        totals, attended = replay(kept)
+        students_kept = list(Student.objects.filter(id__in=kept))
+        for student in students_kept:
+            position, fields, events, extra = kept[student.id]
+            for name in (*FIELD_COLUMNS, "name", "name_key"):
+                setattr(student, name, fields[name])
+            student.position, student.event_cells, student.extra = position, events, extra
+            for kind, (counter, base) in COUNTERS.items():
+                setattr(student, base, max(fields[counter] - totals[student.id][kind], 0))
+            # The logged attendances are appended again from the log, so the baseline keeps the rest
+            names, logged_names = _split_events(fields["attended_events"]), attended[student.id]
+            for event_name in logged_names:
+                if event_name in names:
+                    del names[len(names) - 1 - names[::-1].index(event_name)]
+            student.base_attended_events = ", ".join(names)
+            latest = fields["latest_attended"]
+            if logged_names and latest == logged_names[-1]:
+                latest = names[-1] if names else ""
+            student.base_latest_attended = latest
+        update = [*FIELD_COLUMNS, "name", "name_key", "position", "event_cells", "extra", *BASELINE_FIELDS]
+        Student.objects.bulk_update(students_kept, update, batch_size=500)
+        materialize(kept)
+    return count + len(kept)
+
+
+def insert_historical_students(
+    user,
+    students: Iterable[Tuple[Dict[str, Any], Dict[int, str], Dict[str, Any]]],
+    first_position: int = 0,
+    batch_size: Optional[int] = None,
+    bulk: bool = False,
+    positioned: bool = False,
+) -> int:
+    """Insert ``split_historical_row`` triples as the user's students from ``first_position`` on.
+
+    Rows go to the database in ``executemany`` batches of ``batch_size``
+    (default ``settings.RAFFLE_IMPORT_BATCH_SIZE``) without building model
+    instances, which dominate ``bulk_create`` at this volume. ``bulk`` defers
+    search indexing to one statement at the end. With ``positioned`` the
+    items are (position, triple) pairs instead. Returns the count.
+    """
+    batch_size = batch_size or settings.RAFFLE_IMPORT_BATCH_SIZE
+    # Bound once: every attribute of the ``connection`` proxy is a thread-local lookup
+    ops = connection.ops
+    columns = [f for f in Student._meta.concrete_fields if not f.primary_key]
+    slots = {f.name: i for i, f in enumerate(columns)}
+    encoders = {f.name: f.encoder for f in columns if f.get_internal_type() == "JSONField"}
+
+    # Each row starts as a copy of the defaults and gets its own values put in place
+    now = ops.adapt_datetimefield_value(timezone.now())
+    template = [f.get_default() for f in columns]
+    for name, encoder in encoders.items():
+        template[slots[name]] = ops.adapt_json_value(template[slots[name]], encoder)
+    template[slots["owner"]] = user.pk
+    template[slots["created_at"]] = template[slots["updated_at"]] = now
+    copies = [(slots[name], name) for name in (*FIELD_COLUMNS, "name", "name_key")]
+    copies.extend((slots[base], field) for base, field in BASELINE_FIELDS.items())
+    position_slot, extra_slot, cells_slot = slots["position"], slots["extra"], slots["event_cells"]
+
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        ops.quote_name(Student._meta.db_table),
+        ", ".join(ops.quote_name(f.column) for f in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    count = 0
+    batch: List[List[Any]] = []
+    with deferred_fts_inserts(connection) if bulk else nullcontext(), connection.cursor() as cursor:
+        items = students if positioned else enumerate(students, start=first_position)
+        for position, (fields, events, extra) in items:
+            values = template.copy()
+            for slot, name in copies:
+                values[slot] = fields[name]
+            values[position_slot] = position
+            values[extra_slot] = ops.adapt_json_value(extra, encoders["extra"])
+            # JSON encoding turns the int EventN indexes into string keys
+            values[cells_slot] = ops.adapt_json_value(events, encoders["event_cells"])
+            batch.append(values)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+    return count
+
+
+def touch_historical(user) -> None:
+    """Record that the user's historical database changed and drop its cached rows."""
+    HistoricalData.objects.update_or_create(user=user, defaults={"csv_text": ""})
+    transaction.on_commit(lambda: invalidate_historical_cache(user))
+
+
+def save_historical_csv(user, csv_text: str) -> int:
+    """Import a historical database CSV; returns the row count."""
+    return save_historical_rows(user, iter_csv_upload(io.StringIO(csv_text)))
+
+
+def export_historical_csv(user) -> str:
+    return "".join(iter_historical_csv(user))
+
+
+def iter_historical_csv(user) -> Iterator[str]:
+    """Yield the user's historical database as CSV lines, generated on demand."""
+    return iter_historical_csv_from_rows(load_historical_rows(user))
+
+
+def student_row(student: Student) -> StudentRow:
+    """A Student's historical row, without its EventN cells."""
+    fields = {field: getattr(student, field) for field in FIELD_COLUMNS}
+    return build_historical_row(fields, {}, student.extra)
+
+
+def candidate_identity_index(user, rows: List[StudentRow]) -> IdentityIndex:
+    """Identity index over just the historical students sharing an email, attendee id or name with ``rows``.
+
+    Resolves ``rows`` like ``historical_identity_index`` would, without reading the whole database.
+    """
+    precedence = identity_precedence()
+    # (key, higher keys that must be blank on the student) -> values to look up
+    groups: Dict[Tuple[str, Tuple[str, ...]], set] = {}
+    for identity in {row_identity(r) for r in rows}:
+        for i, key in enumerate(precedence):
+            value = identity[IDENTITY_KEYS.index(key)]
+            if value:
+                # A lower-precedence key only matches students whose higher keys are blank
+                blank = tuple(k for k in precedence[:i] if identity[IDENTITY_KEYS.index(k)])
+                groups.setdefault((key, blank), set()).add(value)
+    found: Dict[int, Tuple] = {}
+    for (key, blank), values in groups.items():
+        # One query per group keeps each lookup on the (owner, email) or (owner, name_key) index
+        qs = Student.objects.filter(owner=user, **{_KEY_COLUMNS[k]: "" for k in blank})
+        for row in qs.filter(**{f"{_KEY_COLUMNS[key]}__in": values}).values_list("position", *_IDENTITY_COLUMNS):
+            found[row[1]] = row
+    return _index_students((row[1:] for row in sorted(found.values())), precedence)
+
+
+@transaction.atomic
+def add_historical_students(user, master: Iterable[StudentRow]) -> int:
+    """Append the master-list students not yet in the historical database; returns how many.
+
+    New rows get the values the updated-history CSV would give them.
+    """
+    index = historical_identity_index(user)
+    last = Student.objects.filter(owner=user).aggregate(last=Max("position"))["last"]
+    position = 0 if last is None else last + 1
+    rows = []
+    for s in master:
+        if index.contains(s):
+            continue
+        rows.append(
+            {
+                "email": s.get("email"),
+                "first name": s.get("first_name") or (s.get("name") or "").split(" ")[0],
+                "last name": s.get("last_name") or " ".join((s.get("name") or "").split(" ")[1:]),
+                "class": s.get("class"),
+                "absent": s.get("num_absences"),
+                "late": s.get("num_late_arrivals"),
+                "attended": s.get("num_events_attended"),
+                "attended events": ", ".join(s.get("events_attended") or []),
+                "latest attended": s.get("latest_attended"),
+                "_events_columns": s.get("_events_columns") or {},
+            }
+        )
+    if not rows:
+        return 0
+    count = insert_historical_students(user, (split_historical_row(row) for row in rows), first_position=position)
+    touch_historical(user)
+    return count
+
+
+@transaction.atomic
+def index_run_selections(run: RaffleRun, selected: Iterable[StudentRow]) -> int:
+    """(Re)build the ``RunSelection`` rows of ``run``; returns the number indexed."""
+    run.selections.all().delete()
+    emails = {(s.get("email") or "").strip().lower() for s in selected}
+    emails.discard("")
+    RunSelection.objects.bulk_create(
+        [RunSelection(run=run, email=email, date=run.date) for email in sorted(emails)], batch_size=1000
+    )
+    return len(emails)
+
+
+def latest_selection_dates(user, emails: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """Map each selected email (optionally only ``emails``) to the ISO date of its latest dated run."""
+    qs = RunSelection.objects.filter(run__user=user, date__isnull=False)
+    if emails is not None:
+        qs = qs.filter(email__in=list(emails))
+    qs = qs.values("email").annotate(latest=Max("date"))
+    return {r["email"]: r["latest"].isoformat() for r in qs}
+
+
+def historical_queryset(
+    user, run_id: Optional[int] = None, student_class: str = "", q: str = "", sort: str = ""
+) -> QuerySet:
+    """The user's historical students, filtered for the historical table.
+
+    ``run_id`` keeps students selected in that run, ``student_class`` matches
+    the class exactly and ``q`` goes through the search index. When
+    sorting by ``"latest"`` the rows get a ``latest_sort`` annotation (latest
+    selection date, or ``date.min`` if never selected).
+    """
+    qs = Student.objects.filter(owner=user)
+    if run_id:
+        qs = qs.filter(email__in=RunSelection.objects.filter(run__user=user, run_id=run_id).values("email"))
+    if student_class:
+        qs = qs.filter(student_class=student_class)
+    if q:
+        qs = qs.filter(student_search_filter(user, q))
+    if sort == "latest":
+        latest = RunSelection.objects.filter(run__user=user, email=OuterRef("email"), date__isnull=False)
+        qs = qs.annotate(
+            latest_sort=Coalesce(
+                Subquery(latest.order_by("-date").values("date")[:1]), Value(date.min), output_field=DateField()
+            )
+        )
+    return qs
+
+
+_IDENTITY_CACHE = LRUCache(maxsize=8)
+
+
+def historical_identity_index(user) -> IdentityIndex:
+    """Identity index over the user's historical students, in ``iter_historical_rows`` order.
+
+    ``refs`` holds the Student ids. Built once per saved version of the
+    historical database and cached.
+    """
+    marker = historical_version(user)
+    precedence = identity_precedence()
+
+    def build() -> IdentityIndex:
+        qs = Student.objects.filter(owner=user).order_by("position").values_list(*_IDENTITY_COLUMNS)
+        return _index_students(qs.iterator(chunk_size=5000), precedence)
+
+    return _IDENTITY_CACHE.get_or_build((user.pk, marker, precedence), build)
+
+
+_IDENTITY_COLUMNS = ("id", "email", "user_id", "first_name", "last_name", "name")
+# Identity key -> Student column holding its normalized value (names normalized in Python, not by the database's
+# ASCII-only case folding)
+_KEY_COLUMNS = {"email": "email", "user_id": "user_id", "name": "name_key"}
+
+
+def _index_students(students: Iterable[Tuple], precedence: Tuple[str, ...]) -> IdentityIndex:
+    """Index ``_IDENTITY_COLUMNS`` tuples, in the given order."""
+    index = IdentityIndex(precedence)
+    for student_id, email, user_id, first_name, last_name, name in students:
+        identity = (normalize_email(email), (user_id or "").strip(), normalize_name(first_name, last_name, name))
+        index.add(identity, ref=student_id)
+    return index
+
+
+def historical_classes(user) -> List[str]:
+    qs = Student.objects.filter(owner=user).exclude(student_class="").exclude(student_class__isnull=True)
+    return list(qs.order_by("student_class").values_list("student_class", flat=True).distinct())
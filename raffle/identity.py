@@ -0,0 +1,122 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+
+# Identity keys in the default order of precedence
+DEFAULT_PRECEDENCE: Tuple[str, ...] = ("email", "user_id", "name")
+IDENTITY_KEYS = DEFAULT_PRECEDENCE
+
+Identity = Tuple[str, str, str]  # normalized (email, user_id, name)
+
+
+def normalize_email(value: Any) -> str:
+    return str(value or "").strip().lower()
+
+
+def normalize_name(first_name: Any = "", last_name: Any = "", name: Any = "") -> str:
+    """Case- and whitespace-insensitive full name."""
+    full = f"{first_name or ''} {last_name or ''}"
+    if not full.strip():
+        full = str(name or "")
+    return " ".join(full.split()).casefold()
+
+
+def row_identity(row: Any) -> Identity:
+    """Identity of a student row in any of the shapes used here (parsed CSV row, ``StudentRecord``)."""
+    return (
+        normalize_email(row.get("email")),
+        str(row.get("user_id") or "").strip(),
+        normalize_name(
+            row.get("first_name") or row.get("first name"),
+            row.get("last_name") or row.get("last name"),
+            row.get("name"),
+        ),
+    )
+
+
+class IdentityMatch(NamedTuple):
+    position: Optional[int]
+    key: Optional[str]
+    candidates: Tuple[int, ...]
+
+    @property
+    def ambiguous(self) -> bool:
+        return len(self.candidates) > 1
+
+
+def identity_precedence() -> Tuple[str, ...]:
+    """Precedence from ``settings.RAFFLE_IDENTITY_PRECEDENCE``, defaulting to email, attendee id, name."""
+    precedence = tuple(getattr(settings, "RAFFLE_IDENTITY_PRECEDENCE", DEFAULT_PRECEDENCE))
+    unknown = set(precedence) - set(IDENTITY_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown identity keys in RAFFLE_IDENTITY_PRECEDENCE: {sorted(unknown)}")
+    return precedence
+
+
+class IdentityIndex:
+    """Hash index from email, attendee id and normalized name to row positions.
+
+    ``resolve`` tries the keys in order of precedence. A lower-precedence key
+    never matches a row whose higher-precedence key is set and differs from
+    the query's (same name, different email means a different student).
+    Several candidates for the winning key are narrowed by the remaining keys;
+    whatever is left is reported through ``IdentityMatch.candidates`` and the
+    first one (earliest row) is used.
+    """
+
+    def __init__(self, precedence: Optional[Sequence[str]] = None):
+        self.precedence = tuple(precedence) if precedence is not None else identity_precedence()
+        self._slots = {key: IDENTITY_KEYS.index(key) for key in self.precedence}
+        self._maps: Dict[str, Dict[str, List[int]]] = {key: {} for key in self.precedence}
+        self._identities: List[Identity] = []
+        # Optional caller reference per row, e.g. a database id
+        self.refs: List[Any] = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], precedence: Optional[Sequence[str]] = None) -> "IdentityIndex":
+        index = cls(precedence)
+        for row in rows:
+            index.add(row_identity(row))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._identities)
+
+    def add(self, identity: Identity, ref: Any = None) -> int:
+        """Index the next row; returns its position."""
+        position = len(self._identities)
+        self._identities.append(identity)
+        self.refs.append(ref)
+        for key, slot in self._slots.items():
+            if identity[slot]:
+                self._maps[key].setdefault(identity[slot], []).append(position)
+        return position
+
+    def resolve(self, identity: Identity) -> IdentityMatch:
+        for i, key in enumerate(self.precedence):
+            value = identity[self._slots[key]]
+            candidates = self._maps[key].get(value) if value else None
+            if not candidates:
+                continue
+            higher = [self._slots[k] for k in self.precedence[:i] if identity[self._slots[k]]]
+            if higher:
+                candidates = [c for c in candidates if self._agrees(c, identity, higher)]
+            for k in self.precedence[i + 1 :]:
+                slot = self._slots[k]
+                if len(candidates) > 1 and identity[slot]:
+                    narrowed = [c for c in candidates if self._identities[c][slot] == identity[slot]]
+                    candidates = narrowed or candidates
+            if candidates:
+                return IdentityMatch(candidates[0], key, tuple(candidates))
+        return IdentityMatch(None, None, ())
+
+    def _agrees(self, position: int, identity: Identity, slots: List[int]) -> bool:
+        known = self._identities[position]
+        return all(not known[slot] or known[slot] == identity[slot] for slot in slots)
+
+    def resolve_row(self, row: Any) -> IdentityMatch:
+        return self.resolve(row_identity(row))
+
+    def contains(self, row: Any) -> bool:
+        return self.resolve_row(row).position is not None
@@ -0,0 +1,137 @@
+import gc
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+
+from . import metrics
+from .history import (
+    COUNTER_FIELDS,
+    FIELD_COLUMNS,
+    replace_historical_students,
+    split_historical_row,
+    touch_historical,
+)
+from .services import StudentRow, iter_csv_upload
+
+
+# Rejected rows kept in an ImportReport for display; the rest are only counted
+MAX_REPORTED_REJECTS = 100
+
+
+class ImportReport:
+    """Outcome of a historical database import."""
+
+    def __init__(self):
+        self.rows = 0
+        self.rejected_count = 0
+        # (CSV line number, reason) of the first MAX_REPORTED_REJECTS rejected rows
+        self.rejected: List[Tuple[int, str]] = []
+        self.seconds = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def reject(self, line: int, reason: str) -> None:
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTS:
+            self.rejected.append((line, reason))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "rejected_count": self.rejected_count,
+            "rejected": self.rejected,
+            "seconds": self.seconds,
+            "summary": self.summary(),
+        }
+
+    def summary(self) -> str:
+        text = f"Imported {self.rows} rows in {self.seconds:.1f}s ({self.rows_per_sec:,.0f} rows/sec)"
+        if self.rejected_count:
+            text += f"; rejected {self.rejected_count}"
+        return text
+
+
+def _parse_count(value: Any) -> Optional[int]:
+    """A counter cell as a non-negative int (blank is 0); None if invalid."""
+    text = str(value if value is not None else "").strip()
+    if not text:
+        return 0
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    if not math.isfinite(number) or number < 0 or number != int(number):
+        return None
+    return int(number)
+
+
+_NAME_ALIASES = FIELD_COLUMNS["first_name"] + FIELD_COLUMNS["last_name"]
+_COUNTER_ALIASES = [alias for field in sorted(COUNTER_FIELDS) for alias in FIELD_COLUMNS[field]]
+
+
+def validate_historical_row(row: StudentRow) -> Optional[str]:
+    """Why ``row`` cannot be imported, or None if it is valid."""
+    email = str(row.get("email") or "").strip()
+    if not email and not any(str(row.get(alias) or "").strip() for alias in _NAME_ALIASES):
+        return "missing email and name"
+    if email and ("@" not in email or len(email.split()) != 1):
+        return f"invalid email {email!r}"
+    for alias in _COUNTER_ALIASES:
+        value = row.get(alias)
+        if value and not str(value).isdecimal() and _parse_count(value) is None:
+            return f"{alias.title()} must be a whole number >= 0, got {value!r}"
+    return None
+
+
+def _valid_students(
+    rows: Iterable[StudentRow], report: ImportReport
+) -> Iterator[Tuple[Dict[str, Any], Dict[int, str], Dict[str, Any]]]:
+    # Line 1 is the header
+    for line, row in enumerate(rows, start=2):
+        reason = validate_historical_row(row)
+        if reason:
+            report.reject(line, reason)
+            continue
+        report.rows += 1
+        yield split_historical_row(row)
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # The import allocates millions of short-lived, acyclic objects; cycle
+    # collection passes over them only cost time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@transaction.atomic
+def import_historical_rows(user, rows: Iterable[StudentRow], batch_size: Optional[int] = None) -> ImportReport:
+    """Replace the user's historical database with the valid ``rows``, in one transaction.
+
+    ``rows`` is consumed lazily and written in batches of ``batch_size``
+    (default ``settings.RAFFLE_IMPORT_BATCH_SIZE``); invalid rows are skipped
+    and listed in the returned report.
+    """
+    report = ImportReport()
+    start = time.perf_counter()
+    with _gc_paused():
+        replace_historical_students(user, _valid_students(rows, report), batch_size=batch_size)
+    touch_historical(user)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+@metrics.HISTORY_SECONDS.time(operation="import")
+def import_historical_csv(user, uploaded_file, batch_size: Optional[int] = None) -> ImportReport:
+    """Stream an uploaded historical database CSV into the user's database."""
+    return import_historical_rows(user, iter_csv_upload(uploaded_file), batch_size=batch_size)
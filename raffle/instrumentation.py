@@ -0,0 +1,222 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple, TypeVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class RequestTimings:
+    """Stage timings, database queries and payload sizes of one request."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        # stage -> seconds, summed over every call in the request
+        self.stages: Dict[str, float] = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+        # (thread, stage) pairs being timed, so a stage called from within itself is not counted
+        # twice; per thread, since offloaded work times its stages alongside the request's own
+        self._active: Set[Tuple[int, str]] = set()
+        # Offloaded work (see raffle.offload) records from other threads
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_query(self, seconds: float) -> None:
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("raffle_request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the block as stage ``name`` of the current request (nothing when instrumentation is off)."""
+    timings = _current.get()
+    key = (threading.get_ident(), name)
+    if timings is None or key in timings._active:
+        yield
+        return
+    timings._active.add(key)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._active.discard(key)
+        timings.add(name, time.perf_counter() - start)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator timing every call of the function as stage ``name`` (see ``stage``).
+
+    When no request is being instrumented the only cost is one context
+    variable lookup per call.
+    """
+
+    def decorate(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def count_query(execute, sql, params, many, context):
+    """Database execute wrapper counting the current request's queries (see RaffleConfig.ready)."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(time.perf_counter() - start)
+
+
+# view name -> aggregated timings of this process's requests (see stats)
+_stats: Dict[str, Dict[str, Any]] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(view: str, timings: RequestTimings, total: float, request_bytes: int, response_bytes: int) -> None:
+    with _stats_lock:
+        entry = _stats.setdefault(
+            view,
+            {
+                "requests": 0,
+                "seconds": 0.0,
+                "max_seconds": 0.0,
+                "queries": 0,
+                "request_bytes": 0,
+                "response_bytes": 0,
+                "stages": {},
+            },
+        )
+        entry["requests"] += 1
+        entry["seconds"] += total
+        entry["max_seconds"] = max(entry["max_seconds"], total)
+        entry["queries"] += timings.queries
+        entry["request_bytes"] += request_bytes
+        entry["response_bytes"] += response_bytes
+        for name, seconds in timings.stages.items():
+            entry["stages"][name] = entry["stages"].get(name, 0.0) + seconds
+
+
+def stats() -> Dict[str, Any]:
+    """Per-view totals and means of the requests this process has instrumented.
+
+    Every server process keeps its own; with several workers each answers
+    with its share of the traffic (``pid`` tells them apart).
+    """
+    with _stats_lock:
+        views = {}
+        for view, entry in sorted(_stats.items()):
+            n = entry["requests"]
+            views[view] = {
+                "requests": n,
+                "mean_ms": entry["seconds"] / n * 1000,
+                "max_ms": entry["max_seconds"] * 1000,
+                "mean_queries": entry["queries"] / n,
+                "mean_request_bytes": entry["request_bytes"] / n,
+                # Streamed responses (CSV downloads) are not counted
+                "mean_response_bytes": entry["response_bytes"] / n,
+                "stages_mean_ms": {name: s / n * 1000 for name, s in sorted(entry["stages"].items())},
+            }
+    return {"pid": os.getpid(), "views": views}
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def _server_timing(timings: RequestTimings, total: float) -> str:
+    metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.stages.items()]
+    metrics.append(f'db;dur={timings.query_seconds * 1000:.1f};desc="{timings.queries} queries"')
+    metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
+
+
+def _finish(request, response, timings: RequestTimings):
+    total = time.perf_counter() - timings.start
+    response["Server-Timing"] = _server_timing(timings, total)
+    match = getattr(request, "resolver_match", None)
+    request_bytes = int(request.META.get("CONTENT_LENGTH") or 0)
+    response_bytes = 0 if response.streaming else len(response.content)
+    _record(match.view_name if match else "<unresolved>", timings, total, request_bytes, response_bytes)
+    return response
+
+
+@sync_and_async_middleware
+def instrumentation_middleware(get_response):
+    """Time each request's stages and queries into a ``Server-Timing`` header and the ``stats``.
+
+    Listed first in ``MIDDLEWARE`` so the total covers the other middleware
+    (the session is saved on the way out). Unless
+    ``settings.RAFFLE_INSTRUMENTATION`` is on, Django drops it at startup.
+    """
+    if not settings.RAFFLE_INSTRUMENTATION:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            timings = RequestTimings()
+            token = _current.set(timings)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, timings)
+
+    else:
+
+        def middleware(request):
+            timings = RequestTimings()
+            token = _current.set(timings)
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, timings)
+
+    return middleware
+
+
+class TimedSessionMiddleware(SessionMiddleware):
+    """Django's session middleware, with saving a modified session timed as the "session" stage.
+
+    The size of each modified session goes to the ``raffle_session_bytes`` metric.
+    Whether and how the session is saved is left to Django.
+    """
+
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if session is None or not session.modified:
+            return super().process_response(request, response)
+        with stage("session"):
+            response = super().process_response(request, response)
+        if not session.is_empty() and metrics.enabled():
+            metrics.SESSION_BYTES.observe(len(session.encode(dict(session.items()))))
+        return response
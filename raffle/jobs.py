@@ -0,0 +1,347 @@
+import hashlib
+import json
+import tempfile
+import time
+import traceback
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .caching import historical_version
+from .history import historical_identity_index, iter_historical_csv, iter_historical_rows
+from .importer import import_historical_csv
+from .models import Job, RaffleWorkspace
+from .profiling import is_profiling, profile
+from .services import consolidate_students, iter_csv_upload
+from .workspace import add_workspace_students, create_workspace, draw_workspace, record_results
+
+Progress = Callable[[float, str], None]
+Handler = Callable[[Job, Progress], Dict[str, Any]]
+
+# Job kind -> handler; a handler returns the job's JSON result
+_HANDLERS: Dict[str, Handler] = {}
+# Job kind -> what, besides its parameters and input file, its result depends on
+_VERSIONS: Dict[str, Callable[[Job], Any]] = {}
+# Kinds whose finished result is served again for identical submissions
+_REUSABLE = set()
+
+# Runs a job gets; a stalled job on its last attempt fails instead of going back to the queue
+MAX_ATTEMPTS = 3
+# Seconds between progress writes of a running job
+PROGRESS_INTERVAL = 0.5
+
+
+def job_handler(kind: str, reusable: bool = False, version: Optional[Callable[[Job], Any]] = None):
+    """Register the decorated function as the handler of ``kind`` jobs.
+
+    ``version`` returns what else the result depends on (default: the user's
+    historical database version); it goes into the job's cache key.
+    """
+
+    def register(handler: Handler) -> Handler:
+        _HANDLERS[kind] = handler
+        _VERSIONS[kind] = version or (lambda job: historical_version(job.user))
+        if reusable:
+            _REUSABLE.add(kind)
+        return handler
+
+    return register
+
+
+def _cache_key(job: Job, upload=None) -> str:
+    digest = hashlib.sha256()
+    digest.update(job.kind.encode())
+    digest.update(json.dumps(job.params, sort_keys=True, cls=DjangoJSONEncoder).encode())
+    digest.update(str(_VERSIONS[job.kind](job)).encode())
+    if upload is not None:
+        for chunk in upload.chunks():
+            digest.update(chunk)
+        upload.seek(0)
+    return digest.hexdigest()
+
+
+def submit_job(user, kind: str, params: Optional[Dict[str, Any]] = None, upload=None) -> Job:
+    """Queue a ``kind`` job, or return the job already handling identical input.
+
+    An identical submission (same kind, parameters, input file and version)
+    shares the queued or running job, and for reusable kinds the finished one.
+    With ``settings.RAFFLE_JOBS_EAGER`` the job runs before this returns.
+    """
+    if kind not in _HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    job = Job(user=user, kind=kind, params=params or {})
+    job.cache_key = _cache_key(job, upload)
+    statuses = [Job.STATUS_QUEUED, Job.STATUS_RUNNING] + ([Job.STATUS_DONE] if kind in _REUSABLE else [])
+    existing = Job.objects.filter(user=user, kind=kind, cache_key=job.cache_key, status__in=statuses).last()
+    metrics.record_cache("jobs", existing is not None)
+    if existing is not None:
+        return existing
+    if is_profiling():
+        # Submitted by a profiled request: profile the job too (not part of the cache key)
+        job.params["profile"] = True
+    if upload is not None:
+        metrics.UPLOAD_BYTES.observe(upload.size, kind=kind)
+        job.input_file.save(upload.name, upload, save=False)
+    job.save()
+    if settings.RAFFLE_JOBS_EAGER:
+        now = timezone.now()
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.STATUS_RUNNING, worker="eager", started_at=now, heartbeat_at=now, attempts=1
+        )
+        job = run_job(Job.objects.get(pk=job.pk))
+    return job
+
+
+def _progress_key(job_id: int) -> str:
+    return f"raffle:job-progress:{job_id}"
+
+
+def _progress_reporter(job: Job) -> Progress:
+    """Progress callback of a running job.
+
+    Writes go to ``settings.RAFFLE_JOBS_CACHE`` and, outside transactions
+    (where they would stay invisible until commit), to the job row.
+    """
+    cache = caches[settings.RAFFLE_JOBS_CACHE]
+    last = [0.0, ""]
+
+    def report(fraction: float, message: str = "") -> None:
+        now = time.monotonic()
+        if message == last[1] and now - last[0] < PROGRESS_INTERVAL:
+            return
+        last[:] = [now, message]
+        fraction = min(max(fraction, 0.0), 1.0)
+        cache.set(_progress_key(job.pk), (fraction, message), 3600)
+        if not connection.in_atomic_block:
+            Job.objects.filter(pk=job.pk).update(
+                progress=fraction, message=message[:255], heartbeat_at=timezone.now()
+            )
+
+    return report
+
+
+def job_payload(job: Job) -> Dict[str, Any]:
+    """JSON-ready state of ``job`` for the polling endpoint."""
+    cached = None
+    if job.status == Job.STATUS_RUNNING:
+        cached = caches[settings.RAFFLE_JOBS_CACHE].get(_progress_key(job.pk))
+    return _payload(job, cached)
+
+
+async def ajob_payload(job: Job) -> Dict[str, Any]:
+    """Async ``job_payload``."""
+    cached = None
+    if job.status == Job.STATUS_RUNNING:
+        cached = await caches[settings.RAFFLE_JOBS_CACHE].aget(_progress_key(job.pk))
+    return _payload(job, cached)
+
+
+def _payload(job: Job, cached: Optional[Tuple[float, str]]) -> Dict[str, Any]:
+    progress, message = job.progress, job.message
+    if cached is not None and cached[0] >= progress:
+        progress, message = cached
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": round(progress, 3),
+        "message": message,
+        "result": job.result if job.status == Job.STATUS_DONE else None,
+        "error": job.error.strip().splitlines()[-1] if job.error.strip() else "",
+    }
+
+
+class _ProgressReader:
+    """File wrapper reporting the share of ``size`` bytes read so far."""
+
+    def __init__(self, f, size: int, report: Callable[[float], None]):
+        self._f = f
+        self._size = max(size, 1)
+        self._read = 0
+        self._report = report
+
+    def read(self, n: int = -1):
+        data = self._f.read(n)
+        self._read += len(data)
+        self._report(self._read / self._size)
+        return data
+
+
+def _read_input(job: Job, report: Callable[[float], None]):
+    job.input_file.open("rb")
+    return _ProgressReader(job.input_file, job.input_file.size, report)
+
+
+def claim_next_job(worker: str) -> Optional[Job]:
+    """Mark the oldest queued job as running by ``worker`` and return it."""
+    for job_id in Job.objects.filter(status=Job.STATUS_QUEUED).order_by("id").values_list("id", flat=True)[:10]:
+        now = timezone.now()
+        # Only one worker's conditional update can succeed
+        claimed = Job.objects.filter(id=job_id, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            worker=worker[:64],
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job: Job) -> Job:
+    """Run a claimed job to completion and record its result or error."""
+    start = time.perf_counter()
+    profiled = job.params.get("profile") or job.user.get_username() in settings.RAFFLE_PROFILE_USERS
+    try:
+        if profiled:
+            with profile(job.user, f"job {job.pk} ({job.kind})"):
+                result = _HANDLERS[job.kind](job, _progress_reporter(job))
+        else:
+            result = _HANDLERS[job.kind](job, _progress_reporter(job))
+    except Exception:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.STATUS_FAILED, error=traceback.format_exc(), finished_at=timezone.now()
+        )
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.STATUS_DONE, result=result or {}, progress=1.0, message="Done", finished_at=timezone.now()
+        )
+    finally:
+        if job.input_file:
+            job.input_file.close()
+        caches[settings.RAFFLE_JOBS_CACHE].delete(_progress_key(job.pk))
+    job.refresh_from_db()
+    metrics.JOB_SECONDS.observe(time.perf_counter() - start, kind=job.kind, status=job.status)
+    # The worker may then idle for a while; publish the job's metrics now
+    metrics.flush()
+    return job
+
+
+def run_pending_jobs(worker: str, limit: Optional[int] = None) -> int:
+    """Run queued jobs until the queue is empty (or ``limit`` ran); returns how many ran."""
+    count = 0
+    while limit is None or count < limit:
+        close_old_connections()
+        job = claim_next_job(worker)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def requeue_stale_jobs(stale_after: timedelta) -> int:
+    """Give running jobs whose worker stopped reporting back to the queue; returns how many."""
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, heartbeat_at__lt=timezone.now() - stale_after)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=Job.STATUS_FAILED, error="Worker stopped responding", finished_at=timezone.now()
+    )
+    return failed + stale.update(status=Job.STATUS_QUEUED, worker="")
+
+
+def purge_jobs(older_than: timedelta) -> int:
+    """Delete finished jobs (and their files) created before ``older_than`` ago; returns how many."""
+    count = 0
+    finished = [Job.STATUS_DONE, Job.STATUS_FAILED]
+    for job in Job.objects.filter(status__in=finished, created_at__lt=timezone.now() - older_than).iterator():
+        job.input_file.delete(save=False)
+        job.output_file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+def _draw(workspace: RaffleWorkspace, progress: Progress, start: float) -> Dict[str, Any]:
+    progress(start, "Drawing")
+    # Only the selected students are ranked; the ranking download ranks the rest when asked for
+    selected, eligible = draw_workspace(workspace)
+    return {"workspace_id": workspace.id, "selected": len(selected), "eligible": eligible}
+
+
+@job_handler("prepare_event")
+def _prepare_event(job: Job, progress: Progress) -> Dict[str, Any]:
+    """Read the sign-ups, match them against the historical database, store the draft run and draw."""
+    params = job.params
+    with metrics.PARSE_SECONDS.time(kind="signups"):
+        signups = list(iter_csv_upload(_read_input(job, lambda f: progress(0.3 * f, "Reading sign-ups"))))
+    progress(0.3, "Matching sign-ups against the historical database")
+    ambiguous: list = []
+    master = consolidate_students(
+        signups,
+        iter_historical_rows(job.user),
+        index=historical_identity_index(job.user),
+        ambiguous=ambiguous,
+    )
+    progress(0.6, "Saving the draft run")
+    workspace = create_workspace(
+        job.user,
+        params["event_name"],
+        int(params["capacity"]),
+        date.fromisoformat(params["event_date"]) if params.get("event_date") else None,
+        signups,
+        master,
+        identity_report=ambiguous,
+    )
+    return _draw(workspace, progress, start=0.75)
+
+
+@job_handler("draw")
+def _draw_job(job: Job, progress: Progress) -> Dict[str, Any]:
+    """Run a new draw over a draft run."""
+    workspace = RaffleWorkspace.objects.get(user=job.user, id=job.params["workspace_id"])
+    return _draw(workspace, progress, start=0.0)
+
+
+@job_handler("import_historical")
+def _import_historical(job: Job, progress: Progress) -> Dict[str, Any]:
+    """Replace the historical database with the uploaded CSV."""
+    # The import is one transaction, so later steps only reach pollers through the cache
+    progress(0.0, "Importing rows")
+    report = import_historical_csv(job.user, _read_input(job, lambda f: progress(0.95 * f, "Importing rows")))
+    return report.as_dict()
+
+
+def _results_version(job: Job) -> Any:
+    workspace = RaffleWorkspace.objects.filter(user=job.user, id=job.params.get("workspace_id") or 0).first()
+    if workspace is None:
+        return historical_version(job.user)
+    # Until the draw's results are recorded the export follows from the draw alone; after that
+    # from the historical database, so a later edit is exported but the results are not logged again
+    return workspace.seed, historical_version(job.user) if workspace.results_seed == workspace.seed else None
+
+
+@job_handler("history_csv", reusable=True, version=_results_version)
+def _history_csv(job: Job, progress: Progress) -> Dict[str, Any]:
+    """Add a draft run's new students and results to the historical database and export it as CSV.
+
+    The results are recorded once per draw (see ``record_results``), so downloading
+    the file again, or running the job again after a failure, does not log them twice.
+    """
+    workspace = RaffleWorkspace.objects.filter(user=job.user, id=job.params.get("workspace_id") or 0).first()
+    if workspace is not None:
+        progress(0.1, "Adding new students")
+        add_workspace_students(workspace)
+        progress(0.4, "Recording the event's results")
+        record_results(workspace)
+        # Keyed by the database exported from here on (see _results_version), so the next download reuses this job
+        job.cache_key = _cache_key(job)
+        Job.objects.filter(pk=job.pk).update(cache_key=job.cache_key)
+    progress(0.6, "Writing the CSV")
+    rows = 0
+    with metrics.HISTORY_SECONDS.time(operation="export"), tempfile.TemporaryFile("w+b") as out:
+        for line in iter_historical_csv(job.user):
+            out.write(line.encode())
+            rows += 1
+        out.seek(0)
+        job.output_file.save(f"updated_student_database_{job.pk}.csv", File(out), save=False)
+    Job.objects.filter(pk=job.pk).update(output_file=job.output_file.name)
+    return {"rows": max(rows - 1, 0)}
@@ -0,0 +1,24 @@
+import io
+
+from django.core.management.base import BaseCommand
+
+from raffle.history import index_run_selections
+from raffle.models import RaffleRun
+from raffle.services import iter_csv_upload
+
+
+class Command(BaseCommand):
+    help = "Build the RunSelection index for saved raffle runs from their selected CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Re-index runs that already have entries")
+
+    def handle(self, *args, **options):
+        runs = RaffleRun.objects.order_by("id")
+        if not options["rebuild"]:
+            runs = runs.filter(selections__isnull=True)
+        indexed_runs = indexed_rows = 0
+        for run in runs.iterator():
+            indexed_rows += index_run_selections(run, iter_csv_upload(io.StringIO(run.selected_csv_text or "")))
+            indexed_runs += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed_rows} selections across {indexed_runs} runs"))
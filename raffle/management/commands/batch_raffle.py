@@ -0,0 +1,65 @@
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle.batch import batch_allocate, batch_draw, read_manifest
+from raffle.services import iter_ranking_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Draw many events at once against a user's historical database. The manifest CSV lists one event "
+        "per row (columns: event, capacity, signups = path of its sign-up CSV, relative to the manifest); "
+        "each event's ranking is written as <event>_all_eligible.csv. Events are drawn independently, in "
+        "parallel worker processes, unless --max-wins allocates them together."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("manifest")
+        parser.add_argument("--out", default=".", help="Directory for the ranking CSVs")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument("--seed", type=int, default=None, help="Make the draws reproducible")
+        parser.add_argument(
+            "--max-wins",
+            type=int,
+            default=None,
+            help="Allocate the events together so no student wins more than this many (one per round); "
+            "sign-up CSVs may rank a student's events with a 'preference' column",
+        )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"No user named {options['username']!r}")
+        try:
+            events = read_manifest(options["manifest"])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        if not events:
+            raise CommandError(f"{options['manifest']} lists no events")
+
+        start = time.perf_counter()
+        if options["max_wins"] is not None:
+            allocations = batch_allocate(user, events, max_wins=options["max_wins"], seed=options["seed"])
+            rankings = [(a.name, a.ranked_rows(), len(a.ranking), len(a.selected), []) for a in allocations]
+        else:
+            results = batch_draw(user, events, workers=options["workers"], seed=options["seed"])
+            rankings = [(r.name, r.eligible, len(r.eligible), len(r.selected), r.ambiguous) for r in results]
+        seconds = time.perf_counter() - start
+
+        out = Path(options["out"])
+        out.mkdir(parents=True, exist_ok=True)
+        for event, (name, rows, eligible, selected, ambiguous) in zip(events, rankings):
+            path = out / f"{'_'.join(name.split()) or 'event'}_all_eligible.csv"
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                f.writelines(iter_ranking_csv(rows))
+            self.stdout.write(
+                f"{name}: {len(event.signups)} sign-ups, {eligible} eligible, {selected} selected -> {path}"
+            )
+            for a in ambiguous:
+                who = a["email"] or a["name"]
+                self.stdout.write(self.style.WARNING(f"  {who} matched {len(a['candidates'])} historical students"))
+        self.stdout.write(self.style.SUCCESS(f"Drew {len(events)} events in {seconds:.2f}s"))
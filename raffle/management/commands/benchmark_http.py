@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle.benchmarks import http_load
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running server with concurrent logged-in clients and report throughput and latency. "
+        "Run it against the same database served over ASGI (e.g. uvicorn config.asgi:application) and over "
+        "WSGI (e.g. gunicorn config.wsgi) to compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the server under test")
+        parser.add_argument("--paths", default="/,/events/", help="Comma-separated paths, fetched round-robin")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--username", help="Log every client in as this user")
+        parser.add_argument("--password", default="")
+        parser.add_argument("--min-rps", type=float, default=0.0, help="Fail below this many requests/sec")
+
+    def handle(self, *args, **options):
+        paths = [p.strip() for p in options["paths"].split(",") if p.strip()]
+        try:
+            r = http_load(
+                options["url"],
+                paths,
+                requests=options["requests"],
+                concurrency=options["concurrency"],
+                username=options["username"],
+                password=options["password"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not reach {options['url']}: {e}")
+        self.stdout.write(f"requests:     {r['requests']} ({r['errors']} errors)")
+        for sample in r["error_samples"]:
+            self.stdout.write(f"  {sample}")
+        self.stdout.write(f"duration:     {r['seconds']:.2f}s")
+        self.stdout.write(f"latency p50:  {r['p50'] * 1000:.1f} ms")
+        self.stdout.write(f"latency p95:  {r['p95'] * 1000:.1f} ms")
+        self.stdout.write(f"latency p99:  {r['p99'] * 1000:.1f} ms")
+        if r["errors"]:
+            raise CommandError(f"{r['errors']} requests failed")
+        if r["rps"] < options["min_rps"]:
+            raise CommandError(f"{r['rps']:.1f} requests/sec (expected at least {options['min_rps']})")
+        self.stdout.write(self.style.SUCCESS(f"{r['rps']:.1f} requests/sec"))
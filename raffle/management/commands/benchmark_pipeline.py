@@ -0,0 +1,73 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle.benchmarks import benchmark_report, compare_reports, generate_csvs, pipeline_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Time and measure the peak memory of each stage of a draw (parse, consolidate, raffle, exports) "
+        "on synthetic sign-up and historical CSVs, optionally saving the results as JSON and comparing "
+        "them with an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated row counts (1k-1M)")
+        parser.add_argument(
+            "--historical-rows", type=int, default=None, help="Historical database rows (default: same as sign-ups)"
+        )
+        parser.add_argument("--capacity", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--no-memory", action="store_true", help="Skip the (slower) peak-memory runs")
+        parser.add_argument("--csv-dir", default=None, help="Keep the generated CSVs in this directory")
+        parser.add_argument("--output", default=None, help="Save the results to this JSON file")
+        parser.add_argument("--baseline", default=None, help="Compare with the results saved in this JSON file")
+        parser.add_argument(
+            "--max-slowdown",
+            type=float,
+            default=1.5,
+            help="Fail when a stage takes this many times the baseline's time or peak memory",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(v) for v in options["sizes"].split(",") if v.strip()]
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"], encoding="utf-8") as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['baseline']}: {e}")
+
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in sizes:
+                historical = options["historical_rows"] or n
+                paths = generate_csvs(options["csv_dir"] or tmp, n, historical, seed=options["seed"])
+                stages = pipeline_benchmark(
+                    *paths,
+                    capacity=options["capacity"],
+                    repeat=options["repeat"],
+                    seed=options["seed"],
+                    memory=not options["no_memory"],
+                )
+                results.append({"rows": n, "historical_rows": historical, "stages": stages})
+                self.stdout.write(f"{n} sign-ups, {historical} historical rows")
+                for stage, r in stages.items():
+                    peak = f"{r['peak_bytes'] / (1024 * 1024):>9.1f} MiB" if "peak_bytes" in r else ""
+                    self.stdout.write(f"  {stage:<30} {r['seconds']:>9.3f}s {peak}".rstrip())
+
+        report = benchmark_report(sizes, results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Saved to {options['output']}")
+        if baseline is not None:
+            regressions = compare_reports(baseline, report, options["max_slowdown"])
+            if regressions:
+                raise CommandError("Regressions over the baseline:\n" + "\n".join(regressions))
+            self.stdout.write(f"No stage over {options['max_slowdown']}x the baseline")
+        self.stdout.write(self.style.SUCCESS(f"Benchmarked {len(sizes)} size(s)"))
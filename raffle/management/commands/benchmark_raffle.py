@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle.benchmarks import ENGINES, engines_agree, raffle_scaling
+from raffle.vectorized import HAS_NUMPY
+
+
+class Command(BaseCommand):
+    help = "Time run_priority_raffle at growing eligible-pool sizes and check it scales as O(n log n)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100000,1000000", help="Comma-separated eligible-pool sizes")
+        parser.add_argument("--capacity", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument("--engine", choices=sorted(ENGINES), default="python")
+        parser.add_argument(
+            "--verify",
+            type=int,
+            default=0,
+            metavar="N",
+            help="First check the engine ranks N students identically to the pure-Python engine",
+        )
+        parser.add_argument(
+            "--max-ratio",
+            type=float,
+            default=2.0,
+            help="Fail when seconds/(n log n) grows by more than this factor over the smallest size",
+        )
+
+    def handle(self, *args, **options):
+        engine = options["engine"]
+        if engine == "numpy" and not HAS_NUMPY:
+            raise CommandError("The numpy engine needs numpy installed")
+        if options["verify"]:
+            if not engines_agree(options["verify"], capacity=options["capacity"], engine=engine):
+                raise CommandError(f"The {engine} engine does not match the pure-Python ranking")
+            self.stdout.write(f"{engine} engine matches the pure-Python ranking on {options['verify']} rows")
+        sizes = [int(v) for v in options["sizes"].split(",") if v.strip()]
+        results = raffle_scaling(sizes, capacity=options["capacity"], repeat=options["repeat"], engine=engine)
+        self.stdout.write(f"{'n':>10}  {'seconds':>9}  {'ns/(n log n)':>13}  {'ratio':>6}")
+        for r in results:
+            self.stdout.write(f"{r['n']:>10}  {r['seconds']:>9.3f}  {r['per_nlogn'] * 1e9:>13.2f}  {r['ratio']:>6.2f}")
+        worst = max(r["ratio"] for r in results)
+        if worst > options["max_ratio"]:
+            raise CommandError(f"The {engine} raffle grew faster than O(n log n) (ratio {worst:.2f})")
+        self.stdout.write(self.style.SUCCESS(f"Consistent with O(n log n) (max ratio {worst:.2f})"))
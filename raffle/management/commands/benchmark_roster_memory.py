@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle.benchmarks import roster_memory
+
+
+class Command(BaseCommand):
+    help = "Compare the memory held by a consolidated roster as dict rows vs StudentRecord rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500000)
+        parser.add_argument("--min-reduction", type=float, default=3.0)
+
+    def handle(self, *args, **options):
+        r = roster_memory(options["rows"])
+        mib = 1024 * 1024
+        self.stdout.write(f"rows:            {r['n']}")
+        self.stdout.write(f"dict rows:       {r['dict_bytes'] / mib:.1f} MiB")
+        self.stdout.write(f"StudentRecord:   {r['record_bytes'] / mib:.1f} MiB")
+        if r["reduction"] < options["min_reduction"]:
+            raise CommandError(f"Only {r['reduction']:.2f}x smaller (expected {options['min_reduction']}x)")
+        self.stdout.write(self.style.SUCCESS(f"{r['reduction']:.2f}x smaller"))
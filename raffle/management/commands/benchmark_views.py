@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle.benchmarks import benchmark_report, compare_reports, view_latency
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the organiser flow (upload, config, selection, results, save, event detail) through the test "
+        "client on synthetic data and report each request's p50/p95 latency, query count and session size, "
+        "optionally saving the results as JSON and failing on a regression over an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--signups", type=int, default=2000)
+        parser.add_argument("--historical-rows", type=int, default=5000)
+        parser.add_argument("--capacity", type=int, default=100)
+        parser.add_argument("--iterations", type=int, default=10, help="Times the whole flow is run")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default=None, help="Save the results to this JSON file")
+        parser.add_argument("--baseline", default=None, help="Compare with the results saved in this JSON file")
+        parser.add_argument(
+            "--max-slowdown",
+            type=float,
+            default=1.5,
+            help="Fail when a request's p95, query count or session size is this many times the baseline's",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"], encoding="utf-8") as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['baseline']}: {e}")
+
+        try:
+            steps = view_latency(
+                signups=options["signups"],
+                historical=options["historical_rows"],
+                capacity=options["capacity"],
+                iterations=options["iterations"],
+                seed=options["seed"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"{'request':<14} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'session':>9}")
+        for step, r in steps.items():
+            self.stdout.write(
+                f"{step:<14} {r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} {r['queries']:>8} "
+                f"{r['session_bytes']:>8}B"
+            )
+
+        report = benchmark_report(
+            [options["signups"]],
+            [{"rows": options["signups"], "historical_rows": options["historical_rows"], "stages": steps}],
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Saved to {options['output']}")
+        if baseline is not None:
+            regressions = compare_reports(
+                baseline, report, options["max_slowdown"], metrics=("p95", "queries", "session_bytes")
+            )
+            if regressions:
+                raise CommandError("Regressions over the baseline:\n" + "\n".join(regressions))
+            self.stdout.write(f"No request over {options['max_slowdown']}x the baseline")
+        self.stdout.write(self.style.SUCCESS(f"Ran the flow {options['iterations']} times"))
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle.importer import import_historical_csv
+
+
+class Command(BaseCommand):
+    help = "Replace a user's historical database with a CSV file, reporting throughput and rejected rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("csv_path")
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per INSERT batch")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"No user named {options['username']!r}")
+        with open(options["csv_path"], "rb") as f:
+            report = import_historical_csv(user, f, batch_size=options["batch_size"])
+        for line, reason in report.rejected:
+            self.stdout.write(self.style.WARNING(f"line {line}: {reason}"))
+        if report.rejected_count > len(report.rejected):
+            self.stdout.write(self.style.WARNING(f"... {report.rejected_count - len(report.rejected)} more"))
+        self.stdout.write(self.style.SUCCESS(report.summary()))
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from raffle.attendance import rebuild_counters
+from raffle.history import touch_historical
+from raffle.models import Student
+
+
+class Command(BaseCommand):
+    help = "Recompute students' attendance counters from their imported baseline and the attendance log."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rebuild this user's historical database (username)")
+
+    def handle(self, *args, **options):
+        students = Student.objects.all()
+        if options["user"]:
+            user = get_user_model().objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']!r}")
+            students = students.filter(owner=user)
+        count = rebuild_counters(students)
+        for user in get_user_model().objects.filter(id__in=students.values("owner_id")):
+            touch_historical(user)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters of {count} students"))
@@ -0,0 +1,43 @@
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from raffle.jobs import purge_jobs, requeue_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (imports, sign-up processing, draws, history exports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls of an empty queue")
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=3600,
+            help="Seconds without progress after which a running job is requeued (e.g. its worker was killed)",
+        )
+        parser.add_argument("--purge-days", type=int, default=7, help="Delete finished jobs older than this")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        requeued = requeue_stale_jobs(timedelta(seconds=options["stale_after"]))
+        purged = purge_jobs(timedelta(days=options["purge_days"]))
+        self.stdout.write(f"Worker {worker}: requeued {requeued} stalled jobs, purged {purged} old jobs")
+        total = 0
+        try:
+            while True:
+                ran = run_pending_jobs(worker)
+                total += ran
+                if ran:
+                    self.stdout.write(f"Ran {ran} jobs")
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} jobs"))
@@ -0,0 +1,263 @@
+import atexit
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+# Every metric, in exposition order
+_REGISTRY: List["_Metric"] = []
+_lock = threading.Lock()
+
+SIZE_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+BYTE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024**2, 10 * 1024**2, 100 * 1024**2)
+SECOND_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def enabled() -> bool:
+    return settings.RAFFLE_METRICS
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # label values -> value (see the subclasses)
+        self.values: Dict[Tuple[str, ...], Any] = {}
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+
+class Counter(_Metric):
+    """A count that only goes up (raffles run, cache hits)."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        if not enabled():
+            return
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _maybe_flush()
+
+    def merge(self, key: Tuple[str, ...], value: float, into: Dict[Tuple[str, ...], Any]) -> None:
+        into[key] = into.get(key, 0) + value
+
+
+class Histogram(_Metric):
+    """Observations counted into ``buckets`` (upper bounds), with their sum."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not enabled():
+            return
+        key = self._key(labels)
+        with _lock:
+            # [count per bucket (the last is +Inf), sum]
+            entry = self.values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0][next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))] += 1
+            entry[1] += value
+        _maybe_flush()
+
+    def time(self, **labels: Any) -> "_Timer":
+        """Context manager (or decorator) observing the seconds its block takes."""
+        return _Timer(self, labels)
+
+    def merge(self, key: Tuple[str, ...], value: list, into: Dict[Tuple[str, ...], Any]) -> None:
+        entry = into.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+        if len(value[0]) == len(entry[0]):
+            entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+            entry[1] += value[1]
+
+
+class _Timer(contextlib.ContextDecorator):
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # As a decorator, each call gets its own timer: calls may overlap across threads
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+DRAWS = Counter("raffle_draws_total", "Raffle draws run", ["ranking"])
+ELIGIBLE = Histogram("raffle_eligible_students", "Eligible students per draw", SIZE_BUCKETS, ["ranking"])
+SELECTED = Histogram("raffle_selected_students", "Students selected per draw", SIZE_BUCKETS, ["ranking"])
+UPLOAD_BYTES = Histogram("raffle_upload_bytes", "Size of uploaded CSVs", BYTE_BUCKETS, ["kind"])
+PARSE_SECONDS = Histogram("raffle_csv_parse_seconds", "Time to read an uploaded CSV", SECOND_BUCKETS, ["kind"])
+HISTORY_SECONDS = Histogram(
+    "raffle_history_write_seconds",
+    "Time to rewrite or export the historical database",
+    SECOND_BUCKETS,
+    ["operation"],
+)
+JOB_SECONDS = Histogram("raffle_job_seconds", "Background job run time", SECOND_BUCKETS, ["kind", "status"])
+SESSION_BYTES = Histogram("raffle_session_bytes", "Encoded size of saved sessions", BYTE_BUCKETS)
+CACHE_REQUESTS = Counter("raffle_cache_requests_total", "Cache lookups", ["cache", "result"])
+
+
+def record_draw(ranking: str, eligible: int, selected: int) -> None:
+    """Count a draw: ``ranking`` is "full" (every eligible student ranked) or "top" (selection only)."""
+    DRAWS.inc(ranking=ranking)
+    ELIGIBLE.observe(eligible, ranking=ranking)
+    SELECTED.observe(selected, ranking=ranking)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# Each process writes its metrics to its own file in settings.RAFFLE_METRICS_DIR, so the
+# endpoint can add up the web workers' and the job worker's (see _merged)
+_file: Optional[Path] = None
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+FLUSH_INTERVAL = 5.0
+
+
+def _snapshot() -> Dict[str, Any]:
+    # Copies, taken under the lock: histogram entries are updated in place
+    with _lock:
+        return {
+            m.name: json.loads(json.dumps([[list(key), value] for key, value in m.values.items()])) for m in _REGISTRY
+        }
+
+
+def flush() -> None:
+    """Write this process's metrics to its file (when ``settings.RAFFLE_METRICS_DIR`` is set).
+
+    Failing to write is ignored: metrics must never break the work they measure.
+    """
+    global _file, _last_flush
+    directory = settings.RAFFLE_METRICS_DIR
+    if not enabled() or not directory:
+        return
+    with _flush_lock, contextlib.suppress(OSError):
+        _last_flush = time.monotonic()
+        if _file is None:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            # One file per process, replaced in place; _merged deletes those of dead processes
+            _file = Path(directory) / f"{os.getpid()}.json"
+            atexit.register(flush)
+        # Replaced in one step, so readers never see a half-written file
+        tmp = _file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(_snapshot()), encoding="utf-8")
+        os.replace(tmp, _file)
+
+
+def _maybe_flush() -> None:
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush()
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name != "posix":
+        # Elsewhere os.kill would terminate the process; keep every file
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merged() -> Dict[str, Dict[Tuple[str, ...], Any]]:
+    """Every process's metrics added up: this one's live values and the others' files."""
+    by_name = {m.name: m for m in _REGISTRY}
+    merged: Dict[str, Dict[Tuple[str, ...], Any]] = {m.name: {} for m in _REGISTRY}
+    snapshots = [_snapshot()]
+    directory = settings.RAFFLE_METRICS_DIR
+    if directory and Path(directory).is_dir():
+        for path in Path(directory).glob("*.json"):
+            if path == _file:
+                continue
+            if path.stem.isdigit() and not _process_alive(int(path.stem)):
+                # Its counters go with it, which Prometheus reads as a counter reset
+                with contextlib.suppress(OSError):
+                    path.unlink()
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            for key, value in values:
+                metric.merge(tuple(key), value, merged[name])
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def iter_exposition() -> Iterator[str]:
+    """The metrics in the Prometheus text exposition format, line by line."""
+    merged = _merged()
+    for metric in _REGISTRY:
+        yield f"# HELP {metric.name} {metric.help}\n"
+        yield f"# TYPE {metric.name} {metric.type}\n"
+        for key, value in sorted(merged[metric.name].items()):
+            if metric.type == "counter":
+                yield f"{metric.name}{_labels(metric.labels, key)} {_number(value)}\n"
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{metric.name}_bucket{_labels(metric.labels, key, le)} {cumulative}\n"
+            yield f"{metric.name}_sum{_labels(metric.labels, key)} {_number(total)}\n"
+            yield f"{metric.name}_count{_labels(metric.labels, key)} {cumulative}\n"
+
+    # Derived for convenience; Prometheus can compute it from raffle_cache_requests_total too
+    yield "# HELP raffle_cache_hit_ratio Share of cache lookups that were hits\n"
+    yield "# TYPE raffle_cache_hit_ratio gauge\n"
+    lookups: Dict[str, Dict[str, float]] = {}
+    for (cache, result), count in merged[CACHE_REQUESTS.name].items():
+        lookups.setdefault(cache, {})[result] = count
+    for cache, results in sorted(lookups.items()):
+        total = sum(results.values())
+        yield f'raffle_cache_hit_ratio{{cache="{_escape(cache)}"}} {_number(results.get("hit", 0) / total)}\n'
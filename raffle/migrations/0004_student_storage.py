@@ -0,0 +1,86 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0003_rafflerun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentEventColumn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('value', models.CharField(blank=True, default='', max_length=255)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='attended_events',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='extra',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='first_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='last_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='latest_attended',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='students', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='historicaldata',
+            name='csv_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='email',
+            field=models.EmailField(blank=True, default='', max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['owner', 'position'], name='raffle_stud_owner_i_fe93a1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['owner', 'email'], name='raffle_stud_owner_i_9c7df1_idx'),
+        ),
+        migrations.AddField(
+            model_name='studenteventcolumn',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_columns', to='raffle.student'),
+        ),
+        migrations.AddConstraint(
+            model_name='studenteventcolumn',
+            constraint=models.UniqueConstraint(fields=('student', 'index'), name='unique_student_event_column'),
+        ),
+    ]
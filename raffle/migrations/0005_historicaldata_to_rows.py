@@ -0,0 +1,183 @@
+# Moves historical databases stored as a CSV blob into Student rows.
+
+import csv
+import io
+import re
+
+from django.db import migrations
+
+
+# Copies of the raffle.history helpers as they were when this migration was written,
+# so later changes to them cannot change what it does.
+FIELD_COLUMNS = {
+    "email": ("email",),
+    "first_name": ("first name", "firstname"),
+    "last_name": ("last name", "lastname"),
+    "student_class": ("class", "student_class"),
+    "user_id": ("user_id",),
+    "num_absences": ("absent",),
+    "num_late_arrivals": ("late",),
+    "num_events_attended": ("attended",),
+    "attended_events": ("attended events",),
+    "latest_attended": ("latest attended",),
+}
+COUNTER_FIELDS = {"num_absences", "num_late_arrivals", "num_events_attended"}
+_EVENT_COLUMN = re.compile(r"^event(\d+)$")
+
+
+def _to_int(value, default=0):
+    try:
+        if value is None:
+            return default
+        if isinstance(value, (int, float)):
+            return int(value)
+        s = str(value).strip()
+        if s == "":
+            return default
+        if s.isdecimal():
+            return int(s)
+        return int(float(s))
+    except Exception:
+        return default
+
+
+def split_historical_row(row):
+    consumed = {"_events_columns"}
+    fields = {}
+    for field, aliases in FIELD_COLUMNS.items():
+        value = ""
+        for alias in aliases:
+            if row.get(alias):
+                value = row[alias]
+                break
+        consumed.update(aliases)
+        fields[field] = _to_int(value) if field in COUNTER_FIELDS else str(value or "").strip()
+    fields["email"] = fields["email"].lower()
+    fields["name"] = f"{fields['first_name']} {fields['last_name']}".strip()
+
+    events = {}
+    for key, value in row.items():
+        match = _EVENT_COLUMN.match(str(key))
+        if match:
+            events[int(match.group(1))] = str(value or "")
+            consumed.add(key)
+
+    extra = {
+        k: v
+        for k, v in row.items()
+        if k not in consumed and not str(k).startswith("event") and v not in (None, "")
+    }
+    return fields, events, extra
+
+
+def build_historical_row(fields, events, extra):
+    row = {
+        "email": fields.get("email") or "",
+        "first name": fields.get("first_name") or "",
+        "last name": fields.get("last_name") or "",
+        "class": fields.get("student_class") or "",
+    }
+    for index in sorted(events):
+        row[f"event{index}"] = events[index]
+    row.update(
+        {
+            "absent": str(fields.get("num_absences") or 0),
+            "late": str(fields.get("num_late_arrivals") or 0),
+            "attended": str(fields.get("num_events_attended") or 0),
+            "attended events": fields.get("attended_events") or "",
+            "latest attended": fields.get("latest_attended") or "",
+        }
+    )
+    if fields.get("user_id"):
+        row["user_id"] = fields["user_id"]
+    row.update(extra or {})
+    return row
+
+
+def historical_csv_from_rows(rows):
+    max_event_cols = 0
+    extra_columns = []
+    split_rows = []
+    for r in rows:
+        fields, events, extra = split_historical_row(r)
+        if events:
+            max_event_cols = max(max_event_cols, max(events))
+        for k in extra:
+            if k not in extra_columns:
+                extra_columns.append(k)
+        split_rows.append((fields, events, extra))
+
+    headers = ["email", "First Name", "Last Name", "Class"]
+    headers.extend(f"Event{i}" for i in range(1, max_event_cols + 1))
+    headers.extend(["Absent", "Late", "Attended", "Attended Events", "Latest Attended"])
+    headers.extend(extra_columns)
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(headers)
+    for fields, events, extra in split_rows:
+        row = [fields["email"], fields["first_name"], fields["last_name"], fields["student_class"]]
+        row.extend(events.get(i, "") for i in range(1, max_event_cols + 1))
+        row.extend([
+            fields["num_absences"],
+            fields["num_late_arrivals"],
+            fields["num_events_attended"],
+            fields["attended_events"],
+            fields["latest_attended"],
+        ])
+        row.extend(extra.get(k, "") for k in extra_columns)
+        writer.writerow(row)
+    return output.getvalue()
+
+
+def _parse(csv_text):
+    reader = csv.DictReader(io.StringIO(csv_text))
+    for row in reader:
+        yield {
+            (k or "").replace("\ufeff", "").strip().lower(): (v.strip() if isinstance(v, str) else v)
+            for k, v in row.items()
+        }
+
+
+def csv_to_rows(apps, schema_editor):
+    HistoricalData = apps.get_model("raffle", "HistoricalData")
+    Student = apps.get_model("raffle", "Student")
+    StudentEventColumn = apps.get_model("raffle", "StudentEventColumn")
+    for hd in HistoricalData.objects.exclude(csv_text=""):
+        Student.objects.filter(owner_id=hd.user_id).delete()
+        for position, row in enumerate(_parse(hd.csv_text)):
+            fields, events, extra = split_historical_row(row)
+            student = Student.objects.create(owner_id=hd.user_id, position=position, extra=extra, **fields)
+            StudentEventColumn.objects.bulk_create(
+                [StudentEventColumn(student=student, index=i, value=v) for i, v in events.items()]
+            )
+        hd.csv_text = ""
+        hd.save(update_fields=["csv_text"])
+
+
+def rows_to_csv(apps, schema_editor):
+    HistoricalData = apps.get_model("raffle", "HistoricalData")
+    Student = apps.get_model("raffle", "Student")
+    for hd in HistoricalData.objects.all():
+        rows = []
+        for student in Student.objects.filter(owner_id=hd.user_id).order_by("position"):
+            fields = {name: getattr(student, name) for name in (
+                "email", "first_name", "last_name", "student_class", "user_id", "num_absences",
+                "num_late_arrivals", "num_events_attended", "attended_events", "latest_attended",
+            )}
+            events = {c.index: c.value for c in student.event_columns.all()}
+            rows.append(build_historical_row(fields, events, student.extra))
+        hd.csv_text = historical_csv_from_rows(rows) if rows else ""
+        hd.save(update_fields=["csv_text"])
+        Student.objects.filter(owner_id=hd.user_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raffle", "0004_student_storage"),
+    ]
+
+    operations = [
+        migrations.RunPython(csv_to_rows, rows_to_csv),
+    ]
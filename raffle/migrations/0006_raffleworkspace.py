@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:15
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0005_historicaldata_to_rows'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RaffleWorkspace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_name', models.CharField(max_length=255)),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('event_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='raffle_workspaces', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkspaceRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('signup', 'Sign-up'), ('master', 'Master')], max_length=16)),
+                ('position', models.PositiveIntegerField()),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('selected', models.BooleanField(default=False)),
+                ('workspace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='raffle.raffleworkspace')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['workspace', 'kind', 'position'], name='raffle_work_workspa_794595_idx'), models.Index(fields=['workspace', 'rank'], name='raffle_work_workspa_513753_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0006_raffleworkspace'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffleworkspace',
+            name='ranking_complete',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='raffleworkspace',
+            name='seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workspacerow',
+            name='eligible',
+            field=models.BooleanField(default=False),
+        ),
+    ]
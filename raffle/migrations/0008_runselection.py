@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0007_workspace_seed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RunSelection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(max_length=254)),
+                ('date', models.DateField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='selections', to='raffle.rafflerun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run', 'email'], name='raffle_runs_run_id_86135c_idx'), models.Index(fields=['email', 'date'], name='raffle_runs_email_d284d5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import DatabaseError, migrations, transaction
+
+
+# Copies of the raffle.search SQL as it was when this migration was written,
+# so later changes to it cannot change what it does.
+FTS_TABLE = "raffle_student_fts"
+FTS_CREATE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, email, student_class, owner_id UNINDEXED,
+    content='raffle_student', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+)
+"""
+FTS_TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON raffle_student BEGIN
+    INSERT INTO {FTS_TABLE}(rowid, name, email, student_class, owner_id)
+    VALUES (new.id, new.name, new.email, new.student_class, new.owner_id);
+END
+""",
+    f"{FTS_TABLE}_ad": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON raffle_student BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email, student_class, owner_id)
+    VALUES ('delete', old.id, old.name, old.email, old.student_class, old.owner_id);
+END
+""",
+    f"{FTS_TABLE}_au": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON raffle_student BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email, student_class, owner_id)
+    VALUES ('delete', old.id, old.name, old.email, old.student_class, old.owner_id);
+    INSERT INTO {FTS_TABLE}(rowid, name, email, student_class, owner_id)
+    VALUES (new.id, new.name, new.email, new.student_class, new.owner_id);
+END
+""",
+}
+
+
+def install(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "sqlite":
+        return
+    try:
+        with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+            cursor.execute(FTS_CREATE)
+    except DatabaseError:
+        # SQLite built without FTS5: search falls back to the trigram index
+        return
+    with conn.cursor() as cursor:
+        for sql in FTS_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        for name in FTS_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raffle", "0008_runselection"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
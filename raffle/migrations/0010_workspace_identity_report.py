@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0009_student_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffleworkspace',
+            name='identity_report',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def counters_to_baseline(apps, schema_editor):
+    # Existing counters have no log behind them, so they become the baseline
+    Student = apps.get_model("raffle", "Student")
+    Student.objects.update(
+        base_events_attended=F("num_events_attended"),
+        base_absences=F("num_absences"),
+        base_late_arrivals=F("num_late_arrivals"),
+        base_attended_events=F("attended_events"),
+        base_latest_attended=F("latest_attended"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0010_workspace_identity_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='base_absences',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='base_attended_events',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='base_events_attended',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='base_late_arrivals',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='base_latest_attended',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='AttendanceEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('attended', 'Attended'), ('absent', 'Absent'), ('late', 'Late')], max_length=8)),
+                ('delta', models.SmallIntegerField(default=1)),
+                ('event_name', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance', to='raffle.rafflerun')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance', to='raffle.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'id'], name='raffle_atte_student_7eb36d_idx'), models.Index(fields=['run', 'kind'], name='raffle_atte_run_id_6aee26_idx')],
+            },
+        ),
+        migrations.RunPython(counters_to_baseline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+def pack_event_columns(apps, schema_editor):
+    Student = apps.get_model("raffle", "Student")
+    StudentEventColumn = apps.get_model("raffle", "StudentEventColumn")
+    cells = {}
+    qs = StudentEventColumn.objects.order_by("student_id", "index").values_list("student_id", "index", "value")
+    for student_id, index, value in qs.iterator(chunk_size=5000):
+        cells.setdefault(student_id, {})[str(index)] = value
+    students = []
+    for student in Student.objects.filter(id__in=list(cells)).only("id").iterator(chunk_size=2000):
+        student.event_cells = cells[student.id]
+        students.append(student)
+    Student.objects.bulk_update(students, ["event_cells"], batch_size=1000)
+
+
+def unpack_event_columns(apps, schema_editor):
+    Student = apps.get_model("raffle", "Student")
+    StudentEventColumn = apps.get_model("raffle", "StudentEventColumn")
+    columns = [
+        StudentEventColumn(student_id=student_id, index=int(index), value=value)
+        for student_id, cells in Student.objects.exclude(event_cells={}).values_list("id", "event_cells").iterator()
+        for index, value in cells.items()
+    ]
+    StudentEventColumn.objects.bulk_create(columns, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0011_attendance_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='event_cells',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(pack_event_columns, unpack_event_columns),
+        migrations.DeleteModel(
+            name='StudentEventColumn',
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:16
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0012_student_event_cells'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('params', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('input_file', models.FileField(blank=True, upload_to='jobs/input/')),
+                ('output_file', models.FileField(blank=True, upload_to='jobs/output/')),
+                ('result', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('error', models.TextField(blank=True, default='')),
+                ('progress', models.FloatField(default=0)),
+                ('message', models.CharField(blank=True, default='', max_length=255)),
+                ('cache_key', models.CharField(blank=True, default='', max_length=64)),
+                ('worker', models.CharField(blank=True, default='', max_length=64)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='raffle_job_status_529a17_idx'), models.Index(fields=['user', 'kind', 'cache_key'], name='raffle_job_user_id_ddf442_idx')],
+            },
+        ),
+    ]
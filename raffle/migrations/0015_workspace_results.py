@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0014_performanceprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='raffleworkspace',
+            name='results_seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='raffleworkspace',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='raffle.rafflerun'),
+        ),
+    ]
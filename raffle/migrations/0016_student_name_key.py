@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Copy of raffle.identity.normalize_name as it was when this migration was written
+def normalize_name(first_name="", last_name="", name=""):
+    full = f"{first_name or ''} {last_name or ''}"
+    if not full.strip():
+        full = str(name or "")
+    return " ".join(full.split()).casefold()
+
+
+def fill_name_keys(apps, schema_editor):
+    Student = apps.get_model("raffle", "Student")
+    students = []
+    for student in Student.objects.only("id", "first_name", "last_name", "name").iterator(chunk_size=5000):
+        student.name_key = normalize_name(student.first_name, student.last_name, student.name)
+        students.append(student)
+        if len(students) >= 5000:
+            Student.objects.bulk_update(students, ["name_key"], batch_size=1000)
+            students = []
+    Student.objects.bulk_update(students, ["name_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('raffle', '0015_workspace_results'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='name_key',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['owner', 'name_key'], name='raffle_stud_owner_i_316381_idx'),
+        ),
+    ]
@@ -1,29 +1,59 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth import get_user_model
 
 
 class Student(models.Model):
-    """Represents a student and their attendance history summary.
+    """A row of an organiser's historical database.
 
-    Note: The raffle algorithm primarily operates on uploaded CSV data stored in
-    session. These models are provided to persist core entities for future
-    enhancements (e.g., storing historical runs) and to satisfy the requirement
-    to add needed backend models.
+    Each user's historical database is stored as one ``Student`` row per CSV
+    row (ordered by ``position``). CSV upload and download are adapters over
+    these rows (see ``raffle.history`` and ``raffle.importer``).
     """
 
+    owner = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, related_name="students", blank=True, null=True
+    )
+    position = models.PositiveIntegerField(default=0)
+
     user_id = models.CharField(max_length=64, blank=True, null=True)
     name = models.CharField(max_length=255)
-    email = models.EmailField(unique=True)
+    # ``raffle.identity.normalize_name`` of the name, for identity lookups in the database
+    name_key = models.CharField(max_length=255, blank=True, default="")
+    first_name = models.CharField(max_length=255, blank=True, default="")
+    last_name = models.CharField(max_length=255, blank=True, default="")
+    email = models.EmailField(blank=True, default="")
     student_class = models.CharField(max_length=255, blank=True, null=True)
 
     num_absences = models.PositiveIntegerField(default=0)
     num_late_arrivals = models.PositiveIntegerField(default=0)
     num_events_attended = models.PositiveIntegerField(default=0)
     last_attended_date = models.DateField(blank=True, null=True)
+    latest_attended = models.CharField(max_length=255, blank=True, default="")
+    attended_events = models.TextField(blank=True, default="")
+    # Columns of the uploaded CSV that have no dedicated field
+    extra = models.JSONField(default=dict, blank=True)
+    # Event1..EventN cells keyed by N (as a string)
+    event_cells = models.JSONField(default=dict, blank=True)
+
+    # Attendance as imported. The counters above are materialized from these
+    # plus the student's ``AttendanceEntry`` log (see ``raffle.attendance``).
+    base_events_attended = models.PositiveIntegerField(default=0)
+    base_absences = models.PositiveIntegerField(default=0)
+    base_late_arrivals = models.PositiveIntegerField(default=0)
+    base_attended_events = models.TextField(blank=True, default="")
+    base_latest_attended = models.CharField(max_length=255, blank=True, default="")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "position"]),
+            models.Index(fields=["owner", "email"]),
+            models.Index(fields=["owner", "name_key"]),
+        ]
+
     def __str__(self) -> str:  # pragma: no cover - trivial
         return f"{self.name} <{self.email}>"
 
@@ -41,10 +71,15 @@ class Event(models.Model):
 
 
 class HistoricalData(models.Model):
-    """Stores the latest historical database CSV per user."""
+    """Marks that a user has a historical database and when it last changed.
+
+    The rows themselves live in ``Student``; ``csv_text`` is only kept for
+    databases saved before the relational storage existed and is emptied by
+    the 0005 data migration.
+    """
 
     user = models.OneToOneField(get_user_model(), on_delete=models.CASCADE, related_name="historical_data")
-    csv_text = models.TextField()
+    csv_text = models.TextField(blank=True, default="")
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:  # pragma: no cover - trivial
@@ -67,3 +102,175 @@ class RaffleRun(models.Model):
     def __str__(self) -> str:  # pragma: no cover - trivial
         return f"{self.name} ({self.date})"
 
+
+class RaffleWorkspace(models.Model):
+    """Draft raffle run being configured, ranked and reviewed.
+
+    The session only stores the workspace id; the sign-up and master lists
+    are kept as ``WorkspaceRow`` rows so each page fetches just what it renders.
+    """
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="raffle_workspaces")
+    event_name = models.CharField(max_length=255)
+    capacity = models.PositiveIntegerField(default=0)
+    event_date = models.DateField(blank=True, null=True)
+    # Tie-break seed of the latest draw; lets the full ranking be computed later
+    seed = models.BigIntegerField(blank=True, null=True)
+    ranking_complete = models.BooleanField(default=False)
+    # Sign-ups that matched several historical students (see consolidate_students)
+    identity_report = models.JSONField(default=list, blank=True)
+    # The run the results were logged under, and the seed of the draw they were (see record_results)
+    run = models.ForeignKey(RaffleRun, on_delete=models.SET_NULL, related_name="+", blank=True, null=True)
+    results_seed = models.BigIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"RaffleWorkspace<{self.event_name}>"
+
+
+class WorkspaceRow(models.Model):
+    """A sign-up or master-list student of a ``RaffleWorkspace``."""
+
+    KIND_SIGNUP = "signup"
+    KIND_MASTER = "master"
+    KIND_CHOICES = [(KIND_SIGNUP, "Sign-up"), (KIND_MASTER, "Master")]
+
+    workspace = models.ForeignKey(RaffleWorkspace, on_delete=models.CASCADE, related_name="rows")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    position = models.PositiveIntegerField()
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    eligible = models.BooleanField(default=False)
+    # Set by the latest raffle over the master list; null when not (yet) ranked
+    rank = models.PositiveIntegerField(blank=True, null=True)
+    selected = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["workspace", "kind", "position"]),
+            models.Index(fields=["workspace", "rank"]),
+        ]
+
+    def as_row(self) -> dict:
+        row = dict(self.data)
+        if self.rank is not None:
+            row["rank"] = self.rank
+            row["selected"] = self.selected
+        return row
+
+
+class RunSelection(models.Model):
+    """Index of the students selected in each ``RaffleRun`` (by email)."""
+
+    run = models.ForeignKey(RaffleRun, on_delete=models.CASCADE, related_name="selections")
+    email = models.CharField(max_length=254)
+    date = models.DateField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["run", "email"]),
+            models.Index(fields=["email", "date"]),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.email} @ {self.run_id}"
+
+
+class AttendanceEntry(models.Model):
+    """Append-only attendance log: one attended/absent/late mark of a student.
+
+    Entries are never edited or deleted; a mark is withdrawn by appending an
+    entry with ``delta=-1``.
+    """
+
+    KIND_ATTENDED = "attended"
+    KIND_ABSENT = "absent"
+    KIND_LATE = "late"
+    KIND_CHOICES = [(KIND_ATTENDED, "Attended"), (KIND_ABSENT, "Absent"), (KIND_LATE, "Late")]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="attendance")
+    run = models.ForeignKey(RaffleRun, on_delete=models.SET_NULL, related_name="attendance", blank=True, null=True)
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    delta = models.SmallIntegerField(default=1)
+    event_name = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["student", "id"]),
+            models.Index(fields=["run", "kind"]),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.kind} {self.delta:+d} @ {self.event_name}"
+
+
+class Job(models.Model):
+    """A unit of background work, queued by a view and run by the ``run_jobs`` worker.
+
+    See ``raffle.jobs`` for the job kinds and the worker loop.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="jobs")
+    kind = models.CharField(max_length=32)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    params = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    input_file = models.FileField(upload_to="jobs/input/", blank=True)
+    output_file = models.FileField(upload_to="jobs/output/", blank=True)
+    result = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True, default="")
+    # 0..1, with a short description of the current step
+    progress = models.FloatField(default=0)
+    message = models.CharField(max_length=255, blank=True, default="")
+    # Digest of the kind, parameters, input file and the state they were read
+    # against; identical submissions share a job (see raffle.jobs.submit_job)
+    cache_key = models.CharField(max_length=64, blank=True, default="")
+    worker = models.CharField(max_length=64, blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+            models.Index(fields=["user", "kind", "cache_key"]),
+        ]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"Job<{self.kind} {self.status}>"
+
+
+class PerformanceProfile(models.Model):
+    """A cProfile summary of a slow request or job, kept for viewing in the admin (see ``raffle.profiling``)."""
+
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, related_name="performance_profiles", blank=True, null=True
+    )
+    # What was profiled, e.g. "POST /config/" or "job 12 (prepare_event)"
+    target = models.CharField(max_length=255)
+    duration = models.FloatField(help_text="Seconds")
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.target} ({self.duration:.2f}s)"
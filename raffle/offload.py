@@ -0,0 +1,46 @@
+import asyncio
+import contextvars
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+
+
+_executor: Optional[Executor] = None
+
+
+def get_executor() -> Executor:
+    """The process-wide pool that async views hand CPU-bound work to.
+
+    Its size (``settings.RAFFLE_OFFLOAD_WORKERS``) bounds how much of that work
+    runs at once; the rest waits in the pool's queue without holding up the
+    event loop. ``settings.RAFFLE_OFFLOAD_EXECUTOR`` picks threads (cheap, but
+    share the GIL) or processes (use more cores; arguments and results are pickled).
+    """
+    global _executor
+    if _executor is None:
+        workers = settings.RAFFLE_OFFLOAD_WORKERS
+        if settings.RAFFLE_OFFLOAD_EXECUTOR == "process":
+            # Spawned rather than forked: the server process may already run threads
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="raffle-offload")
+    return _executor
+
+
+async def offload(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Await ``func(*args, **kwargs)`` run in the offload pool.
+
+    For pure computations only: ``func`` must not use the database (pool
+    workers hold no request's connection) and, for the process pool, must be
+    a module-level function taking and returning picklable values.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    call = partial(func, *args, **kwargs)
+    if isinstance(executor, ThreadPoolExecutor):
+        # Carry the request's context (e.g. its instrumentation, see raffle.instrumentation) into the thread
+        call = partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(executor, call)
@@ -0,0 +1,45 @@
+from typing import Any, Callable, List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+
+
+def _value(obj: Any, field: str) -> Any:
+    return obj[field] if isinstance(obj, dict) else getattr(obj, field)
+
+
+def keyset_page(
+    qs: QuerySet,
+    field: str,
+    descending: bool = False,
+    cursor: Optional[str] = None,
+    page_size: int = 100,
+    parse: Callable[[str], Any] = str,
+    tiebreak: str = "id",
+) -> Tuple[List[Any], Optional[str]]:
+    """Return one page of ``qs`` ordered by (``field``, ``tiebreak``) and the next page's cursor.
+
+    The cursor is ``"<field value>|<tiebreak value>"`` of the last row shown;
+    ``parse`` turns the field part back into a value comparable in SQL. Pages
+    are fetched with a WHERE on the sort key instead of an OFFSET, so every
+    page costs the same regardless of how deep it is. Invalid cursors restart
+    from the first page.
+    """
+    if cursor:
+        try:
+            raw_value, raw_tiebreak = cursor.rsplit("|", 1)
+            value, last = parse(raw_value), int(raw_tiebreak)
+        except ValueError:
+            pass
+        else:
+            op = "lt" if descending else "gt"
+            qs = qs.filter(Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"{tiebreak}__{op}": last}))
+    prefix = "-" if descending else ""
+    rows = list(qs.order_by(f"{prefix}{field}", f"{prefix}{tiebreak}")[: page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_row = rows[-1]
+        raw = _value(last_row, field)
+        raw = raw.isoformat() if hasattr(raw, "isoformat") else raw
+        next_cursor = f"{raw}|{_value(last_row, tiebreak)}"
+    return rows, next_cursor
@@ -0,0 +1,91 @@
+import cProfile
+import functools
+import io
+import pstats
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+from .models import PerformanceProfile
+
+# Whether the running code is already under a profile (cProfile cannot nest)
+_profiling: ContextVar[bool] = ContextVar("raffle_profiling", default=False)
+
+
+def is_profiling() -> bool:
+    return _profiling.get()
+
+
+def profile_requested(request) -> bool:
+    """Whether to profile ``request``: its user is in ``settings.RAFFLE_PROFILE_USERS``, or is
+    staff and asked for it with an ``X-Raffle-Profile: 1`` header or a ``profile=1`` query parameter."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return False
+    if user.get_username() in settings.RAFFLE_PROFILE_USERS:
+        return True
+    return user.is_staff and "1" in (request.headers.get("X-Raffle-Profile"), request.GET.get("profile"))
+
+
+def summarize(profiler: cProfile.Profile, top: Optional[int] = None) -> str:
+    """The ``top`` functions by cumulative time, overall and within raffle/services.py."""
+    top = top or settings.RAFFLE_PROFILE_TOP
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE)
+    out.write(f"Top {top} functions by cumulative time\n")
+    stats.print_stats(top)
+    # Parsing, consolidation and ranking, however deep they sit in the request
+    out.write("raffle/services.py\n")
+    stats.print_stats(r"^services\.py:", top)
+    return out.getvalue()
+
+
+@contextmanager
+def profile(user, target: str) -> Iterator[None]:
+    """Run the block under cProfile and store a ``PerformanceProfile`` when it takes
+    at least ``settings.RAFFLE_PROFILE_THRESHOLD`` seconds.
+
+    Inside an already profiled block (a job run eagerly by a profiled
+    request), or while another profiler is active, the block just runs.
+    """
+    if _profiling.get():
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool is active (from Python 3.12 profilers are process-wide)
+        yield
+        return
+    token = _profiling.set(True)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        duration = time.perf_counter() - start
+        _profiling.reset(token)
+        if duration >= settings.RAFFLE_PROFILE_THRESHOLD:
+            PerformanceProfile.objects.create(
+                user=user if user is not None and user.is_authenticated else None,
+                target=target[:255],
+                duration=duration,
+                summary=summarize(profiler),
+            )
+
+
+def profile_slow(view):
+    """View decorator: profile requests that ask for it (see ``profile_requested``) and keep the slow ones."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not profile_requested(request):
+            return view(request, *args, **kwargs)
+        with profile(request.user, f"{request.method} {request.get_full_path()}"):
+            return view(request, *args, **kwargs)
+
+    return wrapper
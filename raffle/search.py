@@ -0,0 +1,269 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .caching import LRUCache, historical_version
+from .models import RaffleWorkspace, Student, WorkspaceRow
+
+
+FTS_TABLE = "raffle_student_fts"
+
+# External-content FTS5 index over Student; the triggers keep it in sync with
+# every insert, update and delete, including bulk_create and queryset deletes.
+_FTS_CREATE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, email, student_class, owner_id UNINDEXED,
+    content='raffle_student', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+)
+"""
+_FTS_TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON raffle_student BEGIN
+    INSERT INTO {FTS_TABLE}(rowid, name, email, student_class, owner_id)
+    VALUES (new.id, new.name, new.email, new.student_class, new.owner_id);
+END
+""",
+    f"{FTS_TABLE}_ad": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON raffle_student BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email, student_class, owner_id)
+    VALUES ('delete', old.id, old.name, old.email, old.student_class, old.owner_id);
+END
+""",
+    f"{FTS_TABLE}_au": f"""
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON raffle_student BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email, student_class, owner_id)
+    VALUES ('delete', old.id, old.name, old.email, old.student_class, old.owner_id);
+    INSERT INTO {FTS_TABLE}(rowid, name, email, student_class, owner_id)
+    VALUES (new.id, new.name, new.email, new.student_class, new.owner_id);
+END
+""",
+}
+# bm25 column weights: name, email, class, owner_id
+_FTS_RANK = f"bm25({FTS_TABLE}, 10.0, 5.0, 1.0, 0.0)"
+
+# Fuzzy matches below this share of the query's trigrams are dropped
+MIN_FUZZY_SCORE = 0.5
+MAX_FUZZY_RESULTS = 1000
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def _sqlite_objects(conn, kind: str) -> Set[str]:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = %s", [kind])
+        return {name for (name,) in cursor.fetchall()}
+
+
+def install_fts(conn) -> bool:
+    """Create the FTS5 index and its triggers if missing; returns whether FTS is in use.
+
+    The index is rebuilt from ``raffle_student`` whenever a trigger had to be
+    (re)created, e.g. after a migration rebuilt the table and dropped them.
+    Databases other than SQLite, or SQLite builds without FTS5, are left alone.
+    """
+    if conn.vendor != "sqlite":
+        return False
+    try:
+        with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+            cursor.execute(_FTS_CREATE)
+    except DatabaseError:
+        return False
+    missing = set(_FTS_TRIGGERS) - _sqlite_objects(conn, "trigger")
+    if missing:
+        with conn.cursor() as cursor:
+            for name in missing:
+                cursor.execute(_FTS_TRIGGERS[name])
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall_fts(conn) -> None:
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        for name in _FTS_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def fts_installed(conn) -> bool:
+    return conn.vendor == "sqlite" and FTS_TABLE in _sqlite_objects(conn, "table")
+
+
+def fts_available() -> bool:
+    return fts_installed(connection)
+
+
+@contextmanager
+def deferred_fts_inserts(conn) -> Iterator[None]:
+    """Index the students inserted inside the block with one statement when it ends.
+
+    The per-row insert trigger costs more than the insert itself on large
+    imports. The block runs in a transaction, so the dropped trigger comes
+    back even if it fails.
+    """
+    if not fts_installed(conn):
+        yield
+        return
+    trigger = f"{FTS_TABLE}_ai"
+    with transaction.atomic(using=conn.alias):
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM raffle_student")
+            (last_id,) = cursor.fetchone()
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        yield
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, name, email, student_class, owner_id) "
+                "SELECT id, name, email, student_class, owner_id FROM raffle_student WHERE id > %s",
+                [last_id],
+            )
+            cursor.execute(_FTS_TRIGGERS[trigger])
+
+
+def fts_query(q: str) -> str:
+    """FTS5 MATCH expression requiring every word of ``q`` as a token prefix."""
+    return " ".join(f'"{token}"*' for token in _tokens(q))
+
+
+class TrigramIndex:
+    """In-memory trigram index for prefix and typo-tolerant matching.
+
+    Documents are indexed by the trigrams of each word padded with spaces;
+    query words are only padded in front, so a word prefix matches all of its
+    trigrams. A document's score is the share of query trigrams it contains.
+    """
+
+    def __init__(self, docs: Iterable[Tuple[int, str]]):
+        self.postings: Dict[str, List[int]] = {}
+        self.lengths: Dict[int, int] = {}
+        for doc_id, text in docs:
+            grams = self._grams(text, pad_end=True)
+            self.lengths[doc_id] = len(text)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(doc_id)
+
+    @staticmethod
+    def _grams(text: str, pad_end: bool) -> Set[str]:
+        grams: Set[str] = set()
+        for token in _tokens(text):
+            padded = f" {token} " if pad_end else f" {token}"
+            grams.update(padded[i : i + 3] for i in range(max(len(padded) - 2, 1)))
+        return grams
+
+    def search(self, q: str, min_score: float = MIN_FUZZY_SCORE, limit: int = MAX_FUZZY_RESULTS) -> List[int]:
+        """Ids of matching documents, best first (ties: shorter text, then lower id)."""
+        grams = self._grams(q, pad_end=False)
+        if not grams:
+            return []
+        hits: Counter = Counter()
+        for gram in grams:
+            hits.update(self.postings.get(gram, ()))
+        needed = min_score * len(grams)
+        matches = [(count, doc_id) for doc_id, count in hits.items() if count >= needed]
+        matches.sort(key=lambda m: (-m[0], self.lengths[m[1]], m[1]))
+        return [doc_id for _count, doc_id in matches[:limit]]
+
+
+_INDEX_CACHE = LRUCache(maxsize=8)
+
+
+def _cached_index(key: tuple, build) -> TrigramIndex:
+    return _INDEX_CACHE.get_or_build(key, lambda: TrigramIndex(build()))
+
+
+def _search_text(name, email, student_class) -> str:
+    # Only the local part of the email: the shared domain would match everyone
+    return f"{name or ''} {(email or '').split('@')[0]} {student_class or ''}"
+
+
+def student_index(user) -> TrigramIndex:
+    """Trigram index of the user's historical database, rebuilt when it is saved."""
+    marker = historical_version(user)
+
+    def build():
+        qs = Student.objects.filter(owner=user).order_by("position")
+        for student_id, name, email, student_class in qs.values_list("id", "name", "email", "student_class"):
+            yield student_id, _search_text(name, email, student_class)
+
+    return _cached_index(("students", user.pk, marker), build)
+
+
+def workspace_index(workspace: RaffleWorkspace) -> TrigramIndex:
+    """Trigram index of a draft run's master list (its rows never change after creation)."""
+
+    def build():
+        qs = workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER).order_by("position")
+        for row_id, data in qs.values_list("id", "data"):
+            yield row_id, _search_text(data.get("name"), data.get("email"), data.get("class"))
+
+    return _cached_index(("workspace", workspace.pk, workspace.created_at), build)
+
+
+def student_search_filter(user, q: str) -> Q:
+    """Q restricting a Student queryset to the matches of ``q`` (unranked)."""
+    if fts_available():
+        match = RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND owner_id = %s", [fts_query(q), user.pk]
+        )
+        if Student.objects.filter(owner=user, id__in=match).exists():
+            return Q(id__in=match)
+    return Q(id__in=student_index(user).search(q))
+
+
+def search_students(
+    user, q: str, queryset: Optional[QuerySet] = None, page: int = 1, page_size: int = 100
+) -> Tuple[List[Student], bool]:
+    """One page of students matching ``q`` in relevance order, and whether a next page exists.
+
+    ``queryset`` optionally narrows the candidates further (e.g. by class).
+    Uses the FTS5 index (every word must prefix a token of name, email or
+    class; ranked by bm25) with a single MATCH query per page, fetching one
+    row more than the page to tell whether another follows. When FTS5 is
+    unavailable or finds nothing on the page, falls back to fuzzy trigram
+    matching, so typos still return results.
+    """
+    if not _tokens(q):
+        return [], False
+    if queryset is None:
+        queryset = Student.objects.filter(owner=user)
+    start = (max(page, 1) - 1) * page_size
+    ids: List[int] = []
+    if fts_available():
+        candidates_sql, candidates_params = queryset.order_by().values("id").query.sql_with_params()
+        with connection.cursor() as cursor:
+            # "+rowid" keeps the candidates out of the FTS5 lookup, which would otherwise
+            # evaluate the MATCH once per candidate instead of once for the query
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND owner_id = %s "
+                f"AND +rowid IN ({candidates_sql}) ORDER BY {_FTS_RANK}, rowid LIMIT %s OFFSET %s",
+                [fts_query(q), user.pk, *candidates_params, page_size + 1, start],
+            )
+            ids = [row_id for (row_id,) in cursor.fetchall()]
+    if not ids:
+        ranked = student_index(user).search(q)
+        allowed = set(queryset.filter(id__in=ranked).values_list("id", flat=True))
+        ids = [student_id for student_id in ranked if student_id in allowed][start : start + page_size + 1]
+    page_ids = ids[:page_size]
+    by_id = Student.objects.in_bulk(page_ids)
+    return [by_id[i] for i in page_ids if i in by_id], len(ids) > page_size
+
+
+def search_workspace_rows(
+    workspace: RaffleWorkspace, q: str, page: int = 1, page_size: int = 100
+) -> Tuple[List[WorkspaceRow], bool]:
+    """One page of master-list rows matching ``q``, best first, and whether a next page exists."""
+    ranked = workspace_index(workspace).search(q)
+    start = (max(page, 1) - 1) * page_size
+    page_ids = ranked[start : start + page_size]
+    by_id = WorkspaceRow.objects.in_bulk(page_ids)
+    return [by_id[i] for i in page_ids if i in by_id], len(ranked) > start + page_size
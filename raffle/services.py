@@ -1,8 +1,16 @@
+import codecs
 import csv
+import heapq
 import io
 import random
+import sys
+from dataclasses import dataclass, replace
 from datetime import date, datetime
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .identity import IdentityIndex, row_identity
+from . import metrics
+from .instrumentation import timed
 
 
 StudentRow = Dict[str, Any]
@@ -19,7 +27,9 @@ def _to_int(value: Any, default: int = 0) -> int:
         s = str(value).strip()
         if s == "":
             return default
-        return int(float(s))  # handle "20" or "20.0"
+        if s.isdecimal():
+            return int(s)
+        return int(float(s))  # handle "20.0"
     except Exception:
         return default
 
@@ -41,132 +51,322 @@ def _parse_date(value: Optional[str]) -> Optional[date]:
     return None
 
 
+def _iter_text_chunks(uploaded_file, chunk_size: int) -> Iterator[str]:
+    """Yield decoded text chunks of a file-like object without reading it whole.
+
+    Uses ``UploadedFile.chunks()`` when available. Bytes are decoded with an
+    incremental UTF-8 decoder, so multi-byte characters (including a BOM) split
+    across chunk boundaries decode correctly.
+    """
+    if hasattr(uploaded_file, "chunks"):
+        raw_chunks: Iterable[Any] = uploaded_file.chunks(chunk_size)
+    else:
+        raw_chunks = iter(lambda: uploaded_file.read(chunk_size), uploaded_file.read(0))
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    for chunk in raw_chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    # Split on "\n" only, like iterating io.StringIO; csv handles "\r\n" itself
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
+
+
+def iter_csv_upload(uploaded_file, chunk_size: int = 64 * 1024) -> Iterator[StudentRow]:
+    """Stream an uploaded CSV as dicts with normalized keys.
+
+    Reads the file in ``chunk_size`` pieces and yields one row at a time, so
+    memory stays flat regardless of file size.
+    """
+    return iter_csv_rows(_iter_lines(_iter_text_chunks(uploaded_file, chunk_size)))
+
+
+def iter_csv_rows(lines: Iterable[str]) -> Iterator[StudentRow]:
+    """Parse CSV lines (e.g. from the ``iter_*_csv`` generators) into normalized rows.
+
+    Rows come out like ``csv.DictReader``'s with the header normalized once:
+    missing cells are None and surplus cells are listed under the "" key.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    keys = [_strip_bom(k).strip().lower() for k in header]
+    width = len(keys)
+    for values in reader:
+        if not values:
+            continue
+        row = dict(zip(keys, [v.strip() for v in values[:width]]))
+        if len(values) < width:
+            row.update(dict.fromkeys(keys[len(values) :]))
+        elif len(values) > width:
+            row[""] = values[width:]
+        yield row
+
+
+@timed("parse")
+@metrics.PARSE_SECONDS.time(kind="upload")
 def parse_csv_upload(uploaded_file) -> List[StudentRow]:
     """Parse an uploaded CSV into a list of dicts with normalized keys.
 
     The function is tolerant to column name casing and minor variations.
     """
-    raw = uploaded_file.read()
-    if isinstance(raw, bytes):
-        text = raw.decode("utf-8", errors="replace")
-    else:
-        text = str(raw)
-    reader = csv.DictReader(io.StringIO(text))
-    rows: List[StudentRow] = []
-    for row in reader:
-        normalized = {
-            _strip_bom(k).strip().lower(): (v.strip() if isinstance(v, str) else v)
-            for k, v in row.items()
-        }
-        rows.append(normalized)
-    return rows
-
-
-def consolidate_students(signups: List[StudentRow], historical: List[StudentRow]) -> List[StudentRow]:
-    """Combine current sign-ups with historical database into a master list.
-
-    New students (not found in historical) get zeroed counters.
-    Matching is attempted by email primarily, then by user_id if present.
+    return list(iter_csv_upload(uploaded_file))
+
+
+@timed("parse")
+def parse_csv_text(text: str) -> List[StudentRow]:
+    """Parse CSV text (e.g. a stored run's dataset) into rows like ``parse_csv_upload``."""
+    return list(iter_csv_rows(io.StringIO(text)))
+
+
+_RECORD_KEYS: Dict[str, str] = {
+    "user_id": "user_id",
+    "email": "email",
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "name": "name",
+    "class": "student_class",
+    "num_absences": "num_absences",
+    "num_late_arrivals": "num_late_arrivals",
+    "num_events_attended": "num_events_attended",
+    "events_attended": "events_attended",
+    "latest_attended": "latest_attended",
+    "_events_columns": "events_values",
+    "response": "response",
+    "last_attended_date": "last_attended_date",
+    "rank": "rank",
+    "selected": "selected",
+}
+# Keys that behave like absent dict keys while unset
+_OPTIONAL_KEYS = {"last_attended_date", "rank", "selected"}
+_EVENTS_KEYS_CACHE: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _shared_keys(keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    # Rows of one CSV share a single EventN key tuple
+    return _EVENTS_KEYS_CACHE.setdefault(keys, keys)
+
+
+@dataclass(slots=True, eq=False)
+class StudentRecord:
+    """Compact master-list row.
+
+    Uses ``__slots__``, shares the EventN column names between rows and interns
+    repeated cell values, instead of a dict per student. Supports the read-only
+    mapping API (``get``, ``[]``, ``keys``) with the same keys as the dict rows
+    it replaces, so templates and the CSV generators accept either; convert
+    with ``to_dict`` at JSON/session boundaries.
     """
-    history_index: Dict[str, StudentRow] = {}
-
-    def identity_key(email: Optional[str], first_name: Optional[str], last_name: Optional[str], fallback_id: Optional[str] = None) -> Optional[str]:
-        e = (email or "").strip().lower()
-        fn = (first_name or "").strip().lower()
-        ln = (last_name or "").strip().lower()
-        if e or (fn or ln):
-            return f"email:{e}|name:{fn} {ln}"
-        if fallback_id:
-            return f"user_id:{fallback_id}"
-        return None
 
-    def normalize_historical(h: StudentRow) -> Optional[Tuple[str, StudentRow]]:
-        email = (h.get("email") or h.get("Email") or "").strip().lower()
+    user_id: str = ""
+    email: str = ""
+    first_name: str = ""
+    last_name: str = ""
+    name: str = ""
+    student_class: str = ""
+    response: str = "no"
+    num_absences: int = 0
+    num_late_arrivals: int = 0
+    num_events_attended: int = 0
+    events_attended: Tuple[str, ...] = ()
+    latest_attended: str = ""
+    events_keys: Tuple[str, ...] = ()
+    events_values: Tuple[Any, ...] = ()
+    last_attended_date: Any = None
+    rank: Optional[int] = None
+    selected: Optional[bool] = None
+
+    @classmethod
+    def from_historical(cls, h: StudentRow) -> "StudentRecord":
+        """Normalize a parsed historical database CSV row."""
         first_name = h.get("first name") or h.get("firstname") or ""
         last_name = h.get("last name") or h.get("lastname") or ""
-        key = identity_key(email, first_name, last_name)
-        if not key:
-            return None
-        normalized: StudentRow = {
-            "user_id": h.get("user_id") or "",
-            "email": email,
-            "first_name": first_name,
-            "last_name": last_name,
-            "name": (first_name + " " + last_name).strip(),
-            "class": h.get("class") or h.get("student_class") or "",
-            # Counters
-            "num_absences": _to_int(h.get("absent")),
-            "num_late_arrivals": _to_int(h.get("late")),
-            "num_events_attended": _to_int(h.get("attended")),
-            # Event list and latest label (string)
-            "events_attended": _split_events(h.get("attended events")),
-            "latest_attended": h.get("latest attended") or "",
-            # Raw event columns preserved if present
-            "_events_columns": {k: h.get(k) for k in h.keys() if k.startswith("event")},
-        }
-        return key, normalized
-
-    for h in historical:
-        norm = normalize_historical(h)
-        if not norm:
-            continue
-        key, payload = norm
-        history_index[key] = payload
+        events_columns = h.get("_events_columns")
+        if events_columns is None:
+            events_columns = {k: h.get(k) for k in h.keys() if k.startswith("event")}
+        return cls(
+            user_id=h.get("user_id") or "",
+            email=(h.get("email") or h.get("Email") or "").strip().lower(),
+            first_name=first_name,
+            last_name=last_name,
+            name=(first_name + " " + last_name).strip(),
+            student_class=sys.intern(h.get("class") or h.get("student_class") or ""),
+            num_absences=_to_int(h.get("absent")),
+            num_late_arrivals=_to_int(h.get("late")),
+            num_events_attended=_to_int(h.get("attended")),
+            events_attended=tuple(sys.intern(e) for e in _split_events(h.get("attended events"))),
+            latest_attended=sys.intern(h.get("latest attended") or ""),
+            events_keys=_shared_keys(tuple(events_columns.keys())),
+            events_values=tuple(sys.intern(v) if isinstance(v, str) else v for v in events_columns.values()),
+        )
+
+    @classmethod
+    def from_dict(cls, row: StudentRow) -> "StudentRecord":
+        """Inverse of ``to_dict``."""
+        record = cls()
+        for key, value in row.items():
+            if key in _RECORD_KEYS:
+                record[key] = value
+        record.student_class = sys.intern(record.student_class or "")
+        record.latest_attended = sys.intern(record.latest_attended or "")
+        record.events_attended = tuple(sys.intern(e) for e in record.events_attended)
+        record.events_values = tuple(sys.intern(v) if isinstance(v, str) else v for v in record.events_values)
+        return record
+
+    def __getitem__(self, key: str) -> Any:
+        attr = _RECORD_KEYS[key]
+        if key == "_events_columns":
+            return dict(zip(self.events_keys, self.events_values))
+        if key == "events_attended":
+            return list(self.events_attended)
+        value = getattr(self, attr)
+        if value is None and key in _OPTIONAL_KEYS:
+            raise KeyError(key)
+        return value
 
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "_events_columns":
+            value = value or {}
+            self.events_keys = _shared_keys(tuple(value.keys()))
+            self.events_values = tuple(value.values())
+        elif key == "events_attended":
+            self.events_attended = tuple(value or ())
+        else:
+            setattr(self, _RECORD_KEYS[key], value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in _RECORD_KEYS and (key not in _OPTIONAL_KEYS or getattr(self, _RECORD_KEYS[key]) is not None)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterator[str]:
+        return (k for k in _RECORD_KEYS if k in self)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return ((k, self[k]) for k in self.keys())
+
+    def to_dict(self) -> StudentRow:
+        return dict(self.items())
+
+
+def _normalize_signup(s: StudentRow) -> Optional[StudentRecord]:
+    email = (s.get("email") or s.get("email address") or "").strip().lower()
+    attendee_id = (s.get("attendee id") or s.get("id") or "").strip()
+    first_name = s.get("firstname") or s.get("first name") or s.get("first") or s.get("firstname(s)") or ""
+    last_name = s.get("lastname") or s.get("last name") or s.get("last") or ""
+    if not email and not attendee_id:
+        return None
+    return StudentRecord(
+        user_id=attendee_id,
+        email=email,
+        first_name=first_name,
+        last_name=last_name,
+        name=(first_name + " " + last_name).strip() or s.get("name") or "",
+        student_class=s.get("class") or s.get("student_class") or "",
+        response=_signup_response(s),
+    )
+
+
+def _signup_response(s: StudentRow) -> str:
+    status = (s.get("participation status") or s.get("status") or "").strip().lower()
+    return "yes" if status in {"planned", "yes"} else "no"
+
+
+@timed("consolidate")
+def consolidate_students(
+    signups: Iterable[StudentRow],
+    historical: Iterable[Union[StudentRow, StudentRecord]],
+    index: Optional[IdentityIndex] = None,
+    ambiguous: Optional[List[Dict[str, Any]]] = None,
+    signed_up: Optional[List[Optional[int]]] = None,
+) -> List[StudentRecord]:
+    """Combine current sign-ups with historical database into a master list.
+
+    New students (not found in historical) get zeroed counters.
+    Sign-ups are matched through an ``IdentityIndex`` (email, attendee id,
+    normalized name; see ``raffle.identity``). Pass ``index`` to reuse one
+    already built over ``historical`` (same rows, same order). Sign-ups that
+    matched several historical rows are appended to ``ambiguous`` if given.
+    ``signed_up`` receives each sign-up's master-list position, one entry per
+    row of ``signups`` (None for rows with neither email nor attendee id).
+    ``historical`` may hold parsed CSV rows or ready-made ``StudentRecord``s
+    (which are used as-is for students that did not sign up).
+    """
     # Start master with all historical rows; default response is "no"
-    master: Dict[str, StudentRow] = {}
-    for key, payload in history_index.items():
-        base = dict(payload)
-        base.setdefault("response", "no")
-        master[key] = base
-
-    def normalize_signup(s: StudentRow) -> Optional[Tuple[str, StudentRow]]:
-        email = (s.get("email") or s.get("email address") or "").strip().lower()
-        attendee_id = (s.get("attendee id") or s.get("id") or "").strip()
-        first_name = s.get("firstname") or s.get("first name") or s.get("first") or s.get("firstname(s)") or ""
-        last_name = s.get("lastname") or s.get("last name") or s.get("last") or ""
-        status = (s.get("participation status") or s.get("status") or "").strip().lower()
-        if not email and not attendee_id:
-            return None
-        response = "yes" if status in {"planned", "yes"} else "no"
-        normalized: StudentRow = {
-            "user_id": attendee_id,
-            "email": email,
-            "first_name": first_name,
-            "last_name": last_name,
-            "name": (first_name + " " + last_name).strip() or s.get("name") or "",
-            "class": s.get("class") or s.get("student_class") or "",
-            "response": response,
-        }
-        key = identity_key(email, first_name, last_name, attendee_id)
-        return key, normalized
+    master: List[StudentRecord] = [
+        h if isinstance(h, StudentRecord) else StudentRecord.from_historical(h) for h in historical
+    ]
+    if index is None:
+        index = IdentityIndex.from_rows(master)
+    # Students that are only in the sign-ups, indexed as they are added
+    new_index = IdentityIndex(index.precedence)
+    new_positions: List[int] = []
 
     for s in signups:
-        norm = normalize_signup(s)
-        if not norm:
+        signup = _normalize_signup(s)
+        if not signup:
+            if signed_up is not None:
+                signed_up.append(None)
             continue
-        key, signup_payload = norm
-        # Use existing master row if present (from history), otherwise defaults
-        base = dict(master.get(key) or {})
-        hist = history_index.get(key)
-        row: StudentRow = {
-            **base,
-            **signup_payload,
-            # Preserve counters from history/base or zero for brand new
-            "num_absences": (base.get("num_absences") if base else (hist.get("num_absences") if hist else 0)) or 0,
-            "num_late_arrivals": (base.get("num_late_arrivals") if base else (hist.get("num_late_arrivals") if hist else 0)) or 0,
-            "num_events_attended": (base.get("num_events_attended") if base else (hist.get("num_events_attended") if hist else 0)) or 0,
-            "events_attended": (base.get("events_attended") if base else (hist.get("events_attended") if hist else [])) or [],
-            "latest_attended": (base.get("latest_attended") if base else (hist.get("latest_attended") if hist else "")) or "",
-            "_events_columns": (base.get("_events_columns") if base else (hist.get("_events_columns") if hist else {})) or {},
-        }
-        # Prefer historical/base identity fields over signup where available
-        for field in ("first_name", "last_name", "name", "class", "email"):
-            if base.get(field):
-                row[field] = base[field]
-        master[key] = row
-
-    return list(master.values())
+        identity = row_identity(signup)
+        match = index.resolve(identity)
+        if match.ambiguous and ambiguous is not None:
+            ambiguous.append(
+                {
+                    "email": signup.email,
+                    "name": signup.name,
+                    "matched_by": match.key,
+                    "candidates": [master[c].email or master[c].name for c in match.candidates],
+                }
+            )
+        position = match.position
+        if position is None:
+            new_match = new_index.resolve(identity)
+            if new_match.position is None:
+                new_index.add(identity)
+                new_positions.append(len(master))
+                if signed_up is not None:
+                    signed_up.append(len(master))
+                master.append(signup)
+                continue
+            position = new_positions[new_match.position]
+        if signed_up is not None:
+            signed_up.append(position)
+        base = master[position]
+        # Keep counters from history; prefer historical identity fields over the sign-up
+        master[position] = replace(
+            base,
+            user_id=signup.user_id,
+            response=signup.response,
+            first_name=base.first_name or signup.first_name,
+            last_name=base.last_name or signup.last_name,
+            name=base.name or signup.name,
+            student_class=base.student_class or signup.student_class,
+            email=base.email or signup.email,
+        )
+
+    return master
 
 
 def _split_events(value: Optional[str]) -> List[str]:
@@ -192,81 +392,150 @@ def _priority_key(student: StudentRow) -> Tuple[int, int, int, date]:
     )
 
 
-def run_priority_raffle(students: List[StudentRow], capacity: int) -> Tuple[List[StudentRow], List[StudentRow]]:
+def is_eligible(student: StudentRow) -> bool:
+    return (student.get("response") or "").strip().lower() == "yes"
+
+
+def _shuffled_eligible(students: List[StudentRow], seed: Optional[int]) -> List[StudentRow]:
+    eligible = [s for s in students if is_eligible(s)]
+    rng = random.Random(seed)
+    rng.shuffle(eligible)
+    return eligible
+
+
+@timed("rank")
+def run_priority_raffle(
+    students: List[StudentRow], capacity: int, seed: Optional[int] = None
+) -> Tuple[List[StudentRow], List[StudentRow]]:
     """Return (eligible_sorted_with_rank, selected_top_n).
 
     Implements multi-level sorting with a random tie-breaker by shuffling before a stable sort.
     Only considers students with response == "yes" (case-insensitive).
+    Pass ``seed`` to make the tie-breaking reproducible.
     """
-    eligible = [s for s in students if (s.get("response") or "").strip().lower() == "yes"]
-    rng = random.Random()
-    rng.shuffle(eligible)
+    eligible = _shuffled_eligible(students, seed)
     eligible.sort(key=_priority_key)
 
-    selected = eligible[: max(capacity, 0)]
+    capacity = max(capacity, 0)
+    selected = eligible[:capacity]
 
-    # Annotate rank
+    # Annotate rank; the first `capacity` positions are the selected ones
     for idx, s in enumerate(eligible, start=1):
         s["rank"] = idx
-        s["selected"] = s in selected
+        s["selected"] = idx <= capacity
+    metrics.record_draw("full", len(eligible), len(selected))
     return eligible, selected
 
 
-def generate_ranking_csv(eligible_ranked: List[StudentRow]) -> str:
-    headers = [
-        "rank",
-        "selected",
-        "user_id",
-        "name",
-        "email",
-        "class",
-        "num_events_attended",
-        "num_absences",
-        "num_late_arrivals",
-        "last_attended_date",
+@timed("rank")
+def select_top_priority(
+    students: List[StudentRow], capacity: int, seed: Optional[int] = None
+) -> Tuple[List[StudentRow], int]:
+    """Return (selected_top_n, eligible_count) without ranking the whole pool.
+
+    Picks the top ``capacity`` eligible students with a heap in O(n log k). For
+    the same ``seed`` the result (including ranks 1..k) is identical to the first
+    ``capacity`` rows of ``run_priority_raffle``: the shuffle position is the
+    final sort key, which is exactly what the stable sort preserves on ties.
+    """
+    eligible = _shuffled_eligible(students, seed)
+    capacity = max(capacity, 0)
+    keyed = ((_priority_key(s), pos) for pos, s in enumerate(eligible))
+    top = heapq.nsmallest(capacity, keyed)
+
+    selected = [eligible[pos] for _, pos in top]
+    for idx, s in enumerate(selected, start=1):
+        s["rank"] = idx
+        s["selected"] = True
+    metrics.record_draw("top", len(eligible), len(selected))
+    return selected, len(eligible)
+
+
+class _EchoBuffer:
+    """File-like object whose write() returns the line, for streaming csv.writer output."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+RANKING_HEADERS = [
+    "rank",
+    "selected",
+    "user_id",
+    "name",
+    "email",
+    "class",
+    "num_events_attended",
+    "num_absences",
+    "num_late_arrivals",
+    "last_attended_date",
+]
+
+
+def _ranking_cells(s: StudentRow) -> List[Any]:
+    return [
+        s.get("rank"),
+        "yes" if s.get("selected") else "no",
+        s.get("user_id") or "",
+        s.get("name") or "",
+        s.get("email") or "",
+        s.get("class") or "",
+        int(s.get("num_events_attended") or 0),
+        int(s.get("num_absences") or 0),
+        int(s.get("num_late_arrivals") or 0),
+        _format_date(s.get("last_attended_date")),
     ]
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(headers)
+
+
+def iter_ranking_csv(eligible_ranked: Iterable[StudentRow]) -> Iterator[str]:
+    """Yield the ranking CSV line by line."""
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow(RANKING_HEADERS)
     for s in eligible_ranked:
-        writer.writerow([
-            s.get("rank"),
-            "yes" if s.get("selected") else "no",
-            s.get("user_id") or "",
-            s.get("name") or "",
-            s.get("email") or "",
-            s.get("class") or "",
-            int(s.get("num_events_attended") or 0),
-            int(s.get("num_absences") or 0),
-            int(s.get("num_late_arrivals") or 0),
-            _format_date(s.get("last_attended_date")),
-        ])
-    return output.getvalue()
+        yield writer.writerow(_ranking_cells(s))
 
 
-def generate_updated_history_csv(
+async def aiter_ranking_csv(eligible_ranked: AsyncIterable[StudentRow]) -> AsyncIterator[str]:
+    """Async ``iter_ranking_csv``, for streaming responses under ASGI."""
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow(RANKING_HEADERS)
+    async for s in eligible_ranked:
+        yield writer.writerow(_ranking_cells(s))
+
+
+def iter_rows_csv(rows: List[StudentRow]) -> Iterator[str]:
+    """Yield ``rows`` as CSV lines, using the first row's keys as the header."""
+    if not rows:
+        return
+    writer = csv.DictWriter(_EchoBuffer(), fieldnames=list(rows[0].keys()))
+    yield writer.writeheader()
+    for r in rows:
+        yield writer.writerow(r)
+
+
+@timed("export")
+def generate_ranking_csv(eligible_ranked: Iterable[StudentRow]) -> str:
+    return "".join(iter_ranking_csv(eligible_ranked))
+
+
+def iter_updated_history_csv(
     base_historical_students: List[StudentRow],
     selected: List[StudentRow],
     event_name: str,
     adjustments: Optional[Dict[str, Dict[str, bool]]] = None,
     event_date_str: Optional[str] = None,
-) -> str:
-    """Generate historical database CSV in the same format as the provided sample.
+) -> Iterator[str]:
+    """Yield the updated historical database CSV line by line.
+
+    ``base_historical_students`` is read twice (to size the EventN columns
+    first), so it must be a list rather than a one-shot iterator.
 
     Columns:
     email, First Name, Last Name, Class, Event1..Event20, Absent, Late, Attended, Attended Events, Latest Attended
     We preserve any incoming EventN columns if present on a row, otherwise keep them blank.
     """
-    selected_emails = {str(s.get("email") or "").lower() for s in selected}
-    selected_name_pairs = {
-        (
-            (s.get("first_name") or ((s.get("name") or "").split(" ")[0] if s.get("name") else "")).strip().lower(),
-            (s.get("last_name") or (" ".join((s.get("name") or "").split(" ")[1:]) if s.get("name") else "")).strip().lower(),
-        )
-        for s in selected
-    }
+    selected_index = IdentityIndex.from_rows(selected)
     adjustments = adjustments or {}
-    output = io.StringIO()
 
     # Determine widest set of event columns seen in historical data
     max_event_cols = 0
@@ -286,8 +555,8 @@ def generate_updated_history_csv(
         headers.append(f"Event{i}")
     headers.extend(["Absent", "Late", "Attended", "Attended Events", "Latest Attended"])
 
-    writer = csv.writer(output)
-    writer.writerow(headers)
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow(headers)
 
     for s in base_historical_students:
         email = (s.get("email") or "").lower()
@@ -304,7 +573,7 @@ def generate_updated_history_csv(
         )
         student_class = s.get("class") or ""
 
-        is_selected = email in selected_emails
+        is_selected = selected_index.contains(s)
         num_attended = _to_int(s.get("num_events_attended") or s.get("attended") or 0) + (1 if is_selected else 0)
         num_absences = _to_int(s.get("num_absences") or s.get("absent") or 0)
         num_late = _to_int(s.get("num_late_arrivals") or s.get("late") or 0)
@@ -339,9 +608,21 @@ def generate_updated_history_csv(
             ", ".join(events_attended),
             latest_attended_label,
         ])
-        writer.writerow(row)
+        yield writer.writerow(row)
+
 
-    return output.getvalue()
+@timed("export")
+def generate_updated_history_csv(
+    base_historical_students: List[StudentRow],
+    selected: List[StudentRow],
+    event_name: str,
+    adjustments: Optional[Dict[str, Dict[str, bool]]] = None,
+    event_date_str: Optional[str] = None,
+) -> str:
+    """Generate historical database CSV in the same format as the provided sample."""
+    return "".join(
+        iter_updated_history_csv(base_historical_students, selected, event_name, adjustments, event_date_str)
+    )
 
 
 def _format_date(value: Optional[date]) -> str:
@@ -1,3 +1,536 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import date
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import instrumentation, metrics
+from .attendance import apply_event_results, preview_event_results, rebuild_counters, set_run_flags, undo_run
+from .batch import read_manifest
+from .history import (
+    candidate_identity_index,
+    historical_identity_index,
+    load_historical_rows,
+    save_historical_csv,
+    save_historical_rows,
+)
+from .identity import IdentityIndex, identity_precedence, row_identity
+from .importer import import_historical_csv, import_historical_rows
+from .jobs import run_job, submit_job
+from .models import AttendanceEntry, Job, RaffleRun, RaffleWorkspace, Student
+from .search import search_students
+from .services import iter_csv_upload, run_priority_raffle, select_top_priority
+from .vectorized import HAS_NUMPY, raffle_engine, run_priority_raffle_vectorized
+
+
+def roster(n, seed=0):
+    """Master-list rows with many priority ties and the gaps real exports have."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        row = {"email": f"student{i}@example.com", "name": f"Student {i}"}
+        row["response"] = rng.choice(["yes", "Yes ", "YES", "no", "", None])
+        # Few distinct values, so most students tie on most keys
+        for field in ("num_events_attended", "num_absences", "num_late_arrivals"):
+            value = rng.choice([0, 1, 2, "1", "", None, "missing"])
+            if value != "missing":
+                row[field] = value
+        last = rng.choice(["2025-03-01", "03/01/2025", "2025/02/01", date(2025, 1, 1), "", "N/A", "soon", None])
+        if last is not None:
+            row["last_attended_date"] = last
+        rows.append(row)
+    return rows
+
+
+@skipUnless(HAS_NUMPY, "numpy is not installed")
+class EngineEquivalenceTests(SimpleTestCase):
+    def assertSameDraw(self, students, capacity, seed):
+        expected = run_priority_raffle([dict(s) for s in students], capacity, seed=seed)
+        actual = run_priority_raffle_vectorized([dict(s) for s in students], capacity, seed=seed)
+        self.assertEqual(actual, expected)
+
+    def test_same_ranking_for_the_same_seed(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.assertSameDraw(roster(500, seed), 50, seed)
+
+    def test_all_tied(self):
+        students = [{"email": f"s{i}@example.com", "response": "yes"} for i in range(200)]
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.assertSameDraw(students, 20, seed)
+
+    def test_edge_capacities(self):
+        students = roster(100, 7)
+        for capacity in (0, 1, 100, 1000, -5):
+            with self.subTest(capacity=capacity):
+                self.assertSameDraw(students, capacity, 7)
+
+    def test_no_eligible_students(self):
+        self.assertSameDraw([{"email": "a@example.com", "response": "no"}], 5, 0)
+        self.assertSameDraw([], 5, 0)
+
+    @override_settings(RAFFLE_ENGINE="numpy")
+    def test_setting_selects_the_numpy_engine(self):
+        self.assertIs(raffle_engine(), run_priority_raffle_vectorized)
+
+
+class TopSelectionTests(SimpleTestCase):
+    def test_matches_the_prefix_of_the_full_ranking(self):
+        for seed in range(5):
+            students = roster(300, seed)
+            ranked, _selected = run_priority_raffle([dict(s) for s in students], 40, seed=seed)
+            for capacity in (0, 1, 40, len(ranked), len(ranked) + 10):
+                with self.subTest(seed=seed, capacity=capacity):
+                    top, eligible = select_top_priority([dict(s) for s in students], capacity, seed=seed)
+                    self.assertEqual(eligible, len(ranked))
+                    self.assertEqual(
+                        [(s["email"], s["rank"]) for s in top],
+                        [(s["email"], s["rank"]) for s in ranked[:capacity]],
+                    )
+
+
+class CsvUploadTests(SimpleTestCase):
+    content = "\ufeffEmail,First Name,Last Name,Class\nzoë@example.com,Zoë,Ünal,€1\nbo@example.com,Bo,日本,A\n"
+    expected = [
+        {"email": "zoë@example.com", "first name": "Zoë", "last name": "Ünal", "class": "€1"},
+        {"email": "bo@example.com", "first name": "Bo", "last name": "日本", "class": "A"},
+    ]
+
+    def test_bom_and_multibyte_characters_split_across_chunks(self):
+        data = self.content.encode("utf-8")
+        # Chunks of 1 and 2 bytes split the BOM and every multi-byte character
+        for chunk_size in (1, 2, 3, 5, 64 * 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_csv_upload(io.BytesIO(data), chunk_size=chunk_size)), self.expected)
+
+    def test_uploaded_file_chunks(self):
+        upload = SimpleUploadedFile("signups.csv", self.content.encode("utf-8"))
+        self.assertEqual(list(iter_csv_upload(upload, chunk_size=1)), self.expected)
+
+
+class ManifestTests(SimpleTestCase):
+    def read(self, manifest):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(f"{directory}/signups.csv", "w") as f:
+                f.write("email,response\nann@example.com,yes\n")
+            with open(f"{directory}/manifest.csv", "w") as f:
+                f.write(manifest)
+            return read_manifest(f"{directory}/manifest.csv")
+
+    def test_reads_the_events(self):
+        events = self.read("event,capacity,signups\nGala,0,signups.csv\n")
+        self.assertEqual([(e.name, e.capacity, len(e.signups)) for e in events], [("Gala", 0, 1)])
+
+    def test_rejects_a_negative_capacity(self):
+        with self.assertRaisesMessage(ValueError, "manifest.csv:2: needs an event, a whole-number capacity"):
+            self.read("event,capacity,signups\nGala,-2,signups.csv\n")
+
+
+class IdentityIndexTests(TestCase):
+    def index(self, rows, precedence=None):
+        return IdentityIndex.from_rows(rows, precedence=precedence)
+
+    def test_email_wins_over_name(self):
+        index = self.index(
+            [{"email": "a@example.com", "name": "Sam Lee"}, {"email": "b@example.com", "name": "Sam Lee"}]
+        )
+        match = index.resolve_row({"email": "B@example.com ", "name": "sam  lee"})
+        self.assertEqual((match.position, match.key, match.ambiguous), (1, "email", False))
+
+    def test_name_does_not_match_a_different_email(self):
+        index = self.index([{"email": "a@example.com", "name": "Sam Lee"}])
+        self.assertIsNone(index.resolve_row({"email": "c@example.com", "name": "Sam Lee"}).position)
+
+    def test_name_matches_a_row_without_email(self):
+        index = self.index([{"email": "a@example.com", "name": "Sam Lee"}, {"first_name": "Kim", "last_name": "Park"}])
+        match = index.resolve_row({"email": "k@example.com", "name": "Kim Park"})
+        self.assertEqual((match.position, match.key), (1, "name"))
+
+    def test_precedence_order(self):
+        rows = [{"email": "a@example.com", "user_id": "7"}, {"email": "b@example.com", "user_id": "8"}]
+        query = row_identity({"email": "a@example.com", "user_id": "8"})
+        self.assertEqual(self.index(rows).resolve(query).position, 0)
+        self.assertEqual(self.index(rows, ("user_id", "email", "name")).resolve(query).position, 1)
+
+    def test_ambiguous_name_uses_the_earliest_row(self):
+        index = self.index([{"name": "Sam Lee"}, {"name": "Sam Lee"}])
+        match = index.resolve_row({"name": "Sam Lee"})
+        self.assertEqual((match.position, match.candidates, match.ambiguous), (0, (0, 1), True))
+
+    def test_candidate_index_matches_names_like_the_full_index(self):
+        user = get_user_model().objects.create_user("organiser")
+        save_historical_csv(user, "First Name,Last Name\nJosé,Núñez\nAna  María,López\nSam,Lee\n")
+        rows = [{"name": "JOSÉ NÚÑEZ"}, {"first name": "ana maría", "last name": " LÓPEZ "}, {"name": "Kim Park"}]
+        full, candidates = historical_identity_index(user), candidate_identity_index(user, rows)
+        for row in rows:
+            with self.subTest(row=row):
+                expected = full.resolve_row(row)
+                match = candidates.resolve_row(row)
+                self.assertEqual(
+                    [candidates.refs[p] for p in match.candidates], [full.refs[p] for p in expected.candidates]
+                )
+        self.assertEqual(len(candidates), 2)
+
+    @override_settings(RAFFLE_IDENTITY_PRECEDENCE=("user_id", "name"))
+    def test_setting(self):
+        self.assertEqual(IdentityIndex().precedence, ("user_id", "name"))
+
+    @override_settings(RAFFLE_IDENTITY_PRECEDENCE=("email", "phone"))
+    def test_unknown_key_in_setting(self):
+        with self.assertRaises(ValueError):
+            identity_precedence()
+
+
+class AttendanceTests(TestCase):
+    history = (
+        "email,First Name,Last Name,Class,Absent,Late,Attended,Attended Events,Latest Attended\n"
+        "ann@example.com,Ann,Lee,A,1,0,2,\"Quiz, Party\",Party\n"
+        "bob@example.com,Bob,Ray,B,0,2,0,,\n"
+        "cara@example.com,Cara,Diaz,A,0,0,1,Quiz,Quiz\n"
+    )
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("organiser")
+        save_historical_csv(self.user, self.history)
+        self.run = RaffleRun.objects.create(user=self.user, name="Gala", capacity=2)
+
+    def counters(self):
+        return {
+            s.email: (s.num_events_attended, s.num_absences, s.num_late_arrivals, s.attended_events, s.latest_attended)
+            for s in Student.objects.filter(owner=self.user)
+        }
+
+    def apply(self):
+        selected = [{"email": "ann@example.com", "name": "Ann Lee"}, {"email": "bob@example.com", "name": "Bob Ray"}]
+        adjustments = {"bob@example.com": {"late": True}, "cara@example.com": {"absent": True}}
+        return apply_event_results(self.user, selected, "Gala", adjustments, run=self.run)
+
+    def test_apply_event_results(self):
+        self.assertEqual(self.apply(), 3)
+        counters = self.counters()
+        self.assertEqual(counters["ann@example.com"], (3, 1, 0, "Quiz, Party, Gala", "Gala"))
+        self.assertEqual(counters["bob@example.com"], (1, 0, 3, "Gala", "Gala"))
+        self.assertEqual(counters["cara@example.com"], (1, 1, 0, "Quiz", "Quiz"))
+
+    def test_ambiguous_selection_is_not_credited(self):
+        namesakes = "sam1@example.com,Sam,Lee,A,0,0,0,,\nsam2@example.com,Sam,Lee,B,0,0,0,,\n"
+        save_historical_csv(self.user, self.history + namesakes)
+        selected = [{"name": "Sam Lee"}, {"email": "ann@example.com", "name": "Ann Lee"}]
+        ambiguous = []
+        preview = preview_event_results(self.user, selected, "Gala", ambiguous=ambiguous)
+        self.assertEqual([row["email"] for row in preview], ["ann@example.com"])
+        self.assertEqual(
+            ambiguous,
+            [
+                {
+                    "email": "",
+                    "name": "Sam Lee",
+                    "matched_by": "name",
+                    "candidates": ["sam1@example.com", "sam2@example.com"],
+                }
+            ],
+        )
+        self.assertEqual(apply_event_results(self.user, selected, "Gala", run=self.run), 1)
+        self.assertEqual(Student.objects.filter(owner=self.user, num_events_attended__gt=0, name="Sam Lee").count(), 0)
+
+    def test_undo_run_restores_the_counters(self):
+        before = self.counters()
+        self.apply()
+        self.assertEqual(undo_run(self.run), 3)
+        self.assertEqual(self.counters(), before)
+        # Nothing left to withdraw
+        self.assertEqual(undo_run(self.run), 0)
+
+    def test_set_run_flags_only_logs_differences(self):
+        self.apply()
+        flags = {"bob@example.com": {"late": False}, "cara@example.com": {"absent": True}}
+        self.assertEqual(set_run_flags(self.run, flags), 1)
+        self.assertEqual(set_run_flags(self.run, flags), 0)
+        self.assertEqual(self.counters()["bob@example.com"][2], 2)
+
+    def test_undo_run_after_the_database_is_edited(self):
+        before = self.counters()
+        self.apply()
+        applied = self.counters()
+        rows = load_historical_rows(self.user)
+        for row in rows:
+            if row["email"] == "bob@example.com":
+                row["class"] = "C"
+        save_historical_rows(self.user, rows)
+        self.assertEqual(Student.objects.get(owner=self.user, email="bob@example.com").student_class, "C")
+        self.assertEqual(self.counters(), applied)
+        self.assertEqual(undo_run(self.run), 3)
+        self.assertEqual(self.counters(), before)
+
+    def test_rebuild_counters_matches_the_log(self):
+        self.apply()
+        expected = self.counters()
+        Student.objects.filter(owner=self.user).update(
+            num_events_attended=99, num_absences=99, attended_events="", latest_attended=""
+        )
+        self.assertEqual(rebuild_counters(Student.objects.filter(owner=self.user), chunk_size=2), 3)
+        self.assertEqual(self.counters(), expected)
+
+
+@override_settings(RAFFLE_JOBS_EAGER=True)
+class EventFlowTests(TestCase):
+    """The organiser's pages driven through the test client, with jobs run eagerly."""
+
+    history = AttendanceTests.history
+    signups = (
+        "\ufeffAttendee ID,Firstname,Lastname,Participation status,Email\n"
+        "1,Ann,Lee,planned,ann@example.com\n"
+        "2,Bob,Ray,planned,bob@example.com\n"
+        "3,Cara,Diaz,cancelled_by_admin,cara@example.com\n"
+        "4,Dev,New,planned,dev@example.com\n"
+    )
+
+    def setUp(self):
+        self.enterContext(self.settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.user = get_user_model().objects.create_user("organiser")
+        self.client.force_login(self.user)
+        save_historical_csv(self.user, self.history)
+
+    def configure(self, capacity=10):
+        upload = SimpleUploadedFile("signups.csv", self.signups.encode("utf-8"))
+        data = {"event_name": "Gala", "event_capacity": capacity, "event_date": "2026-01-01", "signup_csv": upload}
+        response = self.client.post(reverse("raffle:config"), data, follow=True)
+        self.assertRedirects(response, reverse("raffle:selection"))
+        return response
+
+    def download_database(self):
+        response = self.client.post(reverse("raffle:download_database"), follow=True)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def attended(self):
+        return dict(Student.objects.filter(owner=self.user).values_list("email", "num_events_attended"))
+
+    def test_upload_config_results_save_download(self):
+        Student.objects.all().delete()
+        history = self.history + "not-an-email,Eve,Fox,A,0,0,0,,\n"
+        upload = SimpleUploadedFile("history.csv", history.encode("utf-8"))
+        response = self.client.post(reverse("raffle:upload"), {"historical_csv": upload}, follow=True)
+        self.assertRedirects(response, reverse("raffle:upload"))
+        shown = [str(m) for m in response.context["messages"]]
+        self.assertTrue(shown[0].startswith("Imported 3 rows"), shown)
+        self.assertIn("line 5: invalid email 'not-an-email'", shown[1])
+
+        response = self.configure(capacity=2)
+        self.assertEqual(len(response.context["selected"]), 2)
+        response = self.client.get(reverse("raffle:results"))
+        self.assertEqual(response.context["selected_count"], 2)
+        self.client.post(reverse("raffle:results"), {"action": "save"})
+        selected = [row["email"] for row in response.context["selected"]]
+        csv_text = self.download_database()
+        run = RaffleRun.objects.get(user=self.user)
+        self.assertEqual(sorted(run.selections.values_list("email", flat=True)), sorted(selected))
+        for row in iter_csv_upload(io.StringIO(csv_text)):
+            with self.subTest(email=row["email"]):
+                self.assertEqual("Gala" in row["attended events"], row["email"] in selected)
+
+    def test_history_job_is_reused_until_the_draw_or_database_changes(self):
+        self.configure()
+        workspace = RaffleWorkspace.objects.get(user=self.user)
+        params = {"workspace_id": workspace.id}
+        job = submit_job(self.user, "history_csv", params=params)
+        self.assertEqual(submit_job(self.user, "history_csv", params=params).id, job.id)
+        save_historical_rows(self.user, load_historical_rows(self.user))
+        edited = submit_job(self.user, "history_csv", params=params)
+        self.assertNotEqual(edited.id, job.id)
+        self.client.post(reverse("raffle:selection"), follow=True)
+        self.assertNotIn(submit_job(self.user, "history_csv", params=params).id, (job.id, edited.id))
+
+    def test_downloads_record_the_results_once(self):
+        self.configure()
+        self.download_database()
+        expected = {"ann@example.com": 3, "bob@example.com": 1, "cara@example.com": 1, "dev@example.com": 1}
+        self.assertEqual(self.attended(), expected)
+        # Ranking the whole pool for the ranking download must not count as a new draw
+        response = self.client.get(reverse("raffle:download_ranking"))
+        b"".join(response.streaming_content)
+        csv_text = self.download_database()
+        self.assertEqual(self.attended(), expected)
+        self.assertIn("dev@example.com", csv_text)
+        self.assertEqual(RaffleRun.objects.filter(user=self.user).count(), 1)
+
+    def test_saving_the_results_then_downloading_records_them_once(self):
+        self.configure()
+        response = self.client.post(reverse("raffle:results"), {"action": "save"})
+        self.assertRedirects(response, reverse("raffle:upload"), fetch_redirect_response=False)
+        expected = {"ann@example.com": 3, "bob@example.com": 1, "cara@example.com": 1}
+        self.assertEqual(self.attended(), expected)
+        self.download_database()
+        self.assertEqual(self.attended(), {**expected, "dev@example.com": 1})
+        run = RaffleRun.objects.get(user=self.user)
+        selected = {"ann@example.com", "bob@example.com", "dev@example.com"}
+        self.assertEqual(set(run.selections.values_list("email", flat=True)), selected)
+
+    def test_failed_save_logs_nothing(self):
+        self.configure()
+        with mock.patch("raffle.workspace.index_run_selections", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse("raffle:results"), {"action": "save"})
+        self.assertFalse(RaffleRun.objects.filter(user=self.user).exists())
+        self.assertFalse(AttendanceEntry.objects.exists())
+        # Nothing was claimed either, so saving again records the results
+        self.client.post(reverse("raffle:results"), {"action": "save"})
+        self.assertEqual(self.attended()["ann@example.com"], 3)
+
+    def test_database_download_is_a_gzipped_post(self):
+        self.configure()
+        self.assertEqual(self.client.get(reverse("raffle:download_database")).status_code, 405)
+        self.assertFalse(AttendanceEntry.objects.exists())
+        response = self.client.post(reverse("raffle:download_database"))
+        job = Job.objects.get(user=self.user, kind="history_csv")
+        self.assertRedirects(response, reverse("raffle:job", args=[job.id]), target_status_code=302)
+        response = self.client.get(reverse("raffle:job_download", args=[job.id]), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("dev@example.com", gzip.decompress(b"".join(response.streaming_content)).decode())
+
+    def test_retried_job_does_not_log_the_results_again(self):
+        self.configure()
+        workspace = RaffleWorkspace.objects.get(user=self.user)
+        job = submit_job(self.user, "history_csv", params={"workspace_id": workspace.id})
+        before = self.attended()
+        # As after requeue_stale_jobs, or a failure once the results were recorded
+        self.assertEqual(run_job(job).status, Job.STATUS_DONE)
+        self.assertEqual(self.attended(), before)
+
+
+class HistoricalSearchTests(TestCase):
+    history = (
+        "email,First Name,Last Name,Class\n"
+        "ann@example.com,Annabel,Lee,A\n"
+        "anna@example.com,Anna,Ray,B\n"
+        "bob@example.com,Bob,Stone,A\n"
+        "cara@example.com,Cara,Diaz,B\n"
+        "dev@example.com,Dev,Annand,A\n"
+    )
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("organiser")
+        self.client.force_login(self.user)
+        save_historical_csv(self.user, self.history)
+
+    def emails(self, students):
+        return [s.email for s in students]
+
+    def test_word_prefixes(self):
+        students, has_next = search_students(self.user, "ann")
+        self.assertEqual(set(self.emails(students)), {"ann@example.com", "anna@example.com", "dev@example.com"})
+        self.assertFalse(has_next)
+        self.assertEqual(self.emails(search_students(self.user, "ann lee")[0]), ["ann@example.com"])
+
+    def test_typo_falls_back_to_trigrams(self):
+        self.assertIn("cara@example.com", self.emails(search_students(self.user, "diax")[0]))
+
+    def test_pages(self):
+        first, has_next = search_students(self.user, "ann", page_size=2)
+        second, has_more = search_students(self.user, "ann", page=2, page_size=2)
+        self.assertEqual((len(first), has_next, len(second), has_more), (2, True, 1, False))
+        self.assertFalse(set(self.emails(first)) & set(self.emails(second)))
+
+    def test_queryset_narrows_the_matches(self):
+        queryset = Student.objects.filter(owner=self.user, student_class="A")
+        students, _has_next = search_students(self.user, "ann", queryset=queryset)
+        self.assertEqual(set(self.emails(students)), {"ann@example.com", "dev@example.com"})
+
+    def test_historical_table_pages_with_a_cursor(self):
+        seen = []
+        query = "sort=name"
+        with mock.patch("raffle.views.HISTORICAL_PAGE_SIZE", 2):
+            while query is not None:
+                response = self.client.get(f"{reverse('raffle:upload')}?{query}")
+                seen.extend(r.email for r in response.context["historical_rows"])
+                query = response.context["next_query"] or None
+        expected = list(Student.objects.filter(owner=self.user).order_by("name", "id").values_list("email", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_historical_table_search(self):
+        response = self.client.get(reverse("raffle:upload"), {"q": "stone"})
+        self.assertEqual(self.emails(response.context["historical_rows"]), ["bob@example.com"])
+
+
+class ImporterTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("organiser")
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        csv_text = (
+            "email,First Name,Last Name,Absent,Attended\n"
+            "ann@example.com,Ann,Lee,1,2\n"
+            ",,,0,0\n"
+            "bob@example.com,Bob,Ray,-1,0\n"
+            "cara@example.com,Cara,Diaz,0,1.5\n"
+            "dev@example.com,Dev,New,2.0,\n"
+        )
+        report = import_historical_csv(self.user, SimpleUploadedFile("history.csv", csv_text.encode("utf-8")))
+        self.assertEqual((report.rows, report.rejected_count), (2, 3))
+        self.assertEqual([line for line, _reason in report.rejected], [3, 4, 5])
+        self.assertEqual(report.rejected[0][1], "missing email and name")
+        students = Student.objects.filter(owner=self.user).order_by("position")
+        self.assertEqual(
+            list(students.values_list("email", "num_absences", "num_events_attended")),
+            [("ann@example.com", 1, 2), ("dev@example.com", 2, 0)],
+        )
+
+    def test_small_batches(self):
+        rows = [{"email": f"s{i}@example.com", "first name": f"S{i}"} for i in range(7)]
+        report = import_historical_rows(self.user, rows, batch_size=3)
+        self.assertEqual(report.rows, 7)
+        positions = Student.objects.filter(owner=self.user).order_by("id").values_list("position", flat=True)
+        self.assertEqual(list(positions), list(range(7)))
+
+
+class ObservabilityTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("organiser", is_staff=True)
+        self.client.force_login(self.user)
+
+    @override_settings(RAFFLE_INSTRUMENTATION=True)
+    def test_server_timing_header(self):
+        instrumentation.reset_stats()
+        response = self.client.get(reverse("raffle:upload"))
+        self.assertIn("render;dur=", response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertEqual(instrumentation.stats()["views"]["raffle:upload"]["requests"], 1)
+
+    def test_no_server_timing_header_by_default(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("raffle:upload")))
+
+    def test_metrics_are_off_in_tests(self):
+        self.assertEqual(self.client.get(reverse("raffle:metrics")).status_code, 404)
+
+    def test_metrics_endpoint(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(mock.patch.object(metrics, "_file", None))
+        self.enterContext(
+            self.settings(RAFFLE_METRICS=True, RAFFLE_METRICS_DIR=directory, RAFFLE_METRICS_TOKEN="s3cret")
+        )
+        # A file left by a process that has exited
+        dead = subprocess.Popen([sys.executable, "-c", ""])
+        dead.wait()
+        with open(f"{directory}/{dead.pid}.json", "w") as f:
+            f.write('{"raffle_draws_total": [[["full"], 1000]]}')
+        metrics.record_draw("top", eligible=10, selected=2)
+
+        body = self.client.get(reverse("raffle:metrics")).content.decode()
+        self.assertIn('raffle_draws_total{ranking="top"}', body)
+        self.assertNotIn('raffle_draws_total{ranking="full"} 1000', body)
+        self.assertFalse(os.path.exists(f"{directory}/{dead.pid}.json"))
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("raffle:metrics")).status_code, 403)
+        response = self.client.get(reverse("raffle:metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
@@ -21,6 +21,11 @@ urlpatterns = [
     path("download/selected/", views.download_selected_csv, name="download_selected"),
     path("download/ranking/", views.download_ranking_csv, name="download_ranking"),
     path("download/database/", views.download_updated_database_csv, name="download_database"),
+    path("jobs/<int:job_id>/", views.job_view, name="job"),
+    path("jobs/<int:job_id>/status/", views.job_status_view, name="job_status"),
+    path("jobs/<int:job_id>/download/", views.job_download_view, name="job_download"),
+    path("stats/", views.stats_view, name="stats"),
+    path("metrics", views.metrics_view, name="metrics"),
 ]
 
 
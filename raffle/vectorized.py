@@ -0,0 +1,81 @@
+import random
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from . import metrics
+from .instrumentation import timed
+from .services import StudentRow, _parse_date, is_eligible, run_priority_raffle
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+HAS_NUMPY = np is not None
+
+
+def _date_ordinal(value, cache: Dict[str, int]) -> int:
+    if isinstance(value, str):
+        if value not in cache:
+            parsed = _parse_date(value)
+            cache[value] = (parsed or date.min).toordinal()
+        return cache[value]
+    return (value or date.min).toordinal()
+
+
+def priority_arrays(eligible: List[StudentRow]) -> Dict[str, "np.ndarray"]:
+    """Column arrays of the ``_priority_key`` inputs, one entry per student."""
+    n = len(eligible)
+    dates: Dict[str, int] = {}
+    return {
+        "attended": np.fromiter((int(s.get("num_events_attended") or 0) for s in eligible), np.int64, n),
+        "absences": np.fromiter((int(s.get("num_absences") or 0) for s in eligible), np.int64, n),
+        "late": np.fromiter((int(s.get("num_late_arrivals") or 0) for s in eligible), np.int64, n),
+        "last_attended": np.fromiter(
+            (_date_ordinal(s.get("last_attended_date"), dates) for s in eligible), np.int64, n
+        ),
+    }
+
+
+@timed("rank")
+def run_priority_raffle_vectorized(
+    students: List[StudentRow], capacity: int, seed: Optional[int] = None
+) -> Tuple[List[StudentRow], List[StudentRow]]:
+    """Same contract and, for a given ``seed``, same output as ``run_priority_raffle``.
+
+    The random tie-break key is each student's position after the same
+    ``random.Random(seed).shuffle`` the pure-Python engine performs, so
+    ``np.lexsort`` over (attended, absences, late, last attended, tie-break)
+    reproduces its shuffle-then-stable-sort order.
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("The vectorized raffle engine requires numpy")
+    eligible = [s for s in students if is_eligible(s)]
+    order = list(range(len(eligible)))
+    random.Random(seed).shuffle(order)
+    tie_break = np.empty(len(eligible), dtype=np.int64)
+    tie_break[np.asarray(order, dtype=np.int64)] = np.arange(len(eligible), dtype=np.int64)
+
+    cols = priority_arrays(eligible)
+    # lexsort sorts by the last key first
+    ranking = np.lexsort((tie_break, cols["last_attended"], cols["late"], cols["absences"], cols["attended"]))
+
+    ranked = [eligible[i] for i in ranking.tolist()]
+    capacity = max(capacity, 0)
+    for idx, s in enumerate(ranked, start=1):
+        s["rank"] = idx
+        s["selected"] = idx <= capacity
+    metrics.record_draw("full", len(ranked), min(capacity, len(ranked)))
+    return ranked, ranked[:capacity]
+
+
+def raffle_engine() -> Callable[..., Tuple[List[StudentRow], List[StudentRow]]]:
+    """The full-ranking engine selected by ``settings.RAFFLE_ENGINE`` ("python" or "numpy").
+
+    NumPy is optional; without it the pure-Python engine is used.
+    """
+    if getattr(settings, "RAFFLE_ENGINE", "python") == "numpy" and HAS_NUMPY:
+        return run_priority_raffle_vectorized
+    return run_priority_raffle
@@ -1,141 +1,209 @@
-import csv
-import io
-from datetime import date, datetime
-
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import redirect, render
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Iterable, Union
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils.crypto import constant_time_compare
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST
 
+from . import instrumentation, metrics
 from .forms import ConfigForm, UploadForm, RegistrationForm, UserSettingsForm
-from .models import HistoricalData, RaffleRun
+from .attendance import preview_event_results, run_flags, set_run_flags, undo_run
+from .history import (
+    HISTORICAL_SORTS,
+    has_historical,
+    historical_classes,
+    historical_identity_index,
+    historical_queryset,
+    latest_selection_dates,
+    load_historical_rows,
+    save_historical_rows,
+)
+from .jobs import ajob_payload, job_payload, submit_job
+from .models import Job, RaffleRun, RaffleWorkspace
+from .offload import offload
+from .pagination import keyset_page
+from .profiling import profile_slow
+from .search import search_students, search_workspace_rows
 from .services import (
-    consolidate_students,
-    generate_ranking_csv,
-    generate_updated_history_csv,
-    parse_csv_upload,
-    run_priority_raffle,
+    aiter_ranking_csv,
+    iter_ranking_csv,
+    iter_rows_csv,
+    parse_csv_text,
+)
+from .workspace import (
+    aeligible_count,
+    aget_workspace,
+    aiter_eligible_rows,
+    aselected_rows,
+    attach_workspace,
+    eligible_count,
+    get_workspace,
+    iter_eligible_rows,
+    master_count,
+    master_queryset,
+    record_results,
+    selected_rows,
 )
 
 
-SESSION_KEYS = {
-    "signups": "raffle_signups",
-    "historical": "raffle_historical",
-    "master": "raffle_master",
-    "event_name": "raffle_event_name",
-    "event_capacity": "raffle_event_capacity",
-    "event_date": "raffle_event_date",
-    "eligible_ranked": "raffle_eligible_ranked",
-    "selected": "raffle_selected",
-    "updated_history_csv": "raffle_updated_history_csv",
-}
+# Template rendering is a stage of instrumented requests
+render = instrumentation.timed("render")(render)
 
+# Rows per page of the historical and master-list tables
+HISTORICAL_PAGE_SIZE = 100
 
-@login_required
-def upload_view(request: HttpRequest) -> HttpResponse:
-    # Build historical preview for GET and POST rendering
-    historical_rows = []
+
+def _page_number(request: HttpRequest) -> int:
     try:
-        persisted_historical = request.session.get(SESSION_KEYS["historical"]) or []
-        if not persisted_historical:
-            hd = HistoricalData.objects.filter(user=request.user).first()
-            if hd and hd.csv_text:
-                persisted_historical = parse_csv_upload(io.BytesIO(hd.csv_text.encode("utf-8")))
-        historical_rows = persisted_historical
-    except Exception:
-        historical_rows = []
-
-    # Provide events list and latest selection dates per email
-    runs = RaffleRun.objects.filter(user=request.user).order_by("-date", "-created_at")
-    email_to_latest_date = {}
-    for run in runs:
-        if not run.selected_csv_text:
-            continue
-        for row in parse_csv_upload(io.BytesIO(run.selected_csv_text.encode("utf-8"))):
-            email = (row.get("email") or "").lower()
-            if not email:
-                continue
-            d = run.date
-            if d and (email not in email_to_latest_date or email_to_latest_date[email] < str(d)):
-                email_to_latest_date[email] = str(d)
+        return max(int(request.GET.get("page") or 1), 1)
+    except ValueError:
+        return 1
 
-    # Sorting and filtering parameters
-    sort_key = (request.GET.get("sort") or "").lower()
-    direction = (request.GET.get("direction") or "asc").lower()
-    focus_run_id = request.GET.get("event")
 
+def _report_import(request: HttpRequest, report: dict) -> None:
+    messages.success(request, report["summary"])
+    if report["rejected"]:
+        shown = "; ".join(f"line {line}: {reason}" for line, reason in report["rejected"][:10])
+        more = report["rejected_count"] - min(len(report["rejected"]), 10)
+        messages.warning(request, f"Skipped rows: {shown}" + (f" (and {more} more)" if more else ""))
+
+
+async def _auser(request: HttpRequest):
+    """The logged-in user of an async view, also bound to ``request.user`` for the templates."""
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def _arender(request: HttpRequest, template_name: str, context: dict) -> HttpResponse:
+    # Templates read the session (messages) lazily, which must not happen on the event loop
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@login_required
+async def upload_view(request: HttpRequest) -> HttpResponse:
+    user = await _auser(request)
     if request.method == "POST":
         form = UploadForm(request.POST, request.FILES)
         if form.is_valid():
             if form.cleaned_data.get("historical_csv"):
-                historical = parse_csv_upload(form.cleaned_data["historical_csv"])
-                request.session[SESSION_KEYS["historical"]] = historical
-                HistoricalData.objects.update_or_create(user=request.user, defaults={"csv_text": _to_csv(historical)})
+                job = await sync_to_async(submit_job)(
+                    user,
+                    "import_historical",
+                    params={"next": "raffle:upload"},
+                    upload=form.cleaned_data["historical_csv"],
+                )
+                return redirect("raffle:job", job_id=job.id)
             # Stay on page after saving historical; do not jump to config here
             return redirect("raffle:upload")
     else:
         form = UploadForm()
-    # Apply filtering by event (selected students in that run)
-    if focus_run_id:
-        try:
-            run = RaffleRun.objects.get(user=request.user, id=int(focus_run_id))
-            selected_rows = parse_csv_upload(io.BytesIO((run.selected_csv_text or "").encode("utf-8")))
-            selected_emails = { (r.get("email") or "").lower() for r in selected_rows }
-            historical_rows = [r for r in historical_rows if (r.get("email") or "").lower() in selected_emails]
-        except Exception:
-            pass
 
-    # Sort
-    def sort_value(r, key):
-        try:
-            return int(r.get(key) or 0)
-        except Exception:
-            return 0
+    runs = RaffleRun.objects.filter(user=user).order_by("-date", "-created_at").only("id", "name", "date")
+    ctx = await sync_to_async(_historical_table)(request, user)
+    ctx.update({"form": form, "runs": [run async for run in runs]})
+    return await _arender(request, "raffle/upload.html", ctx)
 
-    if sort_key in {"attended", "absent", "late"}:
-        historical_rows = sorted(historical_rows, key=lambda r: sort_value(r, sort_key), reverse=(direction=="desc"))
 
-    # Annotate latest date
-    for r in historical_rows:
-        email = (r.get("email") or "").lower()
-        r["latest_date"] = email_to_latest_date.get(email, "")
+def _historical_table(request: HttpRequest, user) -> dict:
+    """Template context for one page of the historical table, as filtered and sorted by the query string."""
+    # Sorting and filtering parameters
+    sort_key = (request.GET.get("sort") or "").lower()
+    if sort_key not in HISTORICAL_SORTS:
+        sort_key = ""
+    direction = (request.GET.get("direction") or "asc").lower()
+    focus_run_id = request.GET.get("event")
+    class_filter = (request.GET.get("class") or "").strip()
+    q = (request.GET.get("q") or "").strip()
+    try:
+        run_id = int(focus_run_id) if focus_run_id else None
+    except ValueError:
+        run_id = None
+
+    # Fetch one page of the historical table, filtered and sorted in the database
+    page = _page_number(request)
+    next_params = {}
+    if q and not sort_key:
+        # Unsorted searches list the best matches first
+        historical_rows, has_next = search_students(
+            user,
+            q,
+            queryset=historical_queryset(user, run_id=run_id, student_class=class_filter),
+            page=page,
+            page_size=HISTORICAL_PAGE_SIZE,
+        )
+        if has_next:
+            next_params["page"] = page + 1
+    else:
+        field, parse = HISTORICAL_SORTS[sort_key]
+        historical_rows, next_cursor = keyset_page(
+            historical_queryset(user, run_id=run_id, student_class=class_filter, q=q, sort=sort_key),
+            field,
+            descending=(direction == "desc"),
+            cursor=request.GET.get("after"),
+            page_size=HISTORICAL_PAGE_SIZE,
+            parse=parse,
+        )
+        if next_cursor:
+            next_params["after"] = next_cursor
 
-    return render(
-        request,
-        "raffle/upload.html",
-        {
-            "form": form,
-            "historical_rows": historical_rows,
-            "runs": runs,
-            "sort": sort_key,
-            "direction": direction,
-            "focus_run_id": focus_run_id,
-        },
-    )
+    # Annotate latest selection date for the rows on this page
+    email_to_latest_date = latest_selection_dates(user, emails=[r.email for r in historical_rows])
+    for r in historical_rows:
+        r.latest_date = email_to_latest_date.get(r.email, "")
+
+    next_query = ""
+    if next_params:
+        params = request.GET.copy()
+        for key, value in next_params.items():
+            # Replace, not append: QueryDict.update would keep the current page's value too
+            params[key] = value
+        next_query = params.urlencode()
+
+    return {
+        "historical_rows": historical_rows,
+        "has_historical": has_historical(user),
+        "classes": historical_classes(user),
+        "sort": sort_key,
+        "direction": direction,
+        "focus_run_id": focus_run_id,
+        "class_filter": class_filter,
+        "q": q,
+        "is_first_page": page == 1 and not request.GET.get("after"),
+        "next_query": next_query,
+    }
 
 
 @login_required
+@profile_slow
 def config_view(request: HttpRequest) -> HttpResponse:
     # master will be computed here from uploaded signups when form is valid
     if request.method == "POST":
         form = ConfigForm(request.POST, request.FILES)
         if form.is_valid():
-            request.session[SESSION_KEYS["event_name"]] = form.cleaned_data["event_name"]
-            request.session[SESSION_KEYS["event_capacity"]] = int(form.cleaned_data["event_capacity"])
-            request.session[SESSION_KEYS["event_date"]] = str(form.cleaned_data["event_date"])  # ISO
-            # Build master from uploaded signups and saved historical
-            signups = parse_csv_upload(form.cleaned_data["signup_csv"])
-            persisted_historical = request.session.get(SESSION_KEYS["historical"]) or []
-            if not persisted_historical:
-                hd = HistoricalData.objects.filter(user=request.user).first()
-                if hd and hd.csv_text:
-                    persisted_historical = parse_csv_upload(io.BytesIO(hd.csv_text.encode("utf-8")))
-            master = consolidate_students(signups, persisted_historical)
-            request.session[SESSION_KEYS["signups"]] = signups
-            request.session[SESSION_KEYS["master"]] = _serialize_for_session(master)
-            return redirect("raffle:selection")
+            # Reading, matching and drawing run in the background; the job page polls for the result
+            job = submit_job(
+                request.user,
+                "prepare_event",
+                params={
+                    "event_name": form.cleaned_data["event_name"],
+                    "capacity": int(form.cleaned_data["event_capacity"]),
+                    "event_date": form.cleaned_data["event_date"],
+                },
+                upload=form.cleaned_data["signup_csv"],
+            )
+            return redirect("raffle:job", job_id=job.id)
     else:
         form = ConfigForm()
     return render(request, "raffle/config.html", {"form": form})
@@ -143,96 +211,87 @@ def config_view(request: HttpRequest) -> HttpResponse:
 
 @login_required
 def database_view(request: HttpRequest) -> HttpResponse:
-    master = request.session.get(SESSION_KEYS["master"]) or []
-    event_name = request.session.get(SESSION_KEYS["event_name"]) or ""
-    event_capacity = request.session.get(SESSION_KEYS["event_capacity"]) or 0
-    # Optional simple search via GET param
+    workspace = get_workspace(request)
+    event_name = workspace.event_name if workspace else ""
+    event_capacity = workspace.capacity if workspace else 0
+    # Optional search via GET param, best matches first
     q = (request.GET.get("q") or "").strip().lower()
-    students = master
-    if q:
-        students = [
-            s
-            for s in master
-            if q in (s.get("name") or "").lower()
-            or q in (s.get("email") or "").lower()
-            or q in (s.get("class") or "").lower()
-        ]
+    page = _page_number(request)
+    students, next_cursor, has_next = [], None, False
+    if workspace and q:
+        students, has_next = search_workspace_rows(workspace, q, page=page, page_size=HISTORICAL_PAGE_SIZE)
+    elif workspace:
+        students, next_cursor = keyset_page(
+            master_queryset(workspace),
+            "position",
+            cursor=request.GET.get("after"),
+            page_size=HISTORICAL_PAGE_SIZE,
+            parse=int,
+        )
     ctx = {
-        "students": students,
-        "total": len(master),
+        "students": [s.as_row() for s in students],
+        "total": master_count(workspace) if workspace else 0,
         "event_name": event_name,
         "event_capacity": event_capacity,
         "q": q,
+        "next_cursor": next_cursor,
+        "page": page,
+        "has_next": has_next,
     }
     return render(request, "raffle/database.html", ctx)
 
 
 @login_required
 def selection_view(request: HttpRequest) -> HttpResponse:
-    master = request.session.get(SESSION_KEYS["master"]) or []
-    if not master:
+    workspace = get_workspace(request)
+    if not workspace:
         return redirect("raffle:upload")
-    capacity = int(request.session.get(SESSION_KEYS["event_capacity"]) or 0)
-    eligible_ranked, selected = run_priority_raffle(master, capacity)
-    request.session[SESSION_KEYS["eligible_ranked"]] = _serialize_for_session(eligible_ranked)
-    request.session[SESSION_KEYS["selected"]] = _serialize_for_session(selected)
+    if request.method == "POST" or workspace.seed is None:
+        # A new draw ranks the whole pool, so it runs in the background
+        job = submit_job(request.user, "draw", params={"workspace_id": workspace.id})
+        return redirect("raffle:job", job_id=job.id)
+    selected = selected_rows(workspace)
+    total_eligible = eligible_count(workspace)
     ctx = {
-        "eligible": eligible_ranked,
         "selected": selected,
-        "capacity": capacity,
+        "eligible_count": total_eligible,
+        "unranked_count": total_eligible - len(selected),
+        "identity_report": workspace.identity_report,
+        "capacity": workspace.capacity,
     }
     return render(request, "raffle/selection.html", ctx)
 
 
 @login_required
+@profile_slow
 def results_view(request: HttpRequest) -> HttpResponse:
-    eligible = request.session.get(SESSION_KEYS["eligible_ranked"]) or []
-    selected = request.session.get(SESSION_KEYS["selected"]) or []
-    event_name = request.session.get(SESSION_KEYS["event_name"]) or ""
-    event_capacity = int(request.session.get(SESSION_KEYS["event_capacity"]) or 0)
-    event_date = request.session.get(SESSION_KEYS["event_date"]) or ""
-    # Compute updated historical database preview (do not persist until confirmed)
-    # Use the actual historical database as the base for updates
-    base_historical = request.session.get(SESSION_KEYS["historical"]) or []
-    if not base_historical:
-        hd = HistoricalData.objects.filter(user=request.user).first()
-        if hd and hd.csv_text:
-            base_historical = parse_csv_upload(io.BytesIO(hd.csv_text.encode("utf-8")))
+    workspace = get_workspace(request)
+    if not workspace:
+        return redirect("raffle:upload")
+    selected = selected_rows(workspace)
+    event_name = workspace.event_name
+    event_capacity = workspace.capacity
+    event_date = workspace.event_date.isoformat() if workspace.event_date else ""
+    # Preview the historical rows this event changes (do not persist until confirmed)
     adjustments = request.session.get("raffle_adjustments") or {}
+    ambiguous: list = []
+    updated_rows = preview_event_results(request.user, selected, event_name, adjustments, ambiguous)
 
-    updated_csv = generate_updated_history_csv(base_historical, selected, event_name, adjustments, event_date)
-    updated_rows = parse_csv_upload(io.BytesIO(updated_csv.encode("utf-8")))
-
-    # Identify selected participants not present in historical (by email)
-    base_emails = { (r.get("email") or "").lower() for r in base_historical }
-    missing_selected = [s for s in selected if (s.get("email") or "").lower() not in base_emails]
+    # Identify selected participants not present in historical
+    historical_index = historical_identity_index(request.user)
+    missing_selected = [s for s in selected if not historical_index.contains(s)]
 
     if request.method == "POST":
         action = request.POST.get("action") or ""
         if action == "save":
-            # Persist per user and record raffle run
-            HistoricalData.objects.update_or_create(user=request.user, defaults={"csv_text": updated_csv})
-            request.session[SESSION_KEYS["historical"]] = updated_rows
-            try:
-                selected_csv = _to_csv(selected)
-                eligible_csv = generate_ranking_csv(eligible)
-                RaffleRun.objects.create(
-                    user=request.user,
-                    name=event_name,
-                    date=datetime.fromisoformat(event_date).date() if event_date else None,
-                    capacity=event_capacity,
-                    signup_csv_text=_to_csv(request.session.get(SESSION_KEYS["signups"]) or []),
-                    selected_csv_text=selected_csv,
-                    eligible_csv_text=eligible_csv,
-                )
-            except Exception:
-                pass
+            # Record the raffle run and log its results, in one transaction (see record_results)
+            record_results(workspace, adjustments)
             return redirect("raffle:upload")
         else:
             # Cancel -> do not persist
             return redirect("raffle:upload")
     ctx = {
-        "eligible_count": len(eligible),
+        "eligible_count": eligible_count(workspace),
         "selected_count": len(selected),
         "event_name": event_name,
         "event_capacity": event_capacity,
@@ -240,23 +299,34 @@ def results_view(request: HttpRequest) -> HttpResponse:
         "selected": selected,
         "updated_history_rows": updated_rows,
         "missing_selected": missing_selected,
+        "ambiguous_selected": ambiguous,
     }
     return render(request, "raffle/results.html", ctx)
 
 
 @login_required
-def events_list_view(request: HttpRequest) -> HttpResponse:
-    runs = RaffleRun.objects.filter(user=request.user).order_by("-created_at")
-    return render(request, "raffle/events_list.html", {"runs": runs})
+async def events_list_view(request: HttpRequest) -> HttpResponse:
+    user = await _auser(request)
+    # The stored CSV datasets are only needed on the detail page
+    runs = RaffleRun.objects.filter(user=user).order_by("-created_at")
+    runs = runs.only("id", "name", "date", "capacity", "created_at")
+    return await _arender(request, "raffle/events_list.html", {"runs": [run async for run in runs]})
 
 
 @login_required
-def event_detail_view(request: HttpRequest, run_id: int) -> HttpResponse:
-    run = RaffleRun.objects.get(user=request.user, id=run_id)
-    selected_rows = parse_csv_upload(io.BytesIO(run.selected_csv_text.encode("utf-8"))) if run.selected_csv_text else []
-    eligible_rows = parse_csv_upload(io.BytesIO(run.eligible_csv_text.encode("utf-8"))) if run.eligible_csv_text else []
+async def event_detail_view(request: HttpRequest, run_id: int) -> HttpResponse:
+    user = await _auser(request)
+    run = await aget_object_or_404(RaffleRun, user=user, id=run_id)
+    # Parsing the stored datasets is CPU-bound, so it runs in the offload pool
+    selected_rows, eligible_rows = await asyncio.gather(
+        offload(parse_csv_text, run.selected_csv_text), offload(parse_csv_text, run.eligible_csv_text)
+    )
     if request.method == "POST":
-        # Build adjustments and apply to historical DB
+        if request.POST.get("action") == "undo":
+            # Withdraw everything this run logged in the historical database
+            await sync_to_async(undo_run)(run)
+            return redirect("raffle:event_detail", run_id=run.id)
+        # Build absent/late marks and log the changes against the historical DB
         adjustments = {}
         for s in selected_rows:
             email = (s.get("email") or "").lower()
@@ -266,15 +336,12 @@ def event_detail_view(request: HttpRequest, run_id: int) -> HttpResponse:
                 "absent": bool(request.POST.get(f"absent_{email}")),
                 "late": bool(request.POST.get(f"late_{email}")),
             }
-        # Load historical
-        hd = HistoricalData.objects.filter(user=request.user).first()
-        master = parse_csv_upload(io.BytesIO(hd.csv_text.encode("utf-8"))) if (hd and hd.csv_text) else []
-        # Apply updated historical with just selected rows; event name from run
-        updated_csv = generate_updated_history_csv(master, selected_rows, run.name, adjustments)
-        HistoricalData.objects.update_or_create(user=request.user, defaults={"csv_text": updated_csv})
-        request.session[SESSION_KEYS["historical"]] = parse_csv_upload(io.BytesIO(updated_csv.encode("utf-8")))
+        await sync_to_async(set_run_flags)(run, adjustments)
         return redirect("raffle:event_detail", run_id=run.id)
-    return render(
+    flags = await sync_to_async(run_flags)(run)
+    for s in selected_rows:
+        s["flags"] = flags.get((s.get("email") or "").lower(), {})
+    return await _arender(
         request,
         "raffle/event_detail.html",
         {"run": run, "selected_rows": selected_rows, "eligible_rows": eligible_rows},
@@ -283,14 +350,12 @@ def event_detail_view(request: HttpRequest, run_id: int) -> HttpResponse:
 
 @login_required
 def edit_historical_view(request: HttpRequest) -> HttpResponse:
-    hd = HistoricalData.objects.filter(user=request.user).first()
     if request.method == "POST":
         try:
             row_count = int(request.POST.get("row_count") or 0)
         except Exception:
             row_count = 0
         preserved_events = request.session.get("raffle_edit_rows_events") or []
-        max_event_cols = int(request.session.get("raffle_edit_max_event_cols") or 0)
 
         # Rebuild rows from POST + preserved event columns
         rebuilt = []
@@ -320,51 +385,17 @@ def edit_historical_view(request: HttpRequest) -> HttpResponse:
                 }
             )
 
-        # Write CSV in historical format, preserving event columns
-        headers = ["email", "First Name", "Last Name", "Class"]
-        for i in range(1, max_event_cols + 1):
-            headers.append(f"Event{i}")
-        headers.extend(["Absent", "Late", "Attended", "Attended Events", "Latest Attended"])
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(headers)
-        for r in rebuilt:
-            row = [
-                r.get("email") or "",
-                r.get("first name") or "",
-                r.get("last name") or "",
-                r.get("class") or "",
-            ]
-            events_cols = r.get("_events_columns") or {}
-            for i in range(1, max_event_cols + 1):
-                row.append(events_cols.get(f"event{i}") or "")
-            row.extend([
-                r.get("absent") or 0,
-                r.get("late") or 0,
-                r.get("attended") or 0,
-                r.get("attended events") or "",
-                r.get("latest attended") or "",
-            ])
-            writer.writerow(row)
-        csv_text = output.getvalue()
-
-        HistoricalData.objects.update_or_create(user=request.user, defaults={"csv_text": csv_text})
-        request.session[SESSION_KEYS["historical"]] = parse_csv_upload(io.BytesIO(csv_text.encode("utf-8"))) if csv_text else []
+        # Store rows, preserving event columns
+        save_historical_rows(request.user, rebuilt)
         return redirect("raffle:upload")
 
     # GET: build editable rows from current historical
-    rows = []
-    if hd and hd.csv_text:
-        rows = parse_csv_upload(io.BytesIO(hd.csv_text.encode("utf-8")))
+    rows = load_historical_rows(request.user)
     # Prepare rows with preserved event columns
     editable_rows = []
     preserved_events = []
-    max_event_cols = 0
     for r in rows:
         events_cols = {k: r.get(k) for k in r.keys() if str(k).startswith("event")}
-        count_events = len(events_cols)
-        max_event_cols = max(max_event_cols, count_events)
         editable_rows.append(
             {
                 "email": r.get("email") or "",
@@ -381,7 +412,6 @@ def edit_historical_view(request: HttpRequest) -> HttpResponse:
         preserved_events.append(events_cols)
 
     request.session["raffle_edit_rows_events"] = preserved_events
-    request.session["raffle_edit_max_event_cols"] = max_event_cols
 
     return render(
         request,
@@ -391,40 +421,116 @@ def edit_historical_view(request: HttpRequest) -> HttpResponse:
 
 
 @login_required
-def download_selected_csv(request: HttpRequest) -> HttpResponse:
-    selected = request.session.get(SESSION_KEYS["selected"]) or []
+@gzip_page
+async def download_selected_csv(request: HttpRequest) -> HttpResponse:
+    workspace = await aget_workspace(request)
+    selected = await aselected_rows(workspace) if workspace else []
     if not selected:
         return redirect("raffle:results")
-    content = _to_csv(selected)
-    filename = f"{_safe_name(request.session.get(SESSION_KEYS['event_name']) or 'event')}_selected_attendees.csv"
-    return _csv_response(content, filename)
+    content = iter_rows_csv(selected)
+    filename = f"{_safe_name(workspace.event_name or 'event')}_selected_attendees.csv"
+    return _csv_response(request, content, filename)
 
 
 @login_required
-def download_ranking_csv(request: HttpRequest) -> HttpResponse:
-    eligible = request.session.get(SESSION_KEYS["eligible_ranked"]) or []
-    if not eligible:
+@gzip_page
+async def download_ranking_csv(request: HttpRequest) -> HttpResponse:
+    workspace = await aget_workspace(request)
+    if not workspace or not await aeligible_count(workspace):
         return redirect("raffle:results")
-    content = generate_ranking_csv(eligible)
-    filename = f"{_safe_name(request.session.get(SESSION_KEYS['event_name']) or 'event')}_all_eligible.csv"
-    return _csv_response(content, filename)
+    if isinstance(request, ASGIRequest):
+        content = aiter_ranking_csv(aiter_eligible_rows(workspace))
+    else:
+        # WSGI servers iterate the response in a thread of their own
+        content = iter_ranking_csv(iter_eligible_rows(workspace))
+    filename = f"{_safe_name(workspace.event_name or 'event')}_all_eligible.csv"
+    return _csv_response(request, content, filename)
 
 
 @login_required
+@require_POST
 def download_updated_database_csv(request: HttpRequest) -> HttpResponse:
-    master = request.session.get(SESSION_KEYS["master"]) or []
-    selected = request.session.get(SESSION_KEYS["selected"]) or []
-    event_name = request.session.get(SESSION_KEYS["event_name"]) or "Event"
-    content = generate_updated_history_csv(master, selected, event_name)
-    # Persist latest historical database for next runs (session + per-user DB)
-    parsed = parse_csv_upload(io.BytesIO(content.encode("utf-8")))
-    request.session[SESSION_KEYS["historical"]] = parsed
-    request.session[SESSION_KEYS["updated_history_csv"]] = content
-    HistoricalData.objects.update_or_create(
-        user=request.user,
-        defaults={"csv_text": content},
+    workspace = get_workspace(request)
+    # Persist latest historical database for next runs (new sign-ups, then this event's results),
+    # then offer it for download once the background job has written it. A POST, as it writes
+    job = submit_job(request.user, "history_csv", params={"workspace_id": workspace.id if workspace else None})
+    return redirect("raffle:job", job_id=job.id)
+
+
+# Acknowledged jobs are remembered in the session so their outcome is applied once
+_FINISHED_JOBS_KEY = "raffle_finished_jobs"
+
+
+def _finish_job(request: HttpRequest, job: Job) -> str:
+    """Apply a finished job's outcome to the session; returns where to go next."""
+    acknowledged = request.session.get(_FINISHED_JOBS_KEY) or []
+    first_time = job.id not in acknowledged
+    if first_time:
+        request.session[_FINISHED_JOBS_KEY] = (acknowledged + [job.id])[-20:]
+    if job.kind in ("prepare_event", "draw"):
+        workspace = RaffleWorkspace.objects.filter(user=request.user, id=job.result.get("workspace_id")).first()
+        if workspace is None:
+            return reverse("raffle:upload")
+        attach_workspace(request, workspace)
+        return reverse("raffle:selection")
+    if job.kind == "import_historical":
+        if first_time:
+            _report_import(request, job.result)
+        return reverse(job.params.get("next") or "raffle:upload")
+    if job.kind == "history_csv":
+        return reverse("raffle:job_download", args=[job.id])
+    return reverse("raffle:upload")
+
+
+@login_required
+def job_view(request: HttpRequest, job_id: int) -> HttpResponse:
+    job = get_object_or_404(Job, user=request.user, id=job_id)
+    if job.status == Job.STATUS_DONE:
+        return redirect(_finish_job(request, job))
+    return render(request, "raffle/job.html", {"job": job, "state": job_payload(job)})
+
+
+@login_required
+async def job_status_view(request: HttpRequest, job_id: int) -> HttpResponse:
+    """Polling endpoint: the job's state as JSON, with where to go next once it is done."""
+    user = await _auser(request)
+    job = await aget_object_or_404(Job, user=user, id=job_id)
+    state = await ajob_payload(job)
+    if job.status == Job.STATUS_DONE:
+        state["redirect"] = await sync_to_async(_finish_job)(request, job)
+    return JsonResponse(state)
+
+
+@login_required
+@gzip_page
+def job_download_view(request: HttpRequest, job_id: int) -> HttpResponse:
+    job = get_object_or_404(Job, user=request.user, id=job_id, status=Job.STATUS_DONE)
+    if not job.output_file:
+        raise Http404("This job has no file")
+    return FileResponse(
+        job.output_file.open("rb"), as_attachment=True, filename="updated_student_database.csv", content_type="text/csv"
     )
-    return _csv_response(content, "updated_student_database.csv")
+
+
+@staff_member_required
+def stats_view(request: HttpRequest) -> HttpResponse:
+    """Aggregated request timings of this server process (see raffle.instrumentation); POST resets them."""
+    if request.method == "POST":
+        instrumentation.reset_stats()
+    return JsonResponse({"enabled": settings.RAFFLE_INSTRUMENTATION, **instrumentation.stats()})
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """Prometheus scrape endpoint, for staff users or a bearer token (``settings.RAFFLE_METRICS_TOKEN``)."""
+    if not settings.RAFFLE_METRICS:
+        raise Http404("Metrics are disabled")
+    token = settings.RAFFLE_METRICS_TOKEN
+    authorized = request.user.is_staff or (
+        token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    )
+    if not authorized:
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+    return HttpResponse("".join(metrics.iter_exposition()), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 def register_view(request: HttpRequest) -> HttpResponse:
@@ -459,17 +565,11 @@ def logout_view(request: HttpRequest) -> HttpResponse:
 @login_required
 def settings_view(request: HttpRequest) -> HttpResponse:
     # Prepare historical rows for editing
-    hd = HistoricalData.objects.filter(user=request.user).first()
-    rows = []
-    if hd and hd.csv_text:
-        rows = parse_csv_upload(io.BytesIO(hd.csv_text.encode("utf-8")))
+    rows = load_historical_rows(request.user)
     editable_rows = []
     preserved_events = []
-    max_event_cols = 0
     for r in rows:
         events_cols = {k: r.get(k) for k in r.keys() if str(k).startswith("event")}
-        count_events = len(events_cols)
-        max_event_cols = max(max_event_cols, count_events)
         editable_rows.append(
             {
                 "email": r.get("email") or "",
@@ -486,7 +586,6 @@ def settings_view(request: HttpRequest) -> HttpResponse:
         preserved_events.append(events_cols)
 
     request.session["raffle_edit_rows_events"] = preserved_events
-    request.session["raffle_edit_max_event_cols"] = max_event_cols
 
     if request.method == "POST":
         form_type = request.POST.get("form_type") or "profile"
@@ -499,10 +598,8 @@ def settings_view(request: HttpRequest) -> HttpResponse:
             # Handle CSV upload to replace historical DB
             uploaded = request.FILES.get("historical_csv")
             if uploaded:
-                rows = parse_csv_upload(uploaded)
-                csv_text = _to_csv(rows)
-                HistoricalData.objects.update_or_create(user=request.user, defaults={"csv_text": csv_text})
-                request.session[SESSION_KEYS["historical"]] = rows
+                job = submit_job(request.user, "import_historical", params={"next": "raffle:settings"}, upload=uploaded)
+                return redirect("raffle:job", job_id=job.id)
             return redirect("raffle:settings")
         else:  # historical CRUD
             try:
@@ -510,7 +607,6 @@ def settings_view(request: HttpRequest) -> HttpResponse:
             except Exception:
                 row_count = 0
             preserved_events = request.session.get("raffle_edit_rows_events") or []
-            max_event_cols = int(request.session.get("raffle_edit_max_event_cols") or 0)
 
             # Rebuild from POST
             rebuilt = []
@@ -560,37 +656,8 @@ def settings_view(request: HttpRequest) -> HttpResponse:
                     }
                 )
 
-            # Write CSV preserving EventN columns
-            headers = ["email", "First Name", "Last Name", "Class"]
-            for i in range(1, max_event_cols + 1):
-                headers.append(f"Event{i}")
-            headers.extend(["Absent", "Late", "Attended", "Attended Events", "Latest Attended"])
-
-            output = io.StringIO()
-            writer = csv.writer(output)
-            writer.writerow(headers)
-            for r in rebuilt:
-                row = [
-                    r.get("email") or "",
-                    r.get("first name") or "",
-                    r.get("last name") or "",
-                    r.get("class") or "",
-                ]
-                events_cols = r.get("_events_columns") or {}
-                for i in range(1, max_event_cols + 1):
-                    row.append(events_cols.get(f"event{i}") or "")
-                row.extend([
-                    r.get("absent") or 0,
-                    r.get("late") or 0,
-                    r.get("attended") or 0,
-                    r.get("attended events") or "",
-                    r.get("latest attended") or "",
-                ])
-                writer.writerow(row)
-            csv_text = output.getvalue()
-
-            HistoricalData.objects.update_or_create(user=request.user, defaults={"csv_text": csv_text})
-            request.session[SESSION_KEYS["historical"]] = parse_csv_upload(io.BytesIO(csv_text.encode("utf-8"))) if csv_text else []
+            # Store rows preserving EventN columns
+            save_historical_rows(request.user, rebuilt)
             return redirect("raffle:settings")
 
     form = UserSettingsForm(instance=request.user)
@@ -602,39 +669,23 @@ def settings_view(request: HttpRequest) -> HttpResponse:
 
 
 # Helpers
-def _serialize_for_session(rows):
-    def convert(v):
-        if isinstance(v, (datetime,)):
-            return v.isoformat()
-        if isinstance(v, (date,)):
-            return v.isoformat()
-        return v
-
-    out = []
-    for r in rows:
-        out.append({k: convert(v) for k, v in r.items()})
-    return out
-
-
-def _to_csv(rows) -> str:
-    if not rows:
-        return ""
-    # ensure consistent headers
-    headers = list(rows[0].keys())
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=headers)
-    writer.writeheader()
-    for r in rows:
-        writer.writerow(r)
-    return output.getvalue()
-
-
-def _csv_response(content: str, filename: str) -> HttpResponse:
-    resp = HttpResponse(content, content_type="text/csv")
+def _csv_response(
+    request: HttpRequest, content: Union[Iterable[str], AsyncIterable[str]], filename: str
+) -> StreamingHttpResponse:
+    if isinstance(request, ASGIRequest) and isinstance(content, Iterable):
+        # ASGI reads a synchronous iterator whole before sending it; ``content``
+        # must then be in-memory work only, as it runs on the event loop
+        content = _aiter(content)
+    resp = StreamingHttpResponse(content, content_type="text/csv")
     resp["Content-Disposition"] = f"attachment; filename=\"{filename}\""
     return resp
 
 
+async def _aiter(iterable: Iterable[str]) -> AsyncIterator[str]:
+    for item in iterable:
+        yield item
+
+
 def _safe_name(name: str) -> str:
     return "_".join(name.split())
 
@@ -0,0 +1,260 @@
+import random
+from datetime import date
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .attendance import apply_event_results, set_run_flags, undo_run
+from .history import add_historical_students, historical_identity_index, index_run_selections
+from .models import RaffleRun, RaffleWorkspace, WorkspaceRow
+from .services import (
+    StudentRecord,
+    StudentRow,
+    generate_ranking_csv,
+    is_eligible,
+    iter_rows_csv,
+    select_top_priority,
+)
+from .vectorized import raffle_engine
+
+
+SESSION_KEY = "raffle_workspace"
+
+
+def get_workspace(request) -> Optional[RaffleWorkspace]:
+    """Return the draft run referenced by the session, if it still exists."""
+    workspace_id = request.session.get(SESSION_KEY)
+    if not workspace_id:
+        return None
+    return RaffleWorkspace.objects.filter(user=request.user, id=workspace_id).first()
+
+
+async def aget_workspace(request) -> Optional[RaffleWorkspace]:
+    """Async ``get_workspace``, for async views."""
+    workspace_id = await request.session.aget(SESSION_KEY)
+    if not workspace_id:
+        return None
+    return await RaffleWorkspace.objects.filter(user=await request.auser(), id=workspace_id).afirst()
+
+
+@transaction.atomic
+def create_workspace(
+    user,
+    event_name: str,
+    capacity: int,
+    event_date: Optional[date],
+    signups: List[StudentRow],
+    master: List[StudentRecord],
+    identity_report: Optional[List[dict]] = None,
+) -> RaffleWorkspace:
+    """Store a new draft run; ``attach_workspace`` makes it the session's current one."""
+    workspace = RaffleWorkspace.objects.create(
+        user=user,
+        event_name=event_name,
+        capacity=capacity,
+        event_date=event_date,
+        identity_report=identity_report or [],
+    )
+    rows = [
+        WorkspaceRow(workspace=workspace, kind=WorkspaceRow.KIND_SIGNUP, position=position, data=data)
+        for position, data in enumerate(signups)
+    ]
+    rows.extend(
+        WorkspaceRow(
+            workspace=workspace,
+            kind=WorkspaceRow.KIND_MASTER,
+            position=position,
+            data=record.to_dict() if isinstance(record, StudentRecord) else record,
+            eligible=is_eligible(record),
+        )
+        for position, record in enumerate(master)
+    )
+    WorkspaceRow.objects.bulk_create(rows, batch_size=1000)
+    return workspace
+
+
+def attach_workspace(request, workspace: RaffleWorkspace) -> None:
+    """Point the session at ``workspace``, deleting the draft run it replaces."""
+    previous = request.session.get(SESSION_KEY)
+    if previous and previous != workspace.id:
+        RaffleWorkspace.objects.filter(user=request.user, id=previous).delete()
+    request.session[SESSION_KEY] = workspace.id
+
+
+def signup_rows(workspace: RaffleWorkspace) -> List[StudentRow]:
+    qs = workspace.rows.filter(kind=WorkspaceRow.KIND_SIGNUP).order_by("position")
+    return [r.data for r in qs]
+
+
+def master_rows(workspace: RaffleWorkspace) -> List[StudentRow]:
+    qs = workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER).order_by("position")
+    return [r.as_row() for r in qs]
+
+
+def master_queryset(workspace: RaffleWorkspace) -> QuerySet:
+    return workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER)
+
+
+def master_count(workspace: RaffleWorkspace) -> int:
+    return workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER).count()
+
+
+def eligible_rows(workspace: RaffleWorkspace) -> List[StudentRow]:
+    """All eligible students of the latest draw, in rank order.
+
+    Ranks the rest of the pool first if only the selected students were ranked.
+    """
+    return list(iter_eligible_rows(workspace))
+
+
+def iter_eligible_rows(workspace: RaffleWorkspace) -> Iterator[StudentRow]:
+    """Like ``eligible_rows`` but fetches rows from the database in chunks."""
+    rank_workspace(workspace)
+    for r in _ranked_queryset(workspace).iterator(chunk_size=2000):
+        yield r.as_row()
+
+
+async def aiter_eligible_rows(workspace: RaffleWorkspace) -> AsyncIterator[StudentRow]:
+    """Async ``iter_eligible_rows``, for streaming responses under ASGI."""
+    if not workspace.ranking_complete:
+        await sync_to_async(rank_workspace)(workspace)
+    async for r in _ranked_queryset(workspace).aiterator(chunk_size=2000):
+        yield r.as_row()
+
+
+def _ranked_queryset(workspace: RaffleWorkspace) -> QuerySet:
+    return workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER, rank__isnull=False).order_by("rank")
+
+
+def eligible_count(workspace: RaffleWorkspace) -> int:
+    return workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER, eligible=True).count()
+
+
+async def aeligible_count(workspace: RaffleWorkspace) -> int:
+    return await workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER, eligible=True).acount()
+
+
+def selected_rows(workspace: RaffleWorkspace) -> List[StudentRow]:
+    return [r.as_row() for r in _selected_queryset(workspace)]
+
+
+async def aselected_rows(workspace: RaffleWorkspace) -> List[StudentRow]:
+    return [r.as_row() async for r in _selected_queryset(workspace)]
+
+
+def _selected_queryset(workspace: RaffleWorkspace) -> QuerySet:
+    return workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER, selected=True).order_by("rank")
+
+
+def _master_objects(workspace: RaffleWorkspace) -> Tuple[List[WorkspaceRow], List[StudentRecord]]:
+    row_objs = list(workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER).order_by("position"))
+    return row_objs, [StudentRecord.from_dict(r.data) for r in row_objs]
+
+
+def _store_ranks(row_objs: List[WorkspaceRow], students: List[StudentRecord], ranked: List[StudentRecord]) -> None:
+    by_identity = {id(data): r for data, r in zip(students, row_objs)}
+    changed = []
+    for s in ranked:
+        r = by_identity[id(s)]
+        r.rank = s["rank"]
+        r.selected = bool(s["selected"])
+        changed.append(r)
+    WorkspaceRow.objects.bulk_update(changed, ["rank", "selected"], batch_size=1000)
+
+
+@transaction.atomic
+def draw_workspace(workspace: RaffleWorkspace) -> Tuple[List[StudentRecord], int]:
+    """Run a new draw and rank only the selected students; returns (selected, eligible_count).
+
+    The draw's seed is stored so ``rank_workspace`` can later rank the
+    remaining eligible students exactly as a full ``run_priority_raffle`` would.
+    """
+    workspace.seed = random.SystemRandom().getrandbits(63)
+    workspace.ranking_complete = False
+    workspace.save(update_fields=["seed", "ranking_complete", "updated_at"])
+
+    row_objs, students = _master_objects(workspace)
+    selected, total = select_top_priority(students, workspace.capacity, seed=workspace.seed)
+    workspace.rows.filter(kind=WorkspaceRow.KIND_MASTER).update(rank=None, selected=False)
+    _store_ranks(row_objs, students, selected)
+    return selected, total
+
+
+@transaction.atomic
+def rank_workspace(workspace: RaffleWorkspace) -> None:
+    """Rank every eligible student of the latest draw, if not done already."""
+    if workspace.ranking_complete or workspace.seed is None:
+        return
+    row_objs, students = _master_objects(workspace)
+    eligible_ranked, _selected = raffle_engine()(students, workspace.capacity, seed=workspace.seed)
+    _store_ranks(row_objs, students, eligible_ranked)
+    workspace.ranking_complete = True
+    workspace.save(update_fields=["ranking_complete", "updated_at"])
+
+
+def add_workspace_students(workspace: RaffleWorkspace) -> int:
+    """Add the draft run's students missing from the historical database to it; returns how many.
+
+    Selected students added after the draw's results were recorded get
+    them too, under the same run, as if they had been there at the time.
+    """
+    with transaction.atomic():
+        index = historical_identity_index(workspace.user)
+        new_selected = [s for s in selected_rows(workspace) if not index.contains(s)]
+        count = add_historical_students(workspace.user, master_rows(workspace))
+        workspace.refresh_from_db(fields=["run", "results_seed"])
+        if new_selected and workspace.run is not None and workspace.results_seed == workspace.seed:
+            apply_event_results(workspace.user, new_selected, workspace.event_name or "Event", run=workspace.run)
+    return count
+
+
+def record_results(
+    workspace: RaffleWorkspace, adjustments: Optional[Dict[str, Dict[str, bool]]] = None
+) -> Optional[RaffleRun]:
+    """Log the latest draw's results against the historical database, once per draw; returns their run.
+
+    Saving the results page and downloading the updated database both record
+    them, as may a retried job, so later calls for the same draw only bring
+    the absent/late ``adjustments`` (when given) up to date. After a new draw
+    the earlier draw's marks are withdrawn and the run is rewritten. Returns
+    None when nothing was drawn yet.
+    """
+    if workspace.seed is None:
+        return None
+    with transaction.atomic():
+        # Claimed with the transaction's first write, so concurrent calls record the draw once
+        claimed = (
+            RaffleWorkspace.objects.filter(pk=workspace.pk, seed=workspace.seed)
+            .exclude(results_seed=workspace.seed)
+            .update(results_seed=workspace.seed)
+        )
+        workspace.refresh_from_db(fields=["run", "results_seed"])
+        run = workspace.run
+        if not claimed:
+            if run is not None and adjustments is not None:
+                set_run_flags(run, adjustments)
+            return run
+
+        selected = selected_rows(workspace)
+        datasets = {
+            "name": workspace.event_name,
+            "date": workspace.event_date,
+            "capacity": workspace.capacity,
+            "signup_csv_text": "".join(iter_rows_csv(signup_rows(workspace))),
+            "selected_csv_text": "".join(iter_rows_csv(selected)),
+            "eligible_csv_text": generate_ranking_csv(iter_eligible_rows(workspace)),
+        }
+        if run is None:
+            run = RaffleRun.objects.create(user=workspace.user, **datasets)
+            RaffleWorkspace.objects.filter(pk=workspace.pk).update(run=run)
+            workspace.run = run
+        else:
+            undo_run(run)
+            for field, value in datasets.items():
+                setattr(run, field, value)
+            run.save(update_fields=list(datasets))
+        index_run_selections(run, selected)
+        apply_event_results(workspace.user, selected, workspace.event_name or "Event", adjustments, run=run)
+    return run